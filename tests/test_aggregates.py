@@ -0,0 +1,55 @@
+from typing import Any, cast
+
+import numpy as np
+from psycopg import sql
+
+from uploader.app.lib.aggregates import Histogram, histogram_bin, not_null, table_aggregates
+from uploader.app.storage import PgStorage
+
+
+class _Storage:
+    def __init__(self, rows: list[dict[str, Any]]) -> None:
+        self.rows = rows
+        self.queries: list[str] = []
+
+    def query(self, query: sql.Composable, params: Any) -> list[dict[str, Any]]:
+        self.queries.append(query.as_string(None))
+        return self.rows
+
+
+def test_histogram_bin_matches_numpy_edges() -> None:
+    edges = np.array([0.0, 1.0, 2.5])
+    text = histogram_bin(sql.SQL("v"), edges, not_null(["v"])).as_string(None)
+    assert text == (
+        'CASE WHEN "v" IS NOT NULL THEN CASE WHEN v = 2.5 THEN 1 '
+        "WHEN v >= 0.0 AND v < 2.5 THEN width_bucket(v, '{0.0,1.0}'::float8[]) - 1 END END"
+    )
+
+
+def test_one_query_fills_totals_and_histograms() -> None:
+    x = sql.SQL("x")
+    y = sql.SQL("y")
+    # grouping sets (), (x, y) and (x) over GROUPING(x, y, x)
+    storage = _Storage(
+        [
+            {"total": 10, "grouping": 0b111, "bin_0_0": None, "bin_0_1": None, "bin_1_0": None, "bin_count": 10},
+            {"total": 6, "grouping": 0b000, "bin_0_0": 0, "bin_0_1": 1, "bin_1_0": 0, "bin_count": 6},
+            {"total": 3, "grouping": 0b000, "bin_0_0": None, "bin_0_1": None, "bin_1_0": None, "bin_count": 3},
+            {"total": 1, "grouping": 0b000, "bin_0_0": 1, "bin_0_1": 0, "bin_1_0": 1, "bin_count": 1},
+            {"total": 7, "grouping": 0b010, "bin_0_0": 2, "bin_0_1": None, "bin_1_0": 2, "bin_count": 7},
+        ]
+    )
+    totals, (grid, line) = table_aggregates(
+        cast(PgStorage, storage),
+        "t",
+        {"total": sql.SQL("COUNT(*)")},
+        [Histogram([x, y], (2, 2)), Histogram([x], (3,))],
+    )
+    assert totals == {"total": 10}
+    assert grid.tolist() == [[0, 6], [1, 0]]
+    assert line.tolist() == [0, 0, 7]
+    assert storage.queries == [
+        'SELECT COUNT(*) AS "total", GROUPING(x, y, x) AS "grouping", x AS "bin_0_0", y AS "bin_0_1", '
+        'x AS "bin_1_0", COUNT(*) AS bin_count '
+        'FROM rawdata."t" GROUP BY GROUPING SETS ((), (x, y), (x))'
+    ]
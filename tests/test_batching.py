@@ -0,0 +1,28 @@
+import pytest
+
+from uploader.app.lib.batching import AdaptiveBatchSizer
+
+
+def test_sizer_grows_in_sparse_fields_up_to_max() -> None:
+    sizer = AdaptiveBatchSizer(initial_size=1000, min_size=100, max_size=5000, target_rows=10_000)
+    assert sizer.observe(1000, 1000, 0.1) == 2000
+    assert sizer.observe(2000, 2000, 0.1) == 4000
+    assert sizer.observe(4000, 4000, 0.1) == 5000
+
+
+def test_sizer_shrinks_to_meet_row_and_time_targets() -> None:
+    sizer = AdaptiveBatchSizer(
+        initial_size=10_000, min_size=100, max_size=50_000, target_rows=50_000, target_seconds=10
+    )
+    assert sizer.observe(10_000, 500_000, 1.0) == 1000
+    sizer = AdaptiveBatchSizer(
+        initial_size=10_000, min_size=100, max_size=50_000, target_rows=50_000, target_seconds=10
+    )
+    assert sizer.observe(10_000, 10_000, 50.0) == 2000
+    assert sizer.observe(2000, 1_000_000, 1.0) == 199
+    assert sizer.observe(199, 10_000_000, 1.0) == 100
+
+
+def test_sizer_rejects_invalid_bounds() -> None:
+    with pytest.raises(ValueError, match="bounds"):
+        AdaptiveBatchSizer(initial_size=10, min_size=100, max_size=10, target_rows=1)
@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from uploader.app.crossmatch.batch import C_M_S, EvidenceBatch
+from uploader.app.crossmatch.models import Neighbor, NeighborTable, type_code, type_name_of
+
+
+def test_from_rows_groups_candidates_within_radius() -> None:
+    rows = [
+        ("a", 10.0, 20.0, "NGC 1", 3000.0, "G", 1, 10.0, 20.0001, "NGC 1", 3100.0, "G"),
+        ("a", 10.0, 20.0, "NGC 1", 3000.0, "G", 2, 10.0, 20.01, None, None, None),
+        ("b", None, None, None, None, None, None, None, None, None, None, None),
+        ("c", 11.0, 21.0, None, None, "*", 3, 11.0, 21.0, None, None, "*"),
+    ]
+    batch = EvidenceBatch.from_rows(rows, 3 / 3600)
+
+    assert batch.record_ids == ["a", "b", "c"]
+    assert batch.offsets.tolist() == [0, 1, 1, 2]
+    assert batch.position(1) is None
+
+    evidence = batch.with_designation_pgcs({"NGC 1": [1]}).evidence(0)
+    assert [n.pgc for n in evidence.neighbors] == [1]
+    assert evidence.neighbors.pgc.tolist() == [1]
+    assert evidence.record_designation == "NGC 1"
+    assert evidence.same_name_pgcs == [1]
+    assert evidence.record_redshift == 3000.0 / C_M_S
+    assert evidence.record_type_name == "G"
+    assert len(batch.evidence(1).neighbors) == 0
+    assert list(batch.evidence(2).neighbors)[0].type_name == "*"
+
+
+def test_neighbor_table_round_trip() -> None:
+    neighbors = [
+        Neighbor(pgc=1, ra=10.0, dec=20.0, distance_deg=0.0, design="NGC 1", redshift=0.01, type_name="G"),
+        Neighbor(pgc=2, ra=10.0, dec=20.0, distance_deg=1.0),
+    ]
+    table = NeighborTable.from_neighbors(neighbors)
+
+    assert list(table) == neighbors
+    assert list(table.within(0.5)) == neighbors[:1]
+    assert table.within(1.0) is table
+
+
+def test_type_codes_are_unique_across_threads() -> None:
+    names = [f"thread-type-{i}" for i in range(200)]
+    barrier = threading.Barrier(8)
+
+    def register(_: int) -> list[int]:
+        barrier.wait()
+        return [type_code(name) for name in names]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(register, range(8)))
+
+    assert all(codes == results[0] for codes in results)
+    assert [type_name_of(code) for code in results[0]] == names
@@ -0,0 +1,34 @@
+import math
+
+import numpy as np
+
+from uploader.app.crossmatch.calibration import fit_separations
+
+
+def test_fit_recovers_true_match_peak() -> None:
+    rng = np.random.default_rng(11)
+    sampled = 5000
+    max_radius_deg = 30 / 3600
+    sigma_deg = 0.5 / 3600
+    density = 0.5 * 3600  # 0.5 objects per square arcminute
+
+    nearest: list[float] = []
+    annulus_count = 0
+    for _ in range(sampled):
+        count = rng.poisson(density * math.pi * max_radius_deg**2)
+        distances = max_radius_deg * np.sqrt(rng.uniform(size=count))
+        if rng.uniform() < 0.7:
+            distances = np.append(distances, rng.rayleigh(sigma_deg))
+        distances = distances[distances <= max_radius_deg]
+        annulus_count += int(np.count_nonzero(distances >= max_radius_deg / 2))
+        if len(distances) > 0:
+            nearest.append(float(distances.min()))
+
+    fit = fit_separations(np.array(nearest), sampled, annulus_count, max_radius_deg)
+    radius_deg = fit.suggested_radius_deg()
+
+    assert abs(fit.match_fraction * len(nearest) / sampled - 0.7) < 0.05
+    assert abs(fit.sigma_deg - sigma_deg) / sigma_deg < 0.1
+    assert radius_deg is not None
+    assert 1.5 / 3600 < radius_deg < 4 / 3600
+    assert fit.completeness(radius_deg) > 0.95
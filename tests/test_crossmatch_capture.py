@@ -0,0 +1,66 @@
+import dataclasses
+import pathlib
+
+import uploader.app.report as report
+from uploader.app.crossmatch.capture import CaptureHeader, EvidenceWriter, read_evidence, read_header
+from uploader.app.crossmatch.models import EMPTY_NEIGHBORS, Neighbor, NeighborTable, RecordEvidence, TriageStatus
+from uploader.app.crossmatch.replay import run_replay
+from uploader.app.crossmatch.resolver import LayeredResolver
+
+
+def _evidence() -> RecordEvidence:
+    return RecordEvidence(
+        neighbors=NeighborTable.from_neighbors(
+            [
+                Neighbor(pgc=1, ra=10.0, dec=20.0, distance_deg=1 / 3600, design="NGC 1", redshift=0.01, type_name="G"),
+                Neighbor(pgc=2, ra=10.0, dec=20.002, distance_deg=8 / 3600),
+            ]
+        ),
+        record_designation="NGC 1",
+        same_name_pgcs=[1],
+        record_pgc=1,
+        claimed_pgc_exists_in_layer2=True,
+        record_redshift=0.0101,
+        record_type_name="G",
+    )
+
+
+def test_capture_round_trip(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "evidence.jsonl.gz"
+    header = CaptureHeader(table_name="t", radius_deg=10 / 3600, pgc_column="pgc")
+    with EvidenceWriter(path, header) as writer:
+        writer.write("rec-1", _evidence())
+        writer.write("rec-2", RecordEvidence(neighbors=EMPTY_NEIGHBORS))
+
+    assert read_header(path) == header
+    assert list(read_evidence(path)) == [("rec-1", _evidence()), ("rec-2", RecordEvidence(neighbors=EMPTY_NEIGHBORS))]
+
+
+def test_replay_restricts_neighbors_to_radius(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "evidence.jsonl.gz"
+    with EvidenceWriter(path, CaptureHeader(table_name="t", radius_deg=10 / 3600, pgc_column=None)) as writer:
+        writer.write("rec-1", _evidence())
+
+    events: list[report.Event] = []
+    run_replay(path, [LayeredResolver(radius_deg=2 / 3600)], events.append)
+    done = [e for e in events if isinstance(e, report.DoneEvent)]
+    assert len(done) == 1
+    assert "existing" in done[0].message
+    assert TriageStatus.RESOLVED.value in done[0].message
+
+
+def test_replay_reports_each_configuration(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "evidence.jsonl.gz"
+    evidence = dataclasses.replace(_evidence(), same_name_pgcs=None, record_type_name=None)
+    with EvidenceWriter(path, CaptureHeader(table_name="t", radius_deg=10 / 3600, pgc_column=None)) as writer:
+        writer.write("rec-1", evidence)
+
+    resolvers = [LayeredResolver(radius_deg=2 / 3600), LayeredResolver(radius_deg=10 / 3600)]
+    events: list[report.Event] = []
+    run_replay(path, resolvers, events.append)
+    done = [e for e in events if isinstance(e, report.DoneEvent)]
+    assert len(done) == 1
+    assert resolvers[0].name in done[0].message
+    assert resolvers[1].name in done[0].message
+    assert "MULTIPLE_OBJECTS_MATCHED" in done[0].message
+    assert len([e for e in events if isinstance(e, report.ImageEvent)]) == 2
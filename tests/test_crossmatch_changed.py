@@ -0,0 +1,144 @@
+from typing import Any, cast
+
+import pytest
+
+import uploader.app.report as report
+from uploader.app.crossmatch import engine
+from uploader.app.crossmatch.engine import _write_batch
+from uploader.app.crossmatch.models import CrossmatchResult, CrossmatchStatus, TriageStatus
+from uploader.app.crossmatch.resolver import LayeredResolver
+from uploader.app.storage import PgStorage
+
+RESOLVED = TriageStatus.RESOLVED
+PENDING = TriageStatus.PENDING
+
+
+class _Storage:
+    def __init__(self, rows: list[dict[str, Any]]) -> None:
+        self.rows = rows
+        self.queried: list[list[str]] = []
+
+    def query(self, query: Any, params: tuple[list[str]]) -> list[dict[str, Any]]:
+        (record_ids,) = params
+        self.queried.append(record_ids)
+        return [row for row in self.rows if row["record_id"] in record_ids]
+
+
+def _stored(
+    record_id: str,
+    status: str,
+    triage: str = "resolved",
+    pgc: str | None = None,
+    possible_matches: list[int] | None = None,
+) -> dict[str, Any]:
+    return {
+        "record_id": record_id,
+        "status": status,
+        "triage_status": triage,
+        "pgc": pgc,
+        "possible_matches": possible_matches,
+    }
+
+
+STORED = [
+    _stored("new-same", "new"),
+    _stored("new-triage", "new", "resolved"),
+    _stored("existing-same", "existing", pgc="12"),
+    _stored("existing-pgc", "existing", pgc="12"),
+    _stored("collided-same", "collided", "pending", possible_matches=[3, 1, 2]),
+    _stored("collided-matches", "collided", "pending", possible_matches=[1, 2]),
+    _stored("status", "existing", pgc="5"),
+]
+
+RESULTS = [
+    ("new-same", CrossmatchResult(CrossmatchStatus.NEW, RESOLVED)),
+    ("new-triage", CrossmatchResult(CrossmatchStatus.NEW, PENDING)),
+    ("existing-same", CrossmatchResult(CrossmatchStatus.EXISTING, RESOLVED, matched_pgc=12)),
+    ("existing-pgc", CrossmatchResult(CrossmatchStatus.EXISTING, RESOLVED, matched_pgc=13)),
+    ("collided-same", CrossmatchResult(CrossmatchStatus.COLLIDING, PENDING, colliding_pgcs=[1, 2, 3])),
+    ("collided-matches", CrossmatchResult(CrossmatchStatus.COLLIDING, PENDING, colliding_pgcs=[1, 2, 3])),
+    ("status", CrossmatchResult(CrossmatchStatus.COLLIDING, PENDING, colliding_pgcs=[5, 6])),
+    ("not-stored", CrossmatchResult(CrossmatchStatus.NEW, RESOLVED)),
+]
+
+
+def _write(
+    storage: _Storage, write_changed_only: bool, monkeypatch: pytest.MonkeyPatch
+) -> tuple[int, list[list[tuple[str, CrossmatchResult]]]]:
+    written: list[list[tuple[str, CrossmatchResult]]] = []
+    monkeypatch.setattr(engine, "_write_crossmatch_results", lambda client, results: written.append(results))
+    skipped = _write_batch(cast(PgStorage, storage), cast(Any, object()), RESULTS, write_changed_only)
+    return skipped, written
+
+
+def test_writes_only_changed_results(monkeypatch: pytest.MonkeyPatch) -> None:
+    storage = _Storage(STORED)
+    skipped, written = _write(storage, True, monkeypatch)
+
+    assert skipped == 3
+    assert [[record_id for record_id, _ in results] for results in written] == [
+        ["new-triage", "existing-pgc", "collided-matches", "status", "not-stored"]
+    ]
+    assert storage.queried == [[record_id for record_id, _ in RESULTS]]
+
+
+def test_nothing_written_when_all_unchanged(monkeypatch: pytest.MonkeyPatch) -> None:
+    storage = _Storage(STORED)
+    written: list[Any] = []
+    monkeypatch.setattr(engine, "_write_crossmatch_results", lambda client, results: written.append(results))
+    unchanged = [RESULTS[0], RESULTS[2], RESULTS[4]]
+
+    assert _write_batch(cast(PgStorage, storage), cast(Any, object()), unchanged, True) == 3
+    assert written == []
+
+
+def test_writes_everything_without_comparison(monkeypatch: pytest.MonkeyPatch) -> None:
+    storage = _Storage(STORED)
+    skipped, written = _write(storage, False, monkeypatch)
+
+    assert skipped == 0
+    assert written == [RESULTS]
+    assert storage.queried == []
+
+
+class _TableStorage(_Storage):
+    def __init__(self, rows: list[dict[str, Any]], records: list[tuple[Any, ...]]) -> None:
+        super().__init__(rows)
+        self.records = records
+
+    def query(self, query: Any, params: Any = None) -> list[dict[str, Any]]:
+        if "layer0.tables" in query:
+            return [{"id": "table-id"}]
+        if "COUNT(*)" in query:
+            return [{"cnt": len(self.records)}]
+        return super().query(query, params)
+
+    def stream(self, query: Any, params: tuple[Any, ...]) -> list[tuple[Any, ...]]:
+        _table_id, last_id, limit = params[:3]
+        return [row for row in self.records if row[0] > last_id][:limit]
+
+
+def test_reports_skipped_count(monkeypatch: pytest.MonkeyPatch) -> None:
+    storage = _TableStorage(
+        [_stored("a", "new"), _stored("b", "new", "pending")],
+        [(record_id, 10.0 + i, 20.0, None, None, None) for i, record_id in enumerate(["a", "b", "c"])],
+    )
+    written: list[list[tuple[str, CrossmatchResult]]] = []
+    monkeypatch.setattr(engine, "_write_crossmatch_results", lambda client, results: written.append(results))
+    events: list[report.Event] = []
+
+    engine.run_crossmatch(
+        cast(PgStorage, storage),
+        "t",
+        2,
+        cast(Any, object()),
+        [LayeredResolver(radius_deg=3 / 3600)],
+        events.append,
+        write=True,
+        write_changed_only=True,
+    )
+
+    assert [[record_id for record_id, _ in results] for results in written] == [["b"], ["c"]]
+    done = events[-1]
+    assert isinstance(done, report.DoneEvent)
+    assert "Skipped unchanged results: 1 records" in done.message
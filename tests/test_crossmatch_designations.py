@@ -0,0 +1,20 @@
+from typing import Any
+
+from uploader.app.crossmatch.designations import DesignationIndex
+
+
+class _Storage:
+    def __init__(self, rows: list[tuple[str, int]]) -> None:
+        self.rows = rows
+
+    def stream(self, query: Any, params: Any = None) -> Any:
+        yield from self.rows
+
+
+def test_index_merges_both_tables() -> None:
+    rows = [("NGC 1", 1), ("NGC 1", 1), ("NGC 1", 2), ("M 1", 3)] + [(f"X {i}", i) for i in range(20_000)]
+    index = DesignationIndex.load(_Storage(rows))
+
+    assert index is not None
+    assert index.lookup(["NGC 1", "M 1", "IC 1"]) == {"NGC 1": [1, 2], "M 1": [3], "IC 1": []}
+    assert DesignationIndex.load(_Storage(rows), max_bytes=index.approx_bytes // 2) is None
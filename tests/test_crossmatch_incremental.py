@@ -0,0 +1,116 @@
+import pathlib
+from typing import Any, cast
+
+import pytest
+
+import uploader.app.report as report
+from uploader.app.crossmatch import engine
+from uploader.app.crossmatch.batch import EvidenceBatch
+from uploader.app.crossmatch.engine import _affected_records, _record_input_digest
+from uploader.app.crossmatch.models import CrossmatchResult
+from uploader.app.crossmatch.resolver import LayeredResolver
+from uploader.app.crossmatch.state import CrossmatchState, RecordState, cell_key, load_state
+from uploader.app.storage import PgStorage
+
+RADIUS_DEG = 3 / 3600
+
+type Row = tuple[str, float, float, str | None, float | None, str | None]
+
+
+class _Storage:
+    def __init__(self, rows: list[Row]) -> None:
+        self.rows = rows
+
+    def query(self, query: Any, params: Any = None) -> list[dict[str, Any]]:
+        text = query if isinstance(query, str) else query.as_string(None)
+        if "layer0.tables" in text:
+            return [{"id": "table-id"}]
+        if "COUNT(*)" in text:
+            return [{"cnt": len(self.rows)}]
+        return []
+
+    def stream(self, query: Any, params: tuple[Any, ...]) -> list[Row]:
+        if isinstance(params[0], list):
+            return [row for row in self.rows if row[0] in params[0]]
+        _table_id, last_id, limit = params[:3]
+        return [row for row in self.rows if row[0] > last_id][:limit]
+
+
+def _digest(batch: EvidenceBatch, i: int) -> int:
+    return _record_input_digest(batch, i, {}, ({}, set()))
+
+
+def test_affected_records() -> None:
+    batch = EvidenceBatch.from_rows(
+        [
+            ("a-same", 10.1, 20.1, None, None, None),
+            ("b-moved", 30.1, 20.1, None, None, None),
+            ("c-new", 50.1, 20.1, None, None, None),
+            ("d-near-change", 70.1, 20.1, None, None, None),
+        ],
+        RADIUS_DEG,
+    )
+    state = CrossmatchState(
+        table_name="t",
+        resolver_name="r",
+        radius_deg=RADIUS_DEG,
+        records={
+            "a-same": RecordState(input_digest=_digest(batch, 0), fingerprint=0),
+            "b-moved": RecordState(input_digest=_digest(batch, 1) + 1, fingerprint=0),
+            "d-near-change": RecordState(input_digest=_digest(batch, 3), fingerprint=0),
+        },
+    )
+    cells: set[int] = set()
+
+    affected = _affected_records(state, batch, {}, ({}, set()), {cell_key(70.1, 20.1)}, cells)
+
+    assert affected == ["b-moved", "c-new", "d-near-change"]
+    assert cells == {cell_key(ra, 20.1) for ra in (10.1, 30.1, 50.1, 70.1)}
+
+
+def _run(
+    storage: _Storage,
+    state_path: pathlib.Path,
+    *,
+    write: bool,
+    monkeypatch: pytest.MonkeyPatch,
+) -> list[list[tuple[str, CrossmatchResult]]]:
+    written: list[list[tuple[str, CrossmatchResult]]] = []
+    monkeypatch.setattr(engine, "_write_crossmatch_results", lambda client, results: written.append(results))
+    events: list[report.Event] = []
+    engine.run_incremental_crossmatch(
+        cast(PgStorage, storage),
+        "t",
+        10,
+        cast(Any, object()),
+        LayeredResolver(radius_deg=RADIUS_DEG),
+        events.append,
+        state_path,
+        write=write,
+    )
+    assert isinstance(events[-1], report.DoneEvent)
+    return written
+
+
+def test_dry_run_does_not_advance_state(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    state_path = tmp_path / "state.json.gz"
+    storage = _Storage([("a", 10.1, 20.1, None, None, None), ("b", 30.1, 20.1, None, None, None)])
+
+    _run(storage, state_path, write=False, monkeypatch=monkeypatch)
+    assert not state_path.exists()
+
+    [first] = _run(storage, state_path, write=True, monkeypatch=monkeypatch)
+    assert [record_id for record_id, _ in first] == ["a", "b"]
+    saved = state_path.read_bytes()
+
+    storage.rows[1] = ("b", 30.2, 20.1, None, None, None)
+    assert _run(storage, state_path, write=False, monkeypatch=monkeypatch) == []
+    assert state_path.read_bytes() == saved
+
+    [changed] = _run(storage, state_path, write=True, monkeypatch=monkeypatch)
+    assert [record_id for record_id, _ in changed] == ["b"]
+    state = load_state(state_path)
+    assert state is not None
+    assert set(state.records) == {"a", "b"}
+
+    assert _run(storage, state_path, write=True, monkeypatch=monkeypatch) == []
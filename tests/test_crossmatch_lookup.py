@@ -0,0 +1,41 @@
+import numpy as np
+
+from uploader.app.crossmatch.batch import EvidenceBatch
+from uploader.app.crossmatch.designations import DesignationIndex
+from uploader.app.crossmatch.lookup import Layer2Index
+from uploader.app.crossmatch.models import NeighborTable
+
+
+def test_index_neighbors_match_batch_candidates() -> None:
+    rng = np.random.default_rng(3)
+    n = 2000
+    layer2 = NeighborTable(
+        pgc=np.arange(1, n + 1, dtype=np.int64),
+        ra=rng.uniform(10, 10.2, n),
+        dec=rng.uniform(20, 20.2, n),
+        distance_deg=np.zeros(n),
+        redshift=np.full(n, np.nan),
+        type_code=np.full(n, -1, dtype=np.int16),
+        design=np.array([f"X{i}" for i in range(n)], dtype=object),
+    )
+    designations = DesignationIndex()
+    for pgc in (5, 7, 5):
+        designations.add("NGC 1", pgc)
+    index = Layer2Index(layer2, designations)
+    radius_deg = 20 / 3600
+
+    for ra, dec in rng.uniform([10.05, 20.05], [10.15, 20.15], size=(50, 2)):
+        rows = [
+            ("r", ra, dec, None, None, None, pgc, cand_ra, cand_dec, design, None, None)
+            for pgc, cand_ra, cand_dec, design in zip(
+                layer2.pgc.tolist(), layer2.ra.tolist(), layer2.dec.tolist(), layer2.design.tolist(), strict=True
+            )
+        ]
+        expected = EvidenceBatch.from_rows(rows, radius_deg).evidence(0).neighbors
+        found = index.neighbors(ra, dec, radius_deg)
+        assert sorted(found, key=lambda nb: nb.pgc) == sorted(expected, key=lambda nb: nb.pgc)
+
+    assert index.same_name_pgcs("NGC 1") == [5, 7]
+    assert index.same_name_pgcs("NGC 2") is None
+    assert index.has_pgc(n)
+    assert not index.has_pgc(n + 1)
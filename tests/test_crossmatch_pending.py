@@ -0,0 +1,48 @@
+import csv
+import gzip
+import pathlib
+
+from uploader.app.crossmatch.batch import EvidenceBatch
+from uploader.app.crossmatch.models import CrossmatchResult, CrossmatchStatus, PendingReason, TriageStatus
+from uploader.app.crossmatch.pending import PendingWriter
+
+
+def test_pending_writer_flattens_candidates(tmp_path: pathlib.Path) -> None:
+    rows = [
+        ("a", 10.0, 20.0, "NGC 1", None, "G", 1, 10.0, 20.0001, "NGC 1", None, "G"),
+        ("a", 10.0, 20.0, "NGC 1", None, "G", 2, 10.0, 20.0002, None, None, None),
+        ("b", 11.0, 21.0, None, None, None, None, None, None, None, None, None),
+        ("c", 12.0, 22.0, None, None, None, None, None, None, None, None, None),
+    ]
+    batch = EvidenceBatch.from_rows(rows, 3 / 3600)
+    results = [
+        (
+            "a",
+            CrossmatchResult(
+                status=CrossmatchStatus.COLLIDING,
+                triage_status=TriageStatus.PENDING,
+                colliding_pgcs=[1, 2],
+                pending_reason=PendingReason.MULTIPLE_OBJECTS_MATCHED,
+            ),
+        ),
+        ("b", CrossmatchResult(status=CrossmatchStatus.NEW, triage_status=TriageStatus.RESOLVED)),
+        (
+            "c",
+            CrossmatchResult(
+                status=CrossmatchStatus.NEW,
+                triage_status=TriageStatus.PENDING,
+                pending_reason=PendingReason.DUPLICATE_IN_TABLE,
+            ),
+        ),
+    ]
+    path = tmp_path / "pending.csv.gz"
+
+    with PendingWriter(path) as writer:
+        writer.write_batch(batch, results)
+
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        written = list(csv.DictReader(f))
+    assert [(r["record_id"], r["neighbor_pgc"]) for r in written] == [("a", "1"), ("a", "2"), ("c", "")]
+    assert written[0]["colliding_pgcs"] == "1;2"
+    assert written[0]["neighbor_designation"] == "NGC 1"
+    assert writer.counts == {"MULTIPLE_OBJECTS_MATCHED": 1, "DUPLICATE_IN_TABLE": 1}
@@ -0,0 +1,70 @@
+import dataclasses
+import random
+
+from uploader.app.crossmatch.batch import EvidenceBatch
+from uploader.app.crossmatch.models import Neighbor, NeighborTable, RecordEvidence
+from uploader.app.crossmatch.resolver import LayeredResolver
+
+RADIUS_DEG = 3 / 3600
+TYPES = [None, "G", "ext", "*", "QSO", "?"]
+
+
+def _random_evidence(rnd: random.Random) -> RecordEvidence:
+    pool = rnd.sample(range(1, 40), 6)
+    neighbors = [
+        Neighbor(
+            pgc=rnd.choice(pool),
+            ra=10.0,
+            dec=20.0,
+            distance_deg=rnd.choice([0.5, 1.0, 2.5, 3.0, 4.0, 8.0]) / 3600,
+            redshift=rnd.choice([None, 0.01, 0.0105, 0.02]),
+            type_name=rnd.choice(TYPES),
+        )
+        for _ in range(rnd.choice([0, 0, 1, 1, 2, 3, 5]))
+    ]
+    same_name_pgcs = rnd.choice([None, None, [rnd.choice(pool)], rnd.sample(pool, rnd.randint(2, 3))])
+    record_pgc = rnd.choice([None, None, rnd.choice(pool), 99])
+    return RecordEvidence(
+        neighbors=NeighborTable.from_neighbors(neighbors),
+        record_designation="NGC 1" if same_name_pgcs else None,
+        same_name_pgcs=same_name_pgcs,
+        record_pgc=record_pgc,
+        claimed_pgc_exists_in_layer2=record_pgc is not None and (record_pgc != 99 or rnd.random() < 0.5),
+        record_redshift=rnd.choice([None, 0.01, 0.0102, 0.02]),
+        record_type_name=rnd.choice(TYPES),
+        duplicate_distance_deg=rnd.choice([None, None, None, 1.0 / 3600, 2.0 / 3600]),
+    )
+
+
+def test_resolve_batch_matches_scalar_resolve() -> None:
+    rnd = random.Random(20240501)
+    records = [(f"rec-{i}", _random_evidence(rnd)) for i in range(5000)]
+    batch = EvidenceBatch.from_evidence(records)
+    narrowed = batch.within_radius(RADIUS_DEG / 2)
+
+    for resolver in [
+        LayeredResolver(radius_deg=RADIUS_DEG),
+        LayeredResolver(radius_deg=RADIUS_DEG, pgc_column="pgc", redshift_tolerance=0.001),
+        LayeredResolver(radius_deg=RADIUS_DEG / 2, redshift_tolerance=0.00001),
+    ]:
+        expected = [resolver.resolve(evidence) for _, evidence in records]
+        assert resolver.resolve_batch(batch) == expected
+        assert resolver.resolve_batch(narrowed) == [
+            resolver.resolve(evidence) for _, evidence in narrowed.iter_evidence()
+        ]
+
+
+def test_resolve_batch_without_candidates() -> None:
+    rnd = random.Random(31)
+    records = [
+        (f"rec-{i}", dataclasses.replace(_random_evidence(rnd), neighbors=NeighborTable.from_neighbors([])))
+        for i in range(200)
+    ]
+    batch = EvidenceBatch.from_evidence(records)
+    assert len(batch.candidates) == 0
+
+    for resolver in [
+        LayeredResolver(radius_deg=RADIUS_DEG),
+        LayeredResolver(radius_deg=RADIUS_DEG, pgc_column="pgc", redshift_tolerance=0.001),
+    ]:
+        assert resolver.resolve_batch(batch) == [resolver.resolve(evidence) for _, evidence in records]
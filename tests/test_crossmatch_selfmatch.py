@@ -0,0 +1,74 @@
+import numpy as np
+
+from uploader.app.crossmatch.models import CrossmatchStatus, NeighborTable, PendingReason, RecordEvidence
+from uploader.app.crossmatch.resolver import LayeredResolver
+from uploader.app.crossmatch.selfmatch import SelfMatch, find_pairs
+
+
+def _brute_force_pairs(ra: np.ndarray, dec: np.ndarray, radius_deg: float) -> set[tuple[int, int]]:
+    ra_rad, dec_rad = np.radians(ra), np.radians(dec)
+    pairs: set[tuple[int, int]] = set()
+    for i in range(len(ra)):
+        cos_d = np.sin(dec_rad[i]) * np.sin(dec_rad) + np.cos(dec_rad[i]) * np.cos(dec_rad) * np.cos(ra_rad - ra_rad[i])
+        distance = np.degrees(np.arccos(np.clip(cos_d, -1, 1)))
+        pairs.update((i, int(j)) for j in np.flatnonzero(distance <= radius_deg) if j > i)
+    return pairs
+
+
+def test_find_pairs_matches_brute_force() -> None:
+    rng = np.random.default_rng(7)
+    radius_deg = 0.05
+    ra = np.concatenate((rng.uniform(0, 360, 500), rng.uniform(359.9, 360, 50), rng.uniform(0, 0.1, 50)))
+    dec = np.concatenate((rng.uniform(-2, 2, 500), rng.uniform(-0.1, 0.1, 100)))
+    ra = np.concatenate((ra, rng.uniform(0, 360, 50)))
+    dec = np.concatenate((dec, rng.uniform(89.97, 90, 50)))
+
+    first, second, distance = find_pairs(ra, dec, radius_deg)
+
+    assert set(zip(first.tolist(), second.tolist(), strict=True)) == _brute_force_pairs(ra, dec, radius_deg)
+    assert np.all(distance <= radius_deg)
+
+
+def test_find_pairs_in_narrow_declination_band() -> None:
+    rng = np.random.default_rng(33)
+    radius_deg = 2 / 3600
+    ra = np.concatenate((rng.uniform(0, 360, 2000), rng.uniform(120, 120 + 10 * radius_deg, 300)))
+    dec = rng.uniform(-radius_deg / 2, radius_deg / 2, len(ra))
+
+    first, second, distance = find_pairs(ra, dec, radius_deg)
+
+    assert set(zip(first.tolist(), second.tolist(), strict=True)) == _brute_force_pairs(ra, dec, radius_deg)
+    assert np.all(first < second)
+    assert np.all(distance <= radius_deg)
+
+
+def test_find_pairs_without_positions() -> None:
+    first, second, distance = find_pairs(np.zeros(0), np.zeros(0), 1.0)
+    assert len(first) == len(second) == len(distance) == 0
+
+
+def test_groups_and_nearest_duplicates() -> None:
+    matches = SelfMatch(
+        radius_deg=1.0,
+        record_ids=["a", "b", "c", "d", "e", "f"],
+        first=np.array([0, 1, 4], dtype=np.int64),
+        second=np.array([1, 2, 5], dtype=np.int64),
+        distance_deg=np.array([0.5, 0.2, 0.7]),
+    )
+
+    assert matches.groups() == [["a", "b", "c"], ["e", "f"]]
+    assert matches.nearest_duplicate_deg() == {"a": 0.5, "b": 0.2, "c": 0.2, "e": 0.7, "f": 0.7}
+
+
+def test_new_record_with_duplicate_is_pending() -> None:
+    resolver = LayeredResolver(radius_deg=3 / 3600)
+    evidence = RecordEvidence(neighbors=NeighborTable.from_neighbors([]), duplicate_distance_deg=1 / 3600)
+
+    result = resolver.resolve(evidence)
+
+    assert result.status == CrossmatchStatus.NEW
+    assert result.pending_reason == PendingReason.DUPLICATE_IN_TABLE
+    assert (
+        resolver.resolve(RecordEvidence(neighbors=evidence.neighbors, duplicate_distance_deg=5 / 3600)).pending_reason
+        is None
+    )
@@ -0,0 +1,56 @@
+import pathlib
+
+from uploader.app.crossmatch.models import Neighbor, NeighborTable, RecordEvidence
+from uploader.app.crossmatch.state import (
+    CELL_DEG,
+    CrossmatchState,
+    RecordState,
+    cell_key,
+    cells_for_position,
+    evidence_fingerprint,
+    load_state,
+    save_state,
+)
+
+
+def test_state_round_trip(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "state.json.gz"
+    state = CrossmatchState(
+        table_name="t",
+        resolver_name="layered",
+        radius_deg=3 / 3600,
+        cells={cell_key(10.0, 20.0): "abc"},
+        records={"rec-1": RecordState(input_digest=1, fingerprint=2)},
+    )
+    save_state(path, state)
+
+    assert load_state(path) == state
+    assert load_state(tmp_path / "missing.json.gz") is None
+
+
+def test_cells_for_position_covers_neighbouring_cell() -> None:
+    radius = 3 / 3600
+    assert cells_for_position(10.1, 20.1, radius) == {cell_key(10.1, 20.1)}
+    assert cell_key(10.0 - radius, 20.1) in cells_for_position(10.0, 20.1, radius)
+    assert cell_key(10.1, 20.0 + CELL_DEG) in cells_for_position(10.1, 20.0 + CELL_DEG - radius / 2, radius)
+
+
+def test_cells_for_position_covers_whole_box_near_pole() -> None:
+    radius = 10 / 3600
+    ra, dec = 100.1, 89.95
+    ra_radius = radius / 0.01
+    assert ra_radius > CELL_DEG
+    cells = cells_for_position(ra, dec, radius)
+    assert cell_key(ra, dec) in cells
+    assert cells == {cell_key(r, dec) for r in (ra - ra_radius, ra, ra + ra_radius)}
+
+
+def test_fingerprint_ignores_neighbor_order() -> None:
+    a = Neighbor(pgc=1, ra=10.0, dec=20.0, distance_deg=0.0)
+    b = Neighbor(pgc=2, ra=10.0, dec=20.0, distance_deg=0.0)
+    assert evidence_fingerprint(RecordEvidence(neighbors=NeighborTable.from_neighbors([a, b]))) == evidence_fingerprint(
+        RecordEvidence(neighbors=NeighborTable.from_neighbors([b, a]))
+    )
+    assert evidence_fingerprint(RecordEvidence(neighbors=NeighborTable.from_neighbors([a]))) != evidence_fingerprint(
+        RecordEvidence(neighbors=NeighborTable.from_neighbors([b]))
+    )
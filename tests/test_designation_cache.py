@@ -0,0 +1,91 @@
+import pathlib
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from uploader.app.structured.designations import cache
+from uploader.app.structured.designations.cache import DiskCache, NameNormalizer
+from uploader.app.structured.designations.profile import RuleProfile
+from uploader.app.structured.designations.rules import RULES, match, rules_fingerprint
+
+NAMES = ["NGC 4472", "M82", "NGC 4472", "unknown catalog XYZ 123", "M82", "PGC 1191069"]
+
+
+def test_normalize_matches_rules() -> None:
+    normalizer = NameNormalizer(max_size=10)
+    results = normalizer.normalize(NAMES)
+    assert results == {name: match(name) for name in NAMES}
+    assert normalizer.computed == 4
+
+
+def test_lru_evicts_oldest_names() -> None:
+    normalizer = NameNormalizer(max_size=2)
+    normalizer.normalize(["M82", "NGC 4472", "PGC 1191069"])
+    normalizer.normalize(["PGC 1191069", "M82"])
+    assert normalizer.hits == 1
+    assert normalizer.computed == 4
+
+
+def test_disk_cache_is_reused_and_reset_by_rules(tmp_path: pathlib.Path, monkeypatch) -> None:
+    path = tmp_path / "names.sqlite3"
+    fingerprint = rules_fingerprint(RULES)
+
+    first = NameNormalizer(disk=DiskCache(path, fingerprint))
+    first.normalize(NAMES)
+    first.close()
+
+    second = NameNormalizer(disk=DiskCache(path, fingerprint))
+    assert second.normalize(NAMES) == {name: match(name) for name in NAMES}
+    assert second.computed == 0
+    assert second.disk_hits == 4
+    second.close()
+
+    changed = NameNormalizer(disk=DiskCache(path, "other"))
+    changed.normalize(NAMES)
+    assert changed.computed == 4
+    changed.close()
+
+    monkeypatch.setattr(cache, "match", lambda name: None)
+    stale = NameNormalizer(disk=DiskCache(path, fingerprint))
+    assert stale.normalize(["M82"]) == {"M82": None}
+
+
+def test_executor_keeps_name_order() -> None:
+    names = [f"NGC {i}" for i in range(1, 50)] + ["unknown catalog XYZ 123"]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        normalizer = NameNormalizer(executor=executor, chunk_size=7)
+        results = normalizer.normalize(names)
+    assert list(results) == names
+    assert results == {name: match(name) for name in names}
+
+
+def test_fingerprint_depends_on_rules() -> None:
+    assert rules_fingerprint(RULES) == rules_fingerprint(list(RULES))
+    assert rules_fingerprint(RULES) != rules_fingerprint(RULES[:-1])
+
+
+def test_context_manager_closes_on_error(tmp_path: pathlib.Path) -> None:
+    executor = ThreadPoolExecutor(max_workers=2)
+    disk = DiskCache(tmp_path / "names.sqlite3", rules_fingerprint(RULES))
+    with pytest.raises(RuntimeError, match="cancelled"), NameNormalizer(disk=disk, executor=executor) as normalizer:
+        normalizer.normalize(NAMES)
+        raise RuntimeError("cancelled")
+
+    with pytest.raises(RuntimeError):
+        executor.submit(match, "M82")
+    with pytest.raises(sqlite3.ProgrammingError):
+        disk.get_many(["M82"])
+
+
+def test_profiling_bypasses_caches(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "names.sqlite"
+    with cache.open_normalizer(10, path) as normalizer:
+        normalizer.normalize(NAMES)
+
+    profile = RuleProfile(RULES)
+    with cache.open_normalizer(10, path, profile=profile) as normalizer:
+        normalizer.normalize(NAMES)
+        normalizer.normalize(NAMES)
+        assert (normalizer.hits, normalizer.disk_hits, normalizer.computed) == (0, 0, 8)
+    assert profile.names == 8
@@ -0,0 +1,29 @@
+import re
+
+from uploader.app.structured.designations.profile import RuleProfile
+from uploader.app.structured.designations.rules import RULES, NameRule, match
+
+NAMES = ["NGC 4472", "M82", "unknown catalog XYZ 123", "PGC 1191069", "SDSSJ121551.62+573421.6", " "]
+
+
+def test_profile_matches_like_rules() -> None:
+    profile = RuleProfile(RULES)
+    assert [profile.match(name) for name in NAMES] == [match(name) for name in NAMES]
+    assert profile.names == 5
+    assert sum(s.hits for s in profile.stats) == 4
+    assert profile.stats[0].attempts == 5
+    assert all(s.attempts >= s.hits for s in profile.stats)
+
+
+def test_profile_flags_shadowed_rules() -> None:
+    rules = [
+        NameRule(name="ANY", pattern=re.compile(r"^([a-z]+)\s*(\d+)$", re.IGNORECASE), replacement="{0} {1}"),
+        NameRule(name="NGC", pattern=re.compile(r"^NGC\s*(\d+)$", re.IGNORECASE), replacement="NGC {0}"),
+        NameRule(name="NEVER", pattern=re.compile(r"^ZZZ$"), replacement="ZZZ"),
+    ]
+    profile = RuleProfile(rules)
+    for name in ["NGC 1", "NGC2", "UGC 3"]:
+        profile.match(name)
+    assert profile.stats[1].shadowed == 2
+    assert profile.stats[1].attempts == 0
+    assert profile.shadowed_rules() == [(1, 0)]
@@ -1,6 +1,9 @@
+import random
+import string
+
 import pytest
 
-from uploader.app.structured.designations.rules import match
+from uploader.app.structured.designations.rules import RULES, match
 
 RULE_CASES: list[tuple[str, tuple[str, str] | None]] = [
     ("PGC1191069", ("PGC", "PGC 1191069")),
@@ -455,3 +458,37 @@ def test_rule_match(input_name: str, expected: tuple[str, str] | None) -> None:
 
 def test_unmatched_name_returns_none() -> None:
     assert match("unknown catalog XYZ 123") is None
+
+
+def _linear_match(name: str) -> tuple[str, str] | None:
+    value = name.strip()
+    for rule in RULES:
+        formatted = rule.match(value)
+        if formatted is not None:
+            return (formatted, rule.name)
+    return None
+
+
+def test_matcher_agrees_with_linear_scan() -> None:
+    rng = random.Random(39)
+    seeds = [name for name, _ in RULE_CASES if name]
+    alphabet = string.ascii_letters + string.digits + " +-.:[]_#"
+    names = list(seeds)
+    for _ in range(20000):
+        name = rng.choice(seeds)
+        mode = rng.randrange(4)
+        if mode == 0:
+            name = "".join(rng.choice(alphabet) if rng.random() < 0.15 else ch for ch in name)
+        elif mode == 1:
+            i = rng.randrange(len(name) + 1)
+            name = name[:i] + rng.choice(alphabet) + name[i:]
+        elif mode == 2:
+            i = rng.randrange(len(name))
+            name = name[:i] + name[i + 1 :]
+        else:
+            name = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 25)))
+        names.append(name)
+
+    for name in names:
+        if name.strip():
+            assert match(name) == _linear_match(name), name
@@ -115,3 +115,11 @@ def test_surface_brightness_column_keeps_units() -> None:
 def test_bare_column_referenced_in_parse() -> None:
     expr = parse("3 * 10 ** col('logd25') * 2.302585093 * e_logd25 * arcsec")
     assert expr.referenced_columns == {"logd25", "e_logd25"}
+
+
+def test_single_column_expression() -> None:
+    assert parse("logd25").column == "logd25"
+    assert parse('col("a b")').column == "a b"
+    assert parse("pi").column is None
+    assert parse("2 * a").column is None
+    assert parse("sin(pa)").column is None
@@ -0,0 +1,28 @@
+from typing import Any, cast
+
+from psycopg import sql
+
+from uploader.app.storage import PgStorage
+from uploader.app.structured.icrs.upload import IcrsTransformer, _aggregate_on_server, _SkyCoverageAccumulator
+
+
+class _Storage:
+    def __init__(self) -> None:
+        self.queries: list[str] = []
+
+    def query(self, query: sql.Composable, params: Any) -> list[dict[str, Any]]:
+        self.queries.append(query.as_string(None))
+        return []
+
+
+def test_nan_coordinates_are_not_binned() -> None:
+    storage = _Storage()
+    transformer = IcrsTransformer("ra", "dec", {}, {"ra": "deg", "dec": "deg"})
+
+    _aggregate_on_server(cast(PgStorage, storage), "t", transformer, _SkyCoverageAccumulator())
+
+    [query] = storage.queries
+    for column in ("ra", "dec"):
+        finite = f'"dec" IS NOT NULL AND "ra" IS NOT NULL AND "{column}"::float8 <> \'NaN\''
+        assert f"CASE WHEN {finite} THEN" in query
+    assert 'CASE WHEN "dec" IS NOT NULL AND "ra" IS NOT NULL THEN' not in query
@@ -0,0 +1,123 @@
+from typing import Any, cast
+
+import pytest
+
+import uploader.app.report as report
+from uploader.app.storage import PgStorage
+from uploader.app.structured import combined, writer
+from uploader.app.structured.catalog import CatalogBatch, ColumnBatch
+from uploader.forms import structured_combined
+from uploader.forms.structured_combined import (
+    CombinedDesignationSettings,
+    CombinedIcrsSettings,
+    StructuredCombinedForm,
+    _transformers,
+)
+
+
+class _Storage:
+    def __init__(self, rows: list[dict[str, Any]]) -> None:
+        self.rows = rows
+        self.scans = 0
+
+    def query(self, query: Any, params: Any) -> list[dict[str, Any]]:
+        return [{"cnt": len(self.rows)}]
+
+    def query_columns(self, query: Any, params: tuple[str, int]) -> dict[str, tuple[Any, ...]]:
+        last_id, limit = params
+        if last_id == "":
+            self.scans += 1
+        batch = [row for row in self.rows if row["hyperleda_internal_id"] > last_id][:limit]
+        return {name: tuple(row[name] for row in batch) for name in self.rows[0]}
+
+
+class _Client:
+    def get_httpx_client(self) -> None:
+        pass
+
+
+class _Transformer:
+    units = None
+
+    def __init__(self, catalog: str, column: str) -> None:
+        self.catalog = catalog
+        self.columns = [column]
+        self.raw_columns = [column]
+        self.batches: list[list[str]] = []
+        self.uploaded = 0
+        self.skipped = 0
+
+    def transform(self, batch: ColumnBatch) -> CatalogBatch:
+        ids = list(batch["hyperleda_internal_id"])
+        self.batches.append(ids)
+        values = batch[self.raw_columns[0]]
+        out = CatalogBatch(
+            ids=[i for i, v in zip(ids, values, strict=True) if v is not None],
+            data=[[v] for v in values if v is not None],
+        )
+        self.uploaded += len(out.ids)
+        self.skipped += len(ids) - len(out.ids)
+        return out
+
+    def details(self) -> str:
+        return ""
+
+
+def test_one_scan_feeds_every_catalog(monkeypatch: pytest.MonkeyPatch) -> None:
+    rows = [{"hyperleda_internal_id": f"id{i:02}", "a": i, "b": None if i % 3 else -i} for i in range(10)]
+    storage = _Storage(rows)
+    saved: list[tuple[str, list[str], list[list[Any]]]] = []
+    monkeypatch.setattr(combined, "catalog_request", lambda t, b: (t.catalog, b.ids, b.data))
+    monkeypatch.setattr(writer, "save_catalog", lambda client, body: saved.append(body))
+
+    first, second = _Transformer("first", "a"), _Transformer("second", "b")
+    events: list[report.Event] = []
+    processed = combined.upload_structured(
+        cast(PgStorage, storage),
+        "t",
+        [first, second],
+        4,
+        cast(Any, _Client()),
+        write=True,
+        report_func=events.append,
+    )
+
+    assert processed == 10
+    assert storage.scans == 1
+    assert first.batches == second.batches
+    assert [len(ids) for ids in first.batches] == [4, 4, 2]
+    assert (first.uploaded, second.uploaded, second.skipped) == (10, 4, 6)
+    assert sorted(saved) == sorted(
+        [("first", ids, [[int(i[2:])] for i in ids]) for ids in first.batches]
+        + [("second", ids, [[-int(i[2:])] for i in ids]) for ids in [["id00", "id03"], ["id06"], ["id09"]]]
+    )
+    assert isinstance(events[-1], report.DoneEvent)
+
+
+def test_dry_run_does_not_save(monkeypatch: pytest.MonkeyPatch) -> None:
+    rows = [{"hyperleda_internal_id": f"id{i}", "a": i} for i in range(3)]
+    monkeypatch.setattr(writer, "save_catalog", lambda client, body: pytest.fail("saved in dry run"))
+    transformer = _Transformer("first", "a")
+    combined.upload_structured(
+        cast(PgStorage, _Storage(rows)),
+        "t",
+        [transformer],
+        2,
+        cast(Any, _Client()),
+        report_func=lambda event: None,
+    )
+    assert transformer.uploaded == 3
+
+
+@pytest.mark.parametrize("e_ra, e_dec", [("", "1"), ("1", " ")])
+def test_icrs_errors_are_required(e_ra: str, e_dec: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    opened: list[Any] = []
+    monkeypatch.setattr(structured_combined, "open_normalizer", lambda *args: opened.append(args))
+    form = StructuredCombinedForm(
+        table_name="t",
+        designation=CombinedDesignationSettings(column_name="name"),
+        icrs=CombinedIcrsSettings(ra_column="ra", dec_column="dec", e_ra=e_ra, e_dec=e_dec),
+    )
+    with pytest.raises(ValueError, match="e_ra and e_dec"):
+        _transformers(form, cast(Any, _Client()))
+    assert opened == []
@@ -0,0 +1,72 @@
+from typing import Any, cast
+
+import pytest
+
+from uploader.app.storage import PgStorage
+from uploader.app.structured.catalog import CatalogBatch
+from uploader.app.structured.diff import CatalogDiff
+
+
+class _Storage:
+    def __init__(self, rows: list[dict[str, Any]]) -> None:
+        self.rows = rows
+        self.queries: list[str] = []
+
+    def query(self, query: Any, params: tuple[list[str]]) -> list[dict[str, Any]]:
+        self.queries.append(query.as_string(None))
+        (ids,) = params
+        return [row for row in self.rows if row["record_id"] in ids]
+
+
+def test_sends_only_new_and_changed_rows() -> None:
+    storage = _Storage(
+        [
+            {"record_id": "same", "cz": 1000.0, "e_cz": 10.0},
+            {"record_id": "close", "cz": 2000.0, "e_cz": 10.0},
+            {"record_id": "moved", "cz": 3000.0, "e_cz": 10.0},
+            {"record_id": "no_error", "cz": 4000.0, "e_cz": None},
+        ]
+    )
+    diff = CatalogDiff(cast(PgStorage, storage), "redshift", ["cz", "e_cz"], tolerance=1e-6)
+    out = diff.filter(
+        CatalogBatch(
+            ids=["same", "close", "moved", "no_error", "fresh"],
+            data=[[1000.0, 10.0], [2000.0000001, 10.0], [3001.0, 10.0], [4000.0, 5.0], [5000.0, 10.0]],
+        )
+    )
+
+    assert out.ids == ["moved", "no_error", "fresh"]
+    assert out.data == [[3001.0, 10.0], [4000.0, 5.0], [5000.0, 10.0]]
+    assert (diff.unchanged, diff.changed, diff.new) == (2, 2, 1)
+    assert storage.queries == ['SELECT record_id, "cz", "e_cz" FROM "cz"."data" WHERE record_id = ANY(%s)']
+
+
+def test_values_are_compared_in_stored_units() -> None:
+    storage = _Storage([{"record_id": "a", "ra": 15.0, "dec": 10.0, "e_ra": 1 / 3600, "e_dec": 2 / 3600}])
+    diff = CatalogDiff(
+        cast(PgStorage, storage),
+        "icrs",
+        ["ra", "dec", "e_ra", "e_dec"],
+        {"ra": "hourangle", "dec": "deg", "e_ra": "arcsec", "e_dec": "arcsec"},
+    )
+    assert diff.filter(CatalogBatch(ids=["a"], data=[[1.0, 10.0, 1.0, 2.0]])).ids == []
+    assert diff.unchanged == 1
+
+
+def test_strings_must_match_exactly() -> None:
+    storage = _Storage([{"record_id": "a", "design": "NGC 1"}, {"record_id": "b", "design": "NGC 2"}])
+    diff = CatalogDiff(cast(PgStorage, storage), "designation", ["design"])
+    out = diff.filter(CatalogBatch(ids=["a", "b"], data=[["NGC 1"], ["NGC 0002"]]))
+    assert out.ids == ["b"]
+
+
+def test_empty_batch_is_not_queried() -> None:
+    storage = _Storage([])
+    diff = CatalogDiff(cast(PgStorage, storage), "nature", ["type_name"])
+    assert diff.filter(CatalogBatch(ids=[], data=[])).ids == []
+    assert storage.queries == []
+
+
+def test_unsupported_catalog() -> None:
+    with pytest.raises(ValueError):
+        CatalogDiff(cast(PgStorage, _Storage([])), "photometry", ["band"])
@@ -0,0 +1,42 @@
+import random
+from collections import Counter
+
+import pytest
+
+from uploader.app.lib.columns import factorize
+from uploader.app.structured.nature.upload import map_types
+
+MAPPING = {"E": "G", "S0": "G", "QSO": "Q", "*": "S"}
+
+
+def _reference(values: list[str | None], default_type: str | None) -> list[str]:
+    out: list[str] = []
+    for raw_val in values:
+        raw_key = str(raw_val).strip() if raw_val is not None else ""
+        out.append(MAPPING.get(raw_key, default_type if default_type is not None else raw_key))
+    return out
+
+
+def test_factorize() -> None:
+    uniques, codes = factorize(["b", None, "a", "b", None])
+    assert uniques == ["b", None, "a"]
+    assert codes.tolist() == [0, 1, 2, 0, 1]
+
+
+@pytest.mark.parametrize("default_type", [None, "U"])
+def test_map_types_matches_row_loop(default_type: str | None) -> None:
+    rng = random.Random(44)
+    raw = ["E", " E ", "S0", "QSO", "*", "Sc", None, "irr"]
+    values = [rng.choice(raw) for _ in range(2000)]
+    types, counts = map_types(values, len(values), MAPPING, default_type)
+    expected = _reference(values, default_type)
+    assert types == expected
+    assert counts == Counter(expected)
+
+
+def test_map_types_without_column() -> None:
+    types, counts = map_types(None, 3, MAPPING, "G")
+    assert types == ["G", "G", "G"]
+    assert counts == Counter({"G": 3})
+    with pytest.raises(RuntimeError):
+        map_types(None, 3, MAPPING, None)
@@ -0,0 +1,63 @@
+import decimal
+import math
+import random
+from typing import Any
+
+from uploader.app.structured.photometry.upload import BANDS, unpivot_bands
+
+
+def _reference(rows: list[dict[str, Any]]) -> tuple[list[str], list[list[str | float]], int]:
+    ids: list[str] = []
+    data: list[list[str | float]] = []
+    objects = 0
+    for row in rows:
+        had_any = False
+        for band, mag_col, err_col in BANDS:
+            if row[mag_col] is not None and row[err_col] is not None:
+                ids.append(row["hyperleda_internal_id"])
+                data.append([band, float(row[mag_col]), float(row[err_col]), "asymptotic"])
+                had_any = True
+        objects += had_any
+    return ids, data, objects
+
+
+def _columns(rows: list[dict[str, Any]]) -> dict[str, tuple[Any, ...]]:
+    return {name: tuple(row[name] for row in rows) for name in rows[0]}
+
+
+def _value(rng: random.Random) -> Any:
+    kind = rng.randrange(5)
+    if kind == 0:
+        return None
+    if kind == 1:
+        return decimal.Decimal(f"{rng.uniform(8, 22):.3f}")
+    if kind == 2:
+        return f"{rng.uniform(0, 1):.2f}"
+    return rng.uniform(8, 22)
+
+
+def test_unpivot_matches_row_loop() -> None:
+    rng = random.Random(43)
+    rows = [
+        {"hyperleda_internal_id": f"r{i:04d}", **{c: _value(rng) for _, mag, err in BANDS for c in (mag, err)}}
+        for i in range(500)
+    ]
+    batch = unpivot_bands(_columns(rows))
+    ids, data, objects = _reference(rows)
+    assert batch.ids == ids
+    assert batch.data == data
+    assert batch.objects == objects
+    for j, (band, _, _) in enumerate(BANDS):
+        mags = [float(d[1]) for d in data if d[0] == band]
+        assert batch.band_counts[j] == len(mags)
+        assert math.isclose(batch.band_mag_sums[j], sum(mags))
+
+
+def test_unpivot_keeps_stored_nan() -> None:
+    row: dict[str, Any] = {"hyperleda_internal_id": "r1", **{c: None for _, mag, err in BANDS for c in (mag, err)}}
+    row["bt"] = math.nan
+    row["e_bt"] = 0.1
+    batch = unpivot_bands(_columns([row]))
+    assert batch.ids == ["r1"]
+    assert batch.data[0][0] == "B" and math.isnan(float(batch.data[0][1]))
+    assert batch.objects == 1
@@ -0,0 +1,39 @@
+import decimal
+import math
+import random
+from typing import Any
+
+import numpy as np
+
+from uploader.app.structured.redshift.upload import C_KM_S, _CzStats, cz_column
+
+
+def test_cz_column_and_stats_match_row_loop() -> None:
+    rng = random.Random(45)
+    stats = _CzStats()
+    cz_min, cz_max, cz_sum = float("inf"), float("-inf"), 0.0
+    for _ in range(5):
+        values: list[Any] = [
+            rng.choice([None, rng.uniform(-0.01, 1.2), decimal.Decimal(f"{rng.uniform(0, 0.5):.6f}")])
+            for _ in range(1000)
+        ]
+        expected_rows = [i for i, z in enumerate(values) if z is not None]
+        expected_cz = [float(values[i]) * C_KM_S for i in expected_rows]
+        for cz_val in expected_cz:
+            cz_min = min(cz_min, cz_val)
+            cz_max = max(cz_max, cz_val)
+            cz_sum += cz_val
+
+        rows, cz = cz_column(values)
+        stats.add(cz)
+        assert rows.tolist() == expected_rows
+        assert cz.tolist() == expected_cz
+
+    assert (stats.min, stats.max, stats.sum) == (cz_min, cz_max, cz_sum)
+
+
+def test_stats_skip_nan_in_min_and_max() -> None:
+    stats = _CzStats()
+    stats.add(np.array([math.nan, 3.0, 1.0]))
+    assert (stats.min, stats.max) == (1.0, 3.0)
+    assert math.isnan(stats.sum)
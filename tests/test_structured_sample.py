@@ -0,0 +1,91 @@
+import random
+from collections.abc import Iterator
+from typing import Any, cast
+
+import numpy as np
+import pytest
+
+from uploader.app.lib.rawdata import _batch_query, _sample_query, rawdata_batches, rawdata_column_batches
+from uploader.app.storage import PgStorage
+from uploader.app.structured.sample import DrySample
+
+
+def test_resolve() -> None:
+    assert DrySample.resolve(1000, 0, 0, write=False) is None
+    assert DrySample.resolve(1000, 100, 0, write=False) is None
+    assert DrySample.resolve(1000, 0, 5000, write=False) is None
+
+    sample = DrySample.resolve(1000, 10, 50, write=False)
+    assert sample is not None
+    assert sample.percent == 5.0
+    assert sample.expected_rows == 50
+
+    with pytest.raises(ValueError):
+        DrySample.resolve(1000, 10, 0, write=True)
+
+
+class _Storage:
+    def __init__(self, rows: list[tuple[Any, ...]]) -> None:
+        self.rows = rows
+        self.streamed: list[str] = []
+
+    def stream(self, query: Any, params: Any = None, *, chunk_size: int = 10000) -> Iterator[tuple[Any, ...]]:
+        self.streamed.append(query.as_string(None))
+        yield from self.rows
+
+    def query(self, query: Any, params: Any = None) -> list[dict[str, Any]]:
+        pytest.fail("sampled scan paged with keyset queries")
+
+    def query_columns(self, query: Any, params: Any = None) -> dict[str, tuple[Any, ...]]:
+        pytest.fail("sampled scan paged with keyset queries")
+
+
+def test_sampled_scan_query() -> None:
+    query = _sample_query("t", ["a"], 2.5).as_string(None)
+    assert 'FROM rawdata."t" TABLESAMPLE BERNOULLI (2.5) REPEATABLE (0) ORDER BY' in query
+    assert "LIMIT" not in query
+    assert "TABLESAMPLE" not in _batch_query("t", ["a"]).as_string(None)
+
+
+def test_sampled_scan_runs_one_query() -> None:
+    rows = [(f"id{i}", i, -i) for i in range(5)]
+    storage = _Storage(rows)
+
+    batches = list(rawdata_column_batches(cast(PgStorage, storage), "t", ["a", "b"], 2, sample_percent=10.0))
+    assert [batch["hyperleda_internal_id"] for batch in batches] == [("id0", "id1"), ("id2", "id3"), ("id4",)]
+    assert batches[1] == {"hyperleda_internal_id": ("id2", "id3"), "a": (2, 3), "b": (-2, -3)}
+
+    row_batches = list(rawdata_batches(cast(PgStorage, storage), "t", ["a", "b"], 4, sample_percent=10.0))
+    assert [len(batch) for batch in row_batches] == [4, 1]
+    assert row_batches[1] == [{"hyperleda_internal_id": "id4", "a": 4, "b": -4}]
+    assert len(storage.streamed) == 2
+
+
+def test_interval_covers_true_count() -> None:
+    rng = random.Random(48)
+    table_rows = 10_000
+    true_count = 1_500
+    covered = 0
+    runs = 200
+    for _ in range(runs):
+        sample = DrySample(percent=5.0, table_rows=table_rows)
+        hits = 0
+        for row in range(table_rows):
+            if rng.random() < 0.05:
+                sample.add(1)
+                hits += row < true_count
+        est = sample.estimate(hits)
+        assert est.low <= est.value <= est.high
+        covered += est.low <= true_count <= est.high
+    assert 0.9 <= covered / runs <= 0.99
+
+
+def test_estimate_counts_matches_estimate() -> None:
+    sample = DrySample(percent=10.0, table_rows=1000)
+    sample.add(100)
+    values, low, high = sample.estimate_counts(np.array([0, 10, 100], dtype=np.int64))
+    assert values.tolist() == [0.0, 100.0, 1000.0]
+    assert (low[0], high[0]) == (0.0, 0.0)
+    assert (low[2], high[2]) == (1000.0, 1000.0)
+    est = sample.estimate(10)
+    assert (est.value, est.low, est.high) == (values[1], low[1], high[1])
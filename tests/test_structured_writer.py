@@ -0,0 +1,58 @@
+import threading
+from typing import Any, cast
+
+import pytest
+
+from uploader.app.structured import writer
+from uploader.app.structured.writer import StructuredWriter
+
+
+class _Client:
+    def __init__(self) -> None:
+        self.pools = 0
+
+    def get_httpx_client(self) -> None:
+        self.pools += 1
+
+
+def test_in_flight_requests_are_bounded(monkeypatch: pytest.MonkeyPatch) -> None:
+    release = threading.Event()
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+    sent: list[int] = []
+
+    def save(client: Any, body: int) -> None:
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        release.wait()
+        with lock:
+            running -= 1
+            sent.append(body)
+
+    monkeypatch.setattr(writer, "save_catalog", save)
+    client = _Client()
+    with StructuredWriter(cast(Any, client), max_in_flight=2) as w:
+        w.submit(cast(Any, 1))
+        w.submit(cast(Any, 2))
+        assert w.pending == 2
+        threading.Timer(0.05, release.set).start()
+        w.submit(cast(Any, 3))
+    assert sorted(sent) == [1, 2, 3]
+    assert peak <= 2
+    assert w.pending == 0
+    assert w.acknowledged == 3
+    assert client.pools == 1
+
+
+def test_failed_request_fails_the_run(monkeypatch: pytest.MonkeyPatch) -> None:
+    def save(client: Any, body: int) -> None:
+        if body == 2:
+            raise RuntimeError("rejected")
+
+    monkeypatch.setattr(writer, "save_catalog", save)
+    with pytest.raises(RuntimeError, match="rejected"), StructuredWriter(cast(Any, _Client())) as w:
+        for body in range(5):
+            w.submit(cast(Any, body))
@@ -0,0 +1,70 @@
+import pathlib
+import threading
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+import uploader.app.crossmatch.submit as submit
+
+
+class _Storage:
+    def __init__(self, ids: list[str]) -> None:
+        self.ids = ids
+
+    def query(self, query: Any, params: tuple[Any, ...] = ()) -> list[dict[str, Any]]:
+        if "layer0.tables" in str(query):
+            return [{"id": "table"}]
+        if "COUNT(*)" in str(query):
+            return [{"cnt": sum(1 for i in self.ids if i > params[1])}]
+        _, last_id, limit = params
+        return [{"id": i} for i in self.ids if i > last_id][:limit]
+
+
+def test_watermark_waits_for_earlier_batches() -> None:
+    watermark = submit.Watermark("")
+    first, second, third = watermark.add("a"), watermark.add("b"), watermark.add("c")
+
+    assert not watermark.acknowledge(second)
+    assert watermark.last_id == ""
+    assert watermark.acknowledge(first)
+    assert watermark.last_id == "b"
+    assert watermark.acknowledge(third)
+    assert watermark.last_id == "c"
+
+
+def test_interrupted_submission_resumes(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    ids = [f"r{i:03d}" for i in range(100)]
+    progress_path = tmp_path / "progress.json"
+    assigned: list[str] = []
+    lock = threading.Lock()
+
+    def failing_assign(client: Any, body: Any, write: bool) -> float:
+        if "r050" in body.record_ids:
+            raise RuntimeError("server error")
+        with lock:
+            assigned.extend(body.record_ids)
+        return 0.01
+
+    monkeypatch.setattr(submit, "AssignRecordPgcsRequest", lambda record_ids: SimpleNamespace(record_ids=record_ids))
+    monkeypatch.setattr(submit, "_assign", failing_assign)
+    with pytest.raises(RuntimeError):
+        submit.run_submit_crossmatch(
+            _Storage(ids), "t", 10, object(), lambda e: None, write=True, concurrency=3, progress_path=progress_path
+        )
+    resume_after = submit.load_progress(progress_path, "t")
+    assert resume_after < "r050"
+    assert all(i in assigned for i in ids if i <= resume_after)
+
+    def assign(client: Any, body: Any, write: bool) -> float:
+        with lock:
+            assigned.extend(body.record_ids)
+        return 0.01
+
+    monkeypatch.setattr(submit, "_assign", assign)
+    submit.run_submit_crossmatch(
+        _Storage(ids), "t", 10, object(), lambda e: None, write=True, concurrency=3, progress_path=progress_path
+    )
+    assert set(assigned) == set(ids)
+    assert submit.load_progress(progress_path, "t") == "r099"
+    assert submit.load_progress(progress_path, "other") == ""
@@ -1,3 +1,5 @@
-from uploader.app.crossmatch.engine import run_crossmatch
+from uploader.app.crossmatch.calibration import run_radius_calibration
+from uploader.app.crossmatch.engine import run_crossmatch, run_incremental_crossmatch, run_self_match
+from uploader.app.crossmatch.replay import run_replay
 
-__all__ = ["run_crossmatch"]
+__all__ = ["run_crossmatch", "run_incremental_crossmatch", "run_radius_calibration", "run_replay", "run_self_match"]
@@ -0,0 +1,256 @@
+import array
+import dataclasses
+import math
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Any, Self
+
+import numpy as np
+import numpy.typing as npt
+
+from uploader.app.crossmatch.models import NeighborTable, RecordEvidence, type_code, type_name_of
+
+C_M_S = 299792458
+
+
+def angular_distances_deg(
+    ra1: npt.NDArray[np.float64],
+    dec1: npt.NDArray[np.float64],
+    ra2: npt.NDArray[np.float64],
+    dec2: npt.NDArray[np.float64],
+) -> npt.NDArray[np.float64]:
+    d_dec = dec1 - dec2
+    d_ra = (ra1 - ra2) * np.cos(np.radians((dec1 + dec2) / 2))
+    return np.sqrt(d_dec**2 + d_ra**2)
+
+
+@dataclasses.dataclass(slots=True)
+class EvidenceBatch:
+    """
+    Crossmatch input for a batch of records in struct-of-arrays form.
+    Record positions, redshifts and distances to the nearest duplicate within the table are NaN when unknown,
+    record type codes and claimed pgcs are -1.
+    Candidates of record `i` are `candidates[offsets[i]:offsets[i + 1]]`,
+    pgcs sharing its designation are `name_pgcs[name_offsets[i]:name_offsets[i + 1]]`.
+    """
+
+    record_ids: list[str]
+    ra: npt.NDArray[np.float64]
+    dec: npt.NDArray[np.float64]
+    designation: list[str | None]
+    redshift: npt.NDArray[np.float64]
+    type_code: npt.NDArray[np.int16]
+    offsets: npt.NDArray[np.int64]
+    candidates: NeighborTable
+    name_offsets: npt.NDArray[np.int64]
+    name_pgcs: npt.NDArray[np.int64]
+    record_pgc: npt.NDArray[np.int64]
+    claimed_pgc_exists: npt.NDArray[np.bool_]
+    duplicate_distance_deg: npt.NDArray[np.float64]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple[Any, ...]], radius_deg: float) -> Self:
+        """
+        Builds a batch from rows ordered by record id with the columns of `BATCH_SELECT`:
+        record id, ra, dec, designation, cz, type, then the same six for a layer2 candidate.
+        Rows with only the first six columns describe records without candidates.
+        Candidates farther than `radius_deg` are dropped.
+        """
+        record_ids: list[str] = []
+        ra = array.array("d")
+        dec = array.array("d")
+        designation: list[str | None] = []
+        redshift = array.array("d")
+        types = array.array("h")
+
+        cand_record = array.array("q")
+        cand_pgc = array.array("q")
+        cand_ra = array.array("d")
+        cand_dec = array.array("d")
+        cand_redshift = array.array("d")
+        cand_type = array.array("h")
+        cand_design: list[str | None] = []
+        interned: dict[str, str] = {}
+
+        for row in rows:
+            new_id, new_ra, new_dec, new_design, new_cz, new_type = row[:6]
+            if not record_ids or record_ids[-1] != new_id:
+                record_ids.append(new_id)
+                ra.append(math.nan)
+                dec.append(math.nan)
+                designation.append(None)
+                redshift.append(math.nan)
+                types.append(-1)
+            i = len(record_ids) - 1
+            if new_ra is not None:
+                ra[i] = new_ra
+                dec[i] = new_dec
+            if new_design is not None:
+                designation[i] = new_design
+            if new_cz is not None:
+                redshift[i] = float(new_cz) / C_M_S
+            if new_type is not None:
+                types[i] = type_code(new_type)
+            if len(row) <= 6:
+                continue
+            existing_pgc, existing_ra, existing_dec, existing_design, existing_cz, existing_type = row[6:12]
+            if existing_pgc is None or existing_ra is None or existing_dec is None:
+                continue
+            cand_record.append(i)
+            cand_pgc.append(existing_pgc)
+            cand_ra.append(existing_ra)
+            cand_dec.append(existing_dec)
+            cand_redshift.append(float(existing_cz) / C_M_S if existing_cz is not None else math.nan)
+            cand_type.append(type_code(existing_type))
+            cand_design.append(interned.setdefault(existing_design, existing_design) if existing_design else None)
+
+        record_ra = np.frombuffer(ra, dtype=np.float64)
+        record_dec = np.frombuffer(dec, dtype=np.float64)
+        record_index = np.frombuffer(cand_record, dtype=np.int64)
+        candidate_ra = np.frombuffer(cand_ra, dtype=np.float64)
+        candidate_dec = np.frombuffer(cand_dec, dtype=np.float64)
+        distance = angular_distances_deg(record_ra[record_index], record_dec[record_index], candidate_ra, candidate_dec)
+        keep = distance <= radius_deg
+        candidates = NeighborTable(
+            pgc=np.frombuffer(cand_pgc, dtype=np.int64)[keep],
+            ra=candidate_ra[keep],
+            dec=candidate_dec[keep],
+            distance_deg=distance[keep],
+            redshift=np.frombuffer(cand_redshift, dtype=np.float64)[keep],
+            type_code=np.frombuffer(cand_type, dtype=np.int16)[keep],
+            design=np.array(cand_design, dtype=object)[keep],
+        )
+        offsets = _offsets(np.bincount(record_index[keep], minlength=len(record_ids)))
+
+        return cls(
+            record_ids=record_ids,
+            ra=record_ra,
+            dec=record_dec,
+            designation=designation,
+            redshift=np.frombuffer(redshift, dtype=np.float64),
+            type_code=np.frombuffer(types, dtype=np.int16),
+            offsets=offsets,
+            candidates=candidates,
+            name_offsets=np.zeros(len(record_ids) + 1, dtype=np.int64),
+            name_pgcs=np.zeros(0, dtype=np.int64),
+            record_pgc=np.full(len(record_ids), -1, dtype=np.int64),
+            claimed_pgc_exists=np.zeros(len(record_ids), dtype=np.bool_),
+            duplicate_distance_deg=np.full(len(record_ids), np.nan),
+        )
+
+    @classmethod
+    def from_evidence(cls, records: Sequence[tuple[str, RecordEvidence]]) -> Self:
+        """
+        Builds a batch from already assembled evidence; record positions are not known and stay NaN.
+        """
+        neighbors = [evidence.neighbors for _, evidence in records]
+        names = [list(dict.fromkeys(evidence.same_name_pgcs or [])) for _, evidence in records]
+        return cls(
+            record_ids=[record_id for record_id, _ in records],
+            ra=np.full(len(records), np.nan),
+            dec=np.full(len(records), np.nan),
+            designation=[evidence.record_designation for _, evidence in records],
+            redshift=np.array(
+                [np.nan if e.record_redshift is None else e.record_redshift for _, e in records], dtype=np.float64
+            ),
+            type_code=np.array([type_code(e.record_type_name) for _, e in records], dtype=np.int16),
+            offsets=_offsets([len(n) for n in neighbors]),
+            candidates=NeighborTable.concatenate(neighbors),
+            name_offsets=_offsets([len(n) for n in names]),
+            name_pgcs=np.array([pgc for n in names for pgc in n], dtype=np.int64),
+            record_pgc=np.array([-1 if e.record_pgc is None else e.record_pgc for _, e in records], dtype=np.int64),
+            claimed_pgc_exists=np.array([e.claimed_pgc_exists_in_layer2 for _, e in records], dtype=np.bool_),
+            duplicate_distance_deg=np.array(
+                [np.nan if e.duplicate_distance_deg is None else e.duplicate_distance_deg for _, e in records],
+                dtype=np.float64,
+            ),
+        )
+
+    def __len__(self) -> int:
+        return len(self.record_ids)
+
+    def position(self, i: int) -> tuple[float, float] | None:
+        if math.isnan(self.ra[i]):
+            return None
+        return float(self.ra[i]), float(self.dec[i])
+
+    def record_redshift(self, i: int) -> float | None:
+        z = float(self.redshift[i])
+        return None if math.isnan(z) else z
+
+    def record_type_name(self, i: int) -> str | None:
+        return type_name_of(int(self.type_code[i]))
+
+    def record_duplicate_distance(self, i: int) -> float | None:
+        distance = float(self.duplicate_distance_deg[i])
+        return None if math.isnan(distance) else distance
+
+    def candidate_records(self) -> npt.NDArray[np.int64]:
+        return np.repeat(np.arange(len(self.record_ids), dtype=np.int64), np.diff(self.offsets))
+
+    def name_records(self) -> npt.NDArray[np.int64]:
+        return np.repeat(np.arange(len(self.record_ids), dtype=np.int64), np.diff(self.name_offsets))
+
+    def evidence(self, i: int) -> RecordEvidence:
+        record_pgc = int(self.record_pgc[i])
+        return RecordEvidence(
+            neighbors=self.candidates[self.offsets[i] : self.offsets[i + 1]],
+            record_designation=self.designation[i],
+            same_name_pgcs=self.name_pgcs[self.name_offsets[i] : self.name_offsets[i + 1]].tolist() or None,
+            record_pgc=record_pgc if record_pgc >= 0 else None,
+            claimed_pgc_exists_in_layer2=bool(self.claimed_pgc_exists[i]),
+            record_redshift=self.record_redshift(i),
+            record_type_name=self.record_type_name(i),
+            duplicate_distance_deg=self.record_duplicate_distance(i),
+        )
+
+    def iter_evidence(self) -> Iterator[tuple[str, RecordEvidence]]:
+        for i, record_id in enumerate(self.record_ids):
+            yield record_id, self.evidence(i)
+
+    def with_designation_pgcs(self, design_to_pgcs: dict[str, list[int]]) -> "EvidenceBatch":
+        names = [
+            list(dict.fromkeys(design_to_pgcs.get(design, []))) if design is not None else []
+            for design in self.designation
+        ]
+        return dataclasses.replace(
+            self,
+            name_offsets=_offsets([len(n) for n in names]),
+            name_pgcs=np.array([pgc for n in names for pgc in n], dtype=np.int64),
+        )
+
+    def with_claimed_pgcs(self, claimed: tuple[dict[str, int | None], set[int]]) -> "EvidenceBatch":
+        record_pgc_by_id, existing_pgcs = claimed
+        record_pgc = np.array(
+            [-1 if (pgc := record_pgc_by_id.get(record_id)) is None else pgc for record_id in self.record_ids],
+            dtype=np.int64,
+        )
+        return dataclasses.replace(
+            self,
+            record_pgc=record_pgc,
+            claimed_pgc_exists=(record_pgc >= 0) & np.isin(record_pgc, list(existing_pgcs)),
+        )
+
+    def with_duplicates(self, nearest_duplicate_deg: dict[str, float]) -> "EvidenceBatch":
+        return dataclasses.replace(
+            self,
+            duplicate_distance_deg=np.array(
+                [nearest_duplicate_deg.get(record_id, np.nan) for record_id in self.record_ids], dtype=np.float64
+            ),
+        )
+
+    def within_radius(self, radius_deg: float) -> "EvidenceBatch":
+        keep = self.candidates.distance_deg <= radius_deg
+        if keep.all():
+            return self
+        counts = np.bincount(self.candidate_records()[keep], minlength=len(self.record_ids))
+        return dataclasses.replace(
+            self,
+            offsets=_offsets(counts),
+            candidates=self.candidates[keep],
+        )
+
+
+def _offsets(counts: Sequence[int] | npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
@@ -0,0 +1,206 @@
+import dataclasses
+import math
+from collections.abc import Callable
+
+import matplotlib.pyplot as plt
+import numpy as np
+import numpy.typing as npt
+from psycopg import sql
+
+import uploader.app.report as report
+from uploader.app import log
+from uploader.app.crossmatch.batch import EvidenceBatch
+from uploader.app.crossmatch.queries import BATCH_SELECT, find_table
+from uploader.app.display import format_table
+from uploader.app.storage import PgStorage
+
+SAMPLE_QUERY = sql.SQL(
+    """
+    WITH batch AS (
+        SELECT rec.id
+        FROM layer0.records rec
+        WHERE rec.table_id = %s
+        ORDER BY random()
+        LIMIT %s
+    )"""
+    + BATCH_SELECT
+)
+
+FIT_ITERATIONS = 200
+
+CHART_FIGSIZE = (8, 6)
+
+
+@dataclasses.dataclass
+class SeparationFit:
+    """
+    Nearest-neighbor separations modelled as a mixture of true matches, whose separations follow a Rayleigh
+    distribution with scale `sigma_deg`, and chance neighbors from a uniform background of `density_per_deg2`.
+    """
+
+    sampled: int
+    with_neighbor: int
+    max_radius_deg: float
+    density_per_deg2: float
+    match_fraction: float
+    sigma_deg: float
+
+    def match_pdf(self, r: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        s2 = self.sigma_deg**2
+        return r / s2 * np.exp(-(r**2) / (2 * s2)) / -math.expm1(-(self.max_radius_deg**2) / (2 * s2))
+
+    def background_pdf(self, r: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        k = math.pi * self.density_per_deg2
+        return 2 * k * r * np.exp(-k * r**2) / -math.expm1(-k * self.max_radius_deg**2)
+
+    def suggested_radius_deg(self) -> float | None:
+        """Separation beyond the true-match peak where chance neighbors become more likely than true matches."""
+        if self.match_fraction <= 0 or self.sigma_deg <= 0:
+            return None
+        r = np.linspace(self.sigma_deg, self.max_radius_deg, 2000)
+        chance = (1 - self.match_fraction) * self.background_pdf(r) >= self.match_fraction * self.match_pdf(r)
+        if not chance.any():
+            return None
+        return float(r[np.argmax(chance)])
+
+    def completeness(self, radius_deg: float) -> float:
+        """Fraction of true matches found within `radius_deg`."""
+        return -math.expm1(-(radius_deg**2) / (2 * self.sigma_deg**2)) if self.sigma_deg > 0 else 0.0
+
+    def chance_rate(self, radius_deg: float) -> float:
+        """Fraction of records with an unrelated object within `radius_deg`."""
+        return -math.expm1(-math.pi * self.density_per_deg2 * radius_deg**2)
+
+
+def fit_separations(
+    nearest_deg: npt.NDArray[np.float64],
+    sampled: int,
+    annulus_count: int,
+    max_radius_deg: float,
+) -> SeparationFit:
+    """
+    Fits the true-match fraction and scale with expectation-maximization; the background density is fixed
+    from the number of neighbors in the outer half of the search radius.
+    """
+    annulus_area = math.pi * (max_radius_deg**2 - (max_radius_deg / 2) ** 2)
+    density = annulus_count / (sampled * annulus_area) if sampled else 0.0
+    fit = SeparationFit(
+        sampled=sampled,
+        with_neighbor=len(nearest_deg),
+        max_radius_deg=max_radius_deg,
+        density_per_deg2=max(density, 1e-12),
+        match_fraction=0.5,
+        sigma_deg=max_radius_deg / 10,
+    )
+    if len(nearest_deg) == 0:
+        fit.match_fraction = 0.0
+        return fit
+
+    r = nearest_deg
+    background = fit.background_pdf(r)
+    for _ in range(FIT_ITERATIONS):
+        match = fit.match_fraction * fit.match_pdf(r)
+        total = match + (1 - fit.match_fraction) * background
+        weight = np.divide(match, total, out=np.zeros_like(match), where=total > 0)
+        weight_sum = float(weight.sum())
+        if weight_sum <= 0:
+            fit.match_fraction = 0.0
+            break
+        fit.match_fraction = weight_sum / len(r)
+        fit.sigma_deg = math.sqrt(float((weight * r**2).sum()) / (2 * weight_sum))
+    return fit
+
+
+def _emit_histogram(
+    report_func: Callable[[report.Event], None],
+    nearest_deg: npt.NDArray[np.float64],
+    fit: SeparationFit,
+    radius_deg: float | None,
+) -> None:
+    arcsec = nearest_deg * 3600
+    max_arcsec = fit.max_radius_deg * 3600
+    bins = np.linspace(0, max_arcsec, 61)
+    fig, ax = plt.subplots(figsize=CHART_FIGSIZE)
+    ax.hist(arcsec, bins=bins, color="0.7", label="Sampled records")
+    centers = (bins[:-1] + bins[1:]) / 2
+    scale = len(arcsec) * (bins[1] - bins[0]) / 3600
+    r = centers / 3600
+    ax.plot(centers, scale * fit.match_fraction * fit.match_pdf(r), label="True matches")
+    ax.plot(centers, scale * (1 - fit.match_fraction) * fit.background_pdf(r), label="Chance neighbors")
+    if radius_deg is not None:
+        ax.axvline(
+            radius_deg * 3600, color="k", linestyle="--", label=f"Suggested radius {radius_deg * 3600:.1f} arcsec"
+        )
+    ax.set_xlabel("Separation to nearest layer2 object, arcsec")
+    ax.set_ylabel("Records")
+    ax.set_title("Nearest-neighbor separations")
+    ax.legend()
+    fig.tight_layout()
+    report_func(report.image_event_from_figure(fig, caption="Nearest-neighbor separations"))
+
+
+def run_radius_calibration(
+    storage: PgStorage,
+    table_name: str,
+    sample_size: int,
+    max_radius_deg: float,
+    report_func: Callable[[report.Event], None],
+) -> SeparationFit:
+    table_id = find_table(storage, table_name)
+    report_func(
+        report.LogEvent(
+            message=f"Sampling {sample_size} records of {table_name} with neighbors "
+            f"within {max_radius_deg * 3600:g} arcsec.",
+        )
+    )
+    batch = EvidenceBatch.from_rows(
+        storage.stream(SAMPLE_QUERY, (table_id, sample_size, max_radius_deg)),
+        max_radius_deg,
+    )
+    positioned = ~np.isnan(batch.ra)
+    distance = batch.candidates.distance_deg
+    nearest = np.full(len(batch), np.inf)
+    np.minimum.at(nearest, batch.candidate_records(), distance)
+    nearest = nearest[positioned & np.isfinite(nearest)]
+    annulus_count = int(np.count_nonzero(distance >= max_radius_deg / 2))
+
+    fit = fit_separations(nearest, int(positioned.sum()), annulus_count, max_radius_deg)
+    radius_deg = fit.suggested_radius_deg()
+    log.logger.info(
+        "radius calibration",
+        table_name=table_name,
+        sampled=fit.sampled,
+        match_fraction=round(fit.match_fraction, 4),
+        sigma_arcsec=round(fit.sigma_deg * 3600, 3),
+        suggested_radius_arcsec=round(radius_deg * 3600, 3) if radius_deg is not None else None,
+    )
+    report_func(report.ProgressEvent(percent=100))
+    _emit_histogram(report_func, nearest, fit, radius_deg)
+
+    rows: list[tuple[str, str]] = [
+        ("Sampled records with positions", str(fit.sampled)),
+        ("With a neighbor in search radius", str(fit.with_neighbor)),
+        ("Background density, per sq. arcmin", f"{fit.density_per_deg2 / 3600:.3f}"),
+        ("True matches among them", f"{fit.match_fraction:.3f}"),
+        ("True-match scale, arcsec", f"{fit.sigma_deg * 3600:.2f}"),
+    ]
+    if radius_deg is not None:
+        rows += [
+            ("Suggested radius, arcsec", f"{radius_deg * 3600:.1f}"),
+            ("True matches within it", f"{100 * fit.completeness(radius_deg):.1f}%"),
+            ("Records with a chance neighbor", f"{100 * fit.chance_rate(radius_deg):.1f}%"),
+        ]
+    else:
+        rows.append(("Suggested radius, arcsec", "no true-match peak found"))
+    report_func(
+        report.DoneEvent(
+            message=format_table(
+                ("Quantity", "Value"),
+                rows,
+                title=f"Radius calibration for {table_name}",
+                right_align_last_n=1,
+                percent_last_column=False,
+            )
+        )
+    )
+    return fit
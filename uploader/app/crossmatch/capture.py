@@ -0,0 +1,100 @@
+import dataclasses
+import gzip
+import json
+import pathlib
+from collections.abc import Iterator
+from typing import IO, Any, Self
+
+from uploader.app.crossmatch.models import Neighbor, NeighborTable, RecordEvidence
+
+CAPTURE_FORMAT_VERSION = 1
+
+
+@dataclasses.dataclass
+class CaptureHeader:
+    table_name: str
+    radius_deg: float
+    pgc_column: str | None
+    version: int = CAPTURE_FORMAT_VERSION
+
+
+def evidence_to_dict(evidence: RecordEvidence) -> dict:
+    return {
+        "neighbors": [dataclasses.asdict(n) for n in evidence.neighbors],
+        "record_designation": evidence.record_designation,
+        "same_name_pgcs": evidence.same_name_pgcs,
+        "record_pgc": evidence.record_pgc,
+        "claimed_pgc_exists_in_layer2": evidence.claimed_pgc_exists_in_layer2,
+        "record_redshift": evidence.record_redshift,
+        "record_type_name": evidence.record_type_name,
+        "duplicate_distance_deg": evidence.duplicate_distance_deg,
+    }
+
+
+def evidence_from_dict(data: dict[str, Any]) -> RecordEvidence:
+    return RecordEvidence(
+        neighbors=NeighborTable.from_neighbors(Neighbor(**n) for n in data["neighbors"]),
+        record_designation=data["record_designation"],
+        same_name_pgcs=data["same_name_pgcs"],
+        record_pgc=data["record_pgc"],
+        claimed_pgc_exists_in_layer2=data["claimed_pgc_exists_in_layer2"],
+        record_redshift=data["record_redshift"],
+        record_type_name=data["record_type_name"],
+        duplicate_distance_deg=data.get("duplicate_distance_deg"),
+    )
+
+
+class EvidenceWriter:
+    """
+    Streams crossmatch evidence to a gzip-compressed JSON lines file.
+    The first line is a `CaptureHeader`, every following line is one record with its evidence.
+    """
+
+    def __init__(self, path: pathlib.Path, header: CaptureHeader) -> None:
+        self._path = path
+        self._header = header
+        self._file: IO[str] | None = None
+        self.written = 0
+
+    def __enter__(self) -> Self:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(self._path, "wt", encoding="utf-8")
+        self._file.write(json.dumps(dataclasses.asdict(self._header)))
+        self._file.write("\n")
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def write(self, record_id: str, evidence: RecordEvidence) -> None:
+        if self._file is None:
+            raise RuntimeError("EvidenceWriter is not open")
+        self._file.write(json.dumps({"record_id": record_id, **evidence_to_dict(evidence)}, separators=(",", ":")))
+        self._file.write("\n")
+        self.written += 1
+
+
+def read_header(path: pathlib.Path) -> CaptureHeader:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return _parse_header(f.readline())
+
+
+def read_evidence(path: pathlib.Path) -> Iterator[tuple[str, RecordEvidence]]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        _parse_header(f.readline())
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            yield data.pop("record_id"), evidence_from_dict(data)
+
+
+def _parse_header(line: str) -> CaptureHeader:
+    if not line.strip():
+        raise RuntimeError("Evidence capture file is empty")
+    header = CaptureHeader(**json.loads(line))
+    if header.version != CAPTURE_FORMAT_VERSION:
+        raise RuntimeError(f"Unsupported evidence capture version: {header.version}")
+    return header
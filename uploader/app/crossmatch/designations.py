@@ -0,0 +1,87 @@
+import sys
+from collections.abc import Iterable
+from typing import Self
+
+from psycopg import sql
+
+from uploader.app import log
+from uploader.app.storage import PgStorage
+
+ALL_DESIGNATIONS_QUERY = sql.SQL("""
+    SELECT design, pgc FROM layer2.designation
+    UNION ALL
+    SELECT design, pgc FROM layer2.designations
+""")
+
+DESIGNATIONS_QUERY = sql.SQL("""
+    SELECT design, pgc FROM layer2.designation WHERE design = ANY(%s)
+    UNION ALL
+    SELECT design, pgc FROM layer2.designations WHERE design = ANY(%s)
+""")
+
+ENTRY_OVERHEAD_BYTES = 64
+SIZE_CHECK_INTERVAL = 10_000
+
+
+class DesignationIndex:
+    """
+    Maps layer2 designations to the pgcs that carry them. Most designations belong to one object,
+    so a pgc is stored as a plain int and only shared designations hold a tuple.
+    """
+
+    def __init__(self) -> None:
+        self._pgcs: dict[str, int | tuple[int, ...]] = {}
+        self.approx_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._pgcs)
+
+    def add(self, design: str, pgc: int) -> None:
+        existing = self._pgcs.get(design)
+        if existing is None:
+            design = sys.intern(design)
+            self._pgcs[design] = pgc
+            self.approx_bytes += sys.getsizeof(design) + ENTRY_OVERHEAD_BYTES
+        elif isinstance(existing, int):
+            if existing != pgc:
+                self._pgcs[design] = (existing, pgc)
+                self.approx_bytes += sys.getsizeof((existing, pgc))
+        elif pgc not in existing:
+            self._pgcs[design] = (*existing, pgc)
+            self.approx_bytes += 8
+
+    def get(self, design: str) -> list[int]:
+        pgcs = self._pgcs.get(design)
+        if pgcs is None:
+            return []
+        return [pgcs] if isinstance(pgcs, int) else list(pgcs)
+
+    def lookup(self, designations: Iterable[str]) -> dict[str, list[int]]:
+        return {design: self.get(design) for design in designations}
+
+    @classmethod
+    def load(cls, storage: PgStorage, max_bytes: int | None = None) -> Self | None:
+        """
+        Reads both layer2 designation tables in one pass.
+        Returns None if the index grows beyond `max_bytes`.
+        """
+        index = cls()
+        for rows, (design, pgc) in enumerate(storage.stream(ALL_DESIGNATIONS_QUERY), start=1):
+            index.add(design, pgc)
+            if max_bytes is not None and rows % SIZE_CHECK_INTERVAL == 0 and index.approx_bytes > max_bytes:
+                log.logger.info("designation index exceeds memory limit", rows=rows, max_bytes=max_bytes)
+                return None
+        if max_bytes is not None and index.approx_bytes > max_bytes:
+            return None
+        log.logger.info("loaded designation index", designations=len(index), approx_bytes=index.approx_bytes)
+        return index
+
+
+def fetch_designation_pgcs(storage: PgStorage, designations: Iterable[str]) -> dict[str, list[int]]:
+    designs = list(dict.fromkeys(designations))
+    if not designs:
+        return {}
+    index = DesignationIndex()
+    for row in storage.query(DESIGNATIONS_QUERY, (designs, designs)):
+        index.add(row["design"], row["pgc"])
+    return index.lookup(designs)
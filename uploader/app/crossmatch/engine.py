@@ -1,8 +1,10 @@
+import contextlib
 import dataclasses
-import json
-import math
+import pathlib
+import resource
+import time
 from collections import defaultdict
-from collections.abc import Callable
+from collections.abc import Callable, Sequence
 from typing import cast
 
 import matplotlib.pyplot as plt
@@ -11,16 +13,33 @@ from psycopg import sql
 import uploader.app.action_description as action_description
 import uploader.app.report as report
 from uploader.app import log
+from uploader.app.crossmatch.batch import EvidenceBatch
+from uploader.app.crossmatch.capture import CaptureHeader, EvidenceWriter
+from uploader.app.crossmatch.designations import DesignationIndex, fetch_designation_pgcs
 from uploader.app.crossmatch.models import (
     CrossmatchResult,
     CrossmatchStatus,
-    Neighbor,
     PendingReason,
     RecordEvidence,
     TriageStatus,
 )
+from uploader.app.crossmatch.pending import PendingWriter
+from uploader.app.crossmatch.queries import BATCH_SELECT, find_table
 from uploader.app.crossmatch.resolver import Resolver
+from uploader.app.crossmatch.selfmatch import find_self_matches, report_self_matches
+from uploader.app.crossmatch.state import (
+    CrossmatchState,
+    RecordState,
+    cells_for_position,
+    evidence_fingerprint,
+    fetch_cell_digests,
+    load_state,
+    record_input_digest,
+    save_state,
+)
 from uploader.app.display import format_table
+from uploader.app.exports import export_url
+from uploader.app.lib.batching import AdaptiveBatchSizer
 from uploader.app.storage import PgStorage
 from uploader.app.upload import handle_call
 from uploader.clients.gen.client import adminapi
@@ -35,14 +54,14 @@ from uploader.clients.gen.client.adminapi.models.set_crossmatch_results_request
 from uploader.clients.gen.client.adminapi.models.statuses_payload import StatusesPayload
 from uploader.clients.gen.client.adminapi.types import UNSET, Unset
 
-C_M_S = 299792458
-
 CHART_FIGSIZE = (8, 6)
 
+type StatusCounts = dict[tuple[CrossmatchStatus, TriageStatus, PendingReason | None], int]
+
 
-def _emit_status_distribution_image(
+def emit_status_distribution_image(
     report_func: Callable[[report.Event], None],
-    counts: dict[tuple[CrossmatchStatus, TriageStatus, PendingReason | None], int],
+    counts: StatusCounts,
     *,
     caption: str,
 ) -> None:
@@ -72,7 +91,28 @@ def _emit_status_distribution_image(
     report_func(report.image_event_from_figure(fig, caption=caption))
 
 
-BATCH_QUERY = sql.SQL("""
+BATCH_QUERY = sql.SQL(
+    """
+    WITH batch AS (
+        SELECT rec.id
+        FROM layer0.records rec
+        WHERE rec.table_id = %s AND rec.id > %s
+        ORDER BY rec.id ASC
+        LIMIT %s
+    )"""
+    + BATCH_SELECT
+)
+
+BATCH_BY_IDS_QUERY = sql.SQL(
+    """
+    WITH batch AS (
+        SELECT DISTINCT t.id
+        FROM unnest(%s::text[]) AS t(id)
+    )"""
+    + BATCH_SELECT
+)
+
+RECORDS_QUERY = sql.SQL("""
     WITH batch AS (
         SELECT rec.id
         FROM layer0.records rec
@@ -86,48 +126,42 @@ BATCH_QUERY = sql.SQL("""
         nc.dec AS new_dec,
         new_desig.design AS new_design,
         new_cz.cz AS new_cz,
-        rec_nat.type_name AS new_type,
-        l2.pgc AS existing_pgc,
-        l2.ra AS existing_ra,
-        l2.dec AS existing_dec,
-        l2_desig.design AS existing_design,
-        l2_cz.cz AS existing_cz,
-        l2_nat.type_name AS existing_type
+        rec_nat.type_name AS new_type
     FROM batch b
     LEFT JOIN icrs.data nc ON b.id = nc.record_id
     LEFT JOIN designation.data new_desig ON b.id = new_desig.record_id
     LEFT JOIN cz.data new_cz ON b.id = new_cz.record_id
     LEFT JOIN nature.data rec_nat ON b.id = rec_nat.record_id
-    LEFT JOIN layer2.icrs l2
-        ON nc.record_id IS NOT NULL
-        AND ST_DWithin(
-            ST_MakePoint(nc.dec, nc.ra - 180),
-            ST_MakePoint(l2.dec, l2.ra - 180),
-            %s / GREATEST(COS(RADIANS(nc.dec)), 0.01)
-        )
-    LEFT JOIN layer2.designation l2_desig ON l2.pgc = l2_desig.pgc
-    LEFT JOIN layer2.cz l2_cz ON l2.pgc = l2_cz.pgc
-    LEFT JOIN layer2.nature l2_nat ON l2.pgc = l2_nat.pgc
     ORDER BY b.id ASC
 """)
 
+STORED_CROSSMATCH_QUERY = """
+    SELECT
+        c.record_id,
+        c.status,
+        c.triage_status,
+        c.metadata::jsonb ->> 'pgc' AS pgc,
+        c.metadata::jsonb -> 'possible_matches' AS possible_matches
+    FROM layer0.crossmatch c
+    WHERE c.record_id = ANY(%s)
+"""
+
+STORED_STATUS = {
+    CrossmatchStatus.NEW: "new",
+    CrossmatchStatus.EXISTING: "existing",
+    CrossmatchStatus.COLLIDING: "collided",
+}
 
-def _evidence_to_dict(evidence: RecordEvidence) -> dict:
-    return {
-        "neighbors": [dataclasses.asdict(n) for n in evidence.neighbors],
-        "record_designation": evidence.record_designation,
-        "same_name_pgcs": evidence.same_name_pgcs,
-        "record_pgc": evidence.record_pgc,
-        "claimed_pgc_exists_in_layer2": evidence.claimed_pgc_exists_in_layer2,
-        "record_redshift": evidence.record_redshift,
-        "record_type_name": evidence.record_type_name,
-    }
 
+def evidence_within_radius(evidence: RecordEvidence, radius_deg: float) -> RecordEvidence:
+    neighbors = evidence.neighbors.within(radius_deg)
+    if neighbors is evidence.neighbors:
+        return evidence
+    return dataclasses.replace(evidence, neighbors=neighbors)
 
-def angular_distance_deg(ra1: float, dec1: float, ra2: float, dec2: float) -> float:
-    d_dec = dec1 - dec2
-    d_ra = (ra1 - ra2) * math.cos(math.radians((dec1 + dec2) / 2))
-    return math.sqrt(d_dec**2 + d_ra**2)
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
 
 def _fetch_batch(
@@ -136,61 +170,30 @@ def _fetch_batch(
     last_id: str,
     batch_size: int,
     radius_deg: float,
-) -> tuple[dict[str, dict], str]:
-    rows = storage.query(BATCH_QUERY, (table_id, last_id, batch_size, radius_deg))
-
-    if not rows:
-        return {}, last_id
-
-    by_record: dict[str, dict] = {}
-    for r in rows:
-        new_id = r["new_id"]
-        new_ra = r["new_ra"]
-        new_dec = r["new_dec"]
-        new_design = r["new_design"]
-        new_cz = r["new_cz"]
-        new_type = r.get("new_type")
-        existing_pgc = r["existing_pgc"]
-        existing_ra = r["existing_ra"]
-        existing_dec = r["existing_dec"]
-        existing_design = r["existing_design"]
-        existing_cz = r["existing_cz"]
-        existing_type = r.get("existing_type")
-        last_id = new_id
-        if new_id not in by_record:
-            by_record[new_id] = {
-                "new_ra": None,
-                "new_dec": None,
-                "new_design": None,
-                "new_redshift": None,
-                "new_type": None,
-                "candidates": [],
-            }
-        rec_data = by_record[new_id]
-        if new_ra is not None:
-            rec_data["new_ra"] = new_ra
-            rec_data["new_dec"] = new_dec
-        if new_design is not None:
-            rec_data["new_design"] = new_design
-        if new_cz is not None:
-            rec_data["new_redshift"] = float(new_cz) / C_M_S
-        if new_type is not None:
-            rec_data["new_type"] = new_type
-        if existing_pgc is not None and existing_ra is not None and existing_dec is not None:
-            existing_redshift = float(existing_cz) / C_M_S if existing_cz is not None else None
-            rec_data["candidates"].append(
-                (existing_ra, existing_dec, existing_pgc, existing_design, existing_redshift, existing_type)
-            )
+) -> tuple[EvidenceBatch, str]:
+    batch = EvidenceBatch.from_rows(
+        storage.stream(BATCH_QUERY, (table_id, last_id, batch_size, radius_deg)),
+        radius_deg,
+    )
+    if len(batch) == 0:
+        return batch, last_id
+    return batch, batch.record_ids[-1]
 
-    return by_record, last_id
 
+def _fetch_batch_by_ids(
+    storage: PgStorage,
+    record_ids: list[str],
+    radius_deg: float,
+) -> EvidenceBatch:
+    return EvidenceBatch.from_rows(storage.stream(BATCH_BY_IDS_QUERY, (record_ids, radius_deg)), radius_deg)
 
-def _enrich_batch(
+
+def _fetch_claimed_pgcs(
     storage: PgStorage,
     table_name: str,
-    by_record: dict[str, dict],
+    record_ids: list[str],
     pgc_column: str | None,
-) -> tuple[dict[str, int | None], set[int], dict[str, list[int]]]:
+) -> tuple[dict[str, int | None], set[int]]:
     record_pgc_by_id: dict[str, int | None] = {}
     if pgc_column is not None:
         raw_pgc_query = sql.SQL(
@@ -199,8 +202,7 @@ def _enrich_batch(
             col=sql.Identifier(pgc_column),
             t=sql.Identifier(table_name),
         )
-        batch_ids = list(by_record.keys())
-        for row in storage.query(raw_pgc_query, (batch_ids,)):
+        for row in storage.query(raw_pgc_query, (record_ids,)):
             record_id = row["hyperleda_internal_id"]
             pgc_val = row[pgc_column]
             record_pgc_by_id[record_id] = int(pgc_val) if pgc_val is not None else None
@@ -214,99 +216,75 @@ def _enrich_batch(
         ):
             existing_pgcs.add(row["pgc"])
 
-    designations_in_batch = {
-        rec_data["new_design"] for rec_data in by_record.values() if rec_data["new_design"] is not None
-    }
-    design_to_pgcs: dict[str, list[int]] = {}
-    if designations_in_batch:
-        designs_list = list(designations_in_batch)
-        pgcs_by_design: dict[str, set[int]] = {}
-        for row in storage.query(
-            "SELECT design, pgc FROM layer2.designation WHERE design = ANY(%s)",
-            (designs_list,),
-        ):
-            pgcs_by_design.setdefault(row["design"], set()).add(row["pgc"])
-        for row in storage.query(
-            "SELECT design, pgc FROM layer2.designations WHERE design = ANY(%s)",
-            (designs_list,),
-        ):
-            pgcs_by_design.setdefault(row["design"], set()).add(row["pgc"])
-        design_to_pgcs = {d: list(s) for d, s in pgcs_by_design.items()}
-        for design in designations_in_batch:
-            if design not in design_to_pgcs:
-                design_to_pgcs[design] = []
+    return record_pgc_by_id, existing_pgcs
 
-    return record_pgc_by_id, existing_pgcs, design_to_pgcs
 
+def _fetch_designation_pgcs(
+    storage: PgStorage,
+    batch: EvidenceBatch,
+    designations: DesignationIndex | None = None,
+) -> dict[str, list[int]]:
+    designations_in_batch = {design for design in batch.designation if design is not None}
+    if designations is not None:
+        return designations.lookup(designations_in_batch)
+    return fetch_designation_pgcs(storage, designations_in_batch)
 
-def _resolve_batch(
-    by_record: dict[str, dict],
-    record_pgc_by_id: dict[str, int | None],
-    existing_pgcs: set[int],
-    design_to_pgcs: dict[str, list[int]],
-    resolver: Resolver,
-    print_pending: bool,
+
+def _load_designation_index(
+    storage: PgStorage,
+    max_bytes: int | None,
     report_func: Callable[[report.Event], None],
-) -> list[tuple[str, CrossmatchResult]]:
-    results: list[tuple[str, CrossmatchResult]] = []
-    radius_deg = resolver.search_radius_deg
-    for record_id, rec_data in by_record.items():
-        new_ra = rec_data["new_ra"]
-        new_dec = rec_data["new_dec"]
-        record_designation = rec_data["new_design"]
-        candidates = rec_data["candidates"]
-        global_pgcs = design_to_pgcs.get(record_designation, []) if record_designation is not None else []
-        neighbors: list[Neighbor] = []
-        if new_ra is not None and new_dec is not None:
-            for existing_ra, existing_dec, pgc, existing_design, existing_redshift, existing_type in candidates:
-                dist = angular_distance_deg(new_ra, new_dec, existing_ra, existing_dec)
-                if dist <= radius_deg:
-                    neighbors.append(
-                        Neighbor(
-                            pgc=pgc,
-                            ra=existing_ra,
-                            dec=existing_dec,
-                            distance_deg=dist,
-                            design=existing_design,
-                            redshift=existing_redshift,
-                            type_name=existing_type,
-                        ),
-                    )
-        record_pgc = record_pgc_by_id.get(record_id) if record_pgc_by_id else None
-        claimed_pgc_exists = record_pgc is not None and record_pgc in existing_pgcs
-        record_redshift = rec_data.get("new_redshift")
-        record_type_name = rec_data.get("new_type")
-        evidence = RecordEvidence(
-            neighbors=neighbors,
-            record_designation=record_designation,
-            same_name_pgcs=global_pgcs or None,
-            record_pgc=record_pgc,
-            claimed_pgc_exists_in_layer2=claimed_pgc_exists,
-            record_redshift=record_redshift,
-            record_type_name=record_type_name,
+) -> DesignationIndex | None:
+    if max_bytes is None:
+        return None
+    started = time.monotonic()
+    index = DesignationIndex.load(storage, max_bytes)
+    if index is None:
+        message = (
+            f"Layer2 designations exceed {max_bytes / 2**20:.0f} MB in memory; looking them up for each batch instead."
         )
-        result = resolver.resolve(evidence)
-        results.append((record_id, result))
-        if print_pending and result.triage_status == TriageStatus.PENDING:
-            log.logger.warning(
-                "pending crossmatch",
-                record_id=record_id,
-                status=result.status.value,
-                pending_reason=result.pending_reason.value if result.pending_reason is not None else None,
-                colliding_pgcs=sorted(result.colliding_pgcs) if result.colliding_pgcs else None,
-                matched_pgc=result.matched_pgc,
-                link=f"https://leda.sao.ru/records/{record_id}/crossmatch",
-                evidence=json.dumps(_evidence_to_dict(evidence)),
-            )
-            reason = result.pending_reason.value if result.pending_reason is not None else "unknown"
-            report_func(
-                report.LogEvent(
-                    message=f"Pending crossmatch: record {record_id}, reason: {reason}",
-                )
-            )
+    else:
+        message = (
+            f"Loaded {len(index)} layer2 designations ({index.approx_bytes / 2**20:.0f} MB) "
+            f"in {time.monotonic() - started:.1f}s."
+        )
+    report_func(report.LogEvent(message=message))
+    return index
+
+
+def _resolve_batch(
+    batch: EvidenceBatch,
+    claimed_by_column: dict[str | None, tuple[dict[str, int | None], set[int]]],
+    resolvers: Sequence[Resolver],
+    capture: EvidenceWriter | None = None,
+    pending: PendingWriter | None = None,
+) -> list[list[tuple[str, CrossmatchResult]]]:
+    claimed_batches = {col: batch.with_claimed_pgcs(claimed) for col, claimed in claimed_by_column.items()}
+    if capture is not None:
+        for record_id, evidence in claimed_batches[resolvers[0].pgc_column].iter_evidence():
+            capture.write(record_id, evidence)
+
+    results: list[list[tuple[str, CrossmatchResult]]] = []
+    for idx, resolver in enumerate(resolvers):
+        resolver_batch = claimed_batches[resolver.pgc_column].within_radius(resolver.search_radius_deg)
+        resolver_results = list(zip(batch.record_ids, resolver.resolve_batch(resolver_batch), strict=True))
+        results.append(resolver_results)
+        if idx == 0 and pending is not None:
+            pending.write_batch(resolver_batch, resolver_results)
     return results
 
 
+def _report_pending(
+    report_func: Callable[[report.Event], None],
+    pending: PendingWriter,
+    pending_path: pathlib.Path,
+) -> str:
+    by_reason = ", ".join(f"{reason or 'unknown'}: {count}" for reason, count in sorted(pending.counts.items()))
+    line = f"Pending cases exported: {pending.written} records ({export_url(pending_path)})"
+    report_func(report.LogEvent(message=f"{line}{'; ' + by_reason if by_reason else ''}."))
+    return line
+
+
 def _write_crossmatch_results(
     client: adminapi.AuthenticatedClient,
     results: list[tuple[str, CrossmatchResult]],
@@ -375,27 +353,190 @@ def _write_crossmatch_results(
         )
 
 
+def _write_batch(
+    storage: PgStorage,
+    client: adminapi.AuthenticatedClient,
+    results: list[tuple[str, CrossmatchResult]],
+    write_changed_only: bool,
+) -> int:
+    to_write = _filter_unchanged(storage, results) if write_changed_only else results
+    if to_write:
+        _write_crossmatch_results(client, to_write)
+    return len(results) - len(to_write)
+
+
+def _result_key(result: CrossmatchResult) -> tuple[str, str, int | None, frozenset[int]]:
+    return (
+        STORED_STATUS[result.status],
+        result.triage_status.value,
+        result.matched_pgc if result.status == CrossmatchStatus.EXISTING else None,
+        frozenset(result.colliding_pgcs or []) if result.status == CrossmatchStatus.COLLIDING else frozenset(),
+    )
+
+
+def _filter_unchanged(
+    storage: PgStorage,
+    results: list[tuple[str, CrossmatchResult]],
+) -> list[tuple[str, CrossmatchResult]]:
+    if not results:
+        return []
+    stored: dict[str, tuple[str, str, int | None, frozenset[int]]] = {}
+    for row in storage.query(STORED_CROSSMATCH_QUERY, ([record_id for record_id, _ in results],)):
+        status = row["status"]
+        stored[row["record_id"]] = (
+            status,
+            row["triage_status"],
+            int(row["pgc"]) if status == "existing" and row["pgc"] is not None else None,
+            frozenset(row["possible_matches"] or []) if status == "collided" else frozenset(),
+        )
+    return [(record_id, r) for record_id, r in results if stored.get(record_id) != _result_key(r)]
+
+
+def format_summary(
+    counts: StatusCounts,
+    total: int,
+    *,
+    heading: str = "",
+) -> str:
+    def pct(n: int) -> float:
+        return (100.0 * n / total) if total else 0.0
+
+    summary_rows = [
+        (
+            status.value,
+            triage.value,
+            reason.value if reason is not None else "",
+            counts[(status, triage, reason)],
+            pct(counts[(status, triage, reason)]),
+        )
+        for status, triage, reason in sorted(
+            counts.keys(),
+            key=lambda k: (-counts[k], k[0].value, k[1].value, k[2].value if k[2] is not None else ""),
+        )
+        if counts[(status, triage, reason)] > 0
+    ]
+    heading = f"{heading}\n" if heading else ""
+    return format_table(
+        ("Status", "Triage", "Reason", "Count", "%"),
+        summary_rows,
+        title=f"{heading}Total records: {total}\n",
+    )
+
+
+def report_summaries(
+    report_func: Callable[[report.Event], None],
+    resolvers: Sequence[Resolver],
+    counts_by_resolver: list[StatusCounts],
+    total: int,
+    *,
+    footer: str = "",
+) -> None:
+    summaries: list[str] = []
+    for resolver, counts in zip(resolvers, counts_by_resolver, strict=True):
+        heading = f"Configuration: {resolver.name}" if len(resolvers) > 1 else ""
+        caption = f"Final: {total} records" + (f" ({resolver.name})" if heading else "")
+        emit_status_distribution_image(report_func, counts, caption=caption)
+        summaries.append(format_summary(counts, total, heading=heading))
+    summary = "\n\n".join(summaries)
+    if footer:
+        summary += f"\n\n{footer}"
+    report_func(report.DoneEvent(message=summary))
+
+
+def _record_input_digest(
+    batch: EvidenceBatch,
+    i: int,
+    design_to_pgcs: dict[str, list[int]],
+    claimed: tuple[dict[str, int | None], set[int]],
+) -> int:
+    design = batch.designation[i]
+    position = batch.position(i)
+    record_pgc_by_id, existing_pgcs = claimed
+    claimed_pgc = record_pgc_by_id.get(batch.record_ids[i])
+    return record_input_digest(
+        position[0] if position is not None else None,
+        position[1] if position is not None else None,
+        design,
+        batch.record_redshift(i),
+        batch.record_type_name(i),
+        design_to_pgcs.get(design, []) if design is not None else [],
+        claimed_pgc,
+        claimed_pgc in existing_pgcs,
+    )
+
+
+def _record_cells(batch: EvidenceBatch, i: int, radius_deg: float) -> set[int]:
+    position = batch.position(i)
+    if position is None:
+        return set()
+    return cells_for_position(position[0], position[1], radius_deg)
+
+
+def _update_state(
+    state: CrossmatchState,
+    cells: set[int],
+    batch: EvidenceBatch,
+    design_to_pgcs: dict[str, list[int]],
+    claimed: tuple[dict[str, int | None], set[int]],
+) -> None:
+    for i, (record_id, evidence) in enumerate(batch.within_radius(state.radius_deg).iter_evidence()):
+        state.records[record_id] = RecordState(
+            input_digest=_record_input_digest(batch, i, design_to_pgcs, claimed),
+            fingerprint=evidence_fingerprint(evidence),
+        )
+        cells.update(_record_cells(batch, i, state.radius_deg))
+
+
+def _affected_records(
+    state: CrossmatchState,
+    batch: EvidenceBatch,
+    design_to_pgcs: dict[str, list[int]],
+    claimed: tuple[dict[str, int | None], set[int]],
+    changed_cells: set[int],
+    cells: set[int],
+) -> list[str]:
+    """
+    Records of the batch to re-resolve: those missing from the state, those whose own inputs changed and
+    those whose search area overlaps a changed sky cell. The cells of every record are added to `cells`.
+    """
+    affected: list[str] = []
+    for i, record_id in enumerate(batch.record_ids):
+        record_cells = _record_cells(batch, i, state.radius_deg)
+        cells.update(record_cells)
+        previous = state.records.get(record_id)
+        if (
+            previous is None
+            or previous.input_digest != _record_input_digest(batch, i, design_to_pgcs, claimed)
+            or not record_cells.isdisjoint(changed_cells)
+        ):
+            affected.append(record_id)
+    return affected
+
+
 def run_crossmatch(
     storage: PgStorage,
     table_name: str,
     batch_size: int,
     client: adminapi.AuthenticatedClient,
-    resolver: Resolver,
+    resolvers: Sequence[Resolver],
     report_func: Callable[[report.Event], None],
     *,
-    print_pending: bool = False,
+    pending_path: pathlib.Path | None = None,
     write: bool = False,
+    capture_path: pathlib.Path | None = None,
+    capture_radius_deg: float | None = None,
+    state_path: pathlib.Path | None = None,
+    write_changed_only: bool = False,
+    batch_sizer: AdaptiveBatchSizer | None = None,
+    self_match: bool = False,
+    designation_index_max_bytes: int | None = None,
 ) -> None:
-    radius_deg = resolver.search_radius_deg
-    pgc_column = resolver.pgc_column
+    if not resolvers:
+        raise ValueError("At least one resolver is required")
+    radius_deg = max(max(r.search_radius_deg for r in resolvers), capture_radius_deg or 0.0)
+    pgc_columns = list(dict.fromkeys(r.pgc_column for r in resolvers))
 
-    rows = storage.query(
-        "SELECT id FROM layer0.tables WHERE table_name = %s",
-        (table_name,),
-    )
-    if not rows:
-        raise RuntimeError(f"Table not found: {table_name}")
-    table_id = rows[0]["id"]
+    table_id = find_table(storage, table_name)
     total_records = int(
         storage.query(
             "SELECT COUNT(*) AS cnt FROM layer0.records WHERE table_id = %s",
@@ -407,78 +548,298 @@ def run_crossmatch(
             message=f"Starting crossmatch for {table_name} ({total_records} records).",
         )
     )
-
-    counts: dict[tuple[CrossmatchStatus, TriageStatus, PendingReason | None], int] = defaultdict(int)
-    total = 0
-    last_id = ""
-
-    try:
-        while True:
-            by_record, last_id = _fetch_batch(storage, table_id, last_id, batch_size, radius_deg)
-            if not by_record:
-                break
-
-            record_pgc_by_id, existing_pgcs, design_to_pgcs = _enrich_batch(storage, table_name, by_record, pgc_column)
-            batch_results = _resolve_batch(
-                by_record,
-                record_pgc_by_id,
-                existing_pgcs,
-                design_to_pgcs,
-                resolver,
-                print_pending,
-                report_func,
-            )
-            batch_processed = len(batch_results)
-            batch_pending = sum(
-                1 for _record_id, result in batch_results if result.triage_status == TriageStatus.PENDING
+    if len(resolvers) > 1:
+        names = "\n".join(f"  {r.name}" for r in resolvers)
+        report_func(
+            report.LogEvent(
+                message=f"Evaluating {len(resolvers)} configurations (first one is written):\n{names}",
             )
+        )
 
-            for _record_id, result in batch_results:
-                counts[(result.status, result.triage_status, result.pending_reason)] += 1
-                total += 1
+    nearest_duplicate: dict[str, float] | None = None
+    if self_match:
+        matches = find_self_matches(storage, table_id, radius_deg)
+        nearest_duplicate = matches.nearest_duplicate_deg()
+        report_func(
+            report.LogEvent(
+                message=(
+                    f"Self-match found {len(matches.first)} pairs within {radius_deg * 3600:g} arcsec; "
+                    f"{len(nearest_duplicate)} records have a duplicate in the table."
+                ),
+            )
+        )
 
-            if write and client and batch_results:
-                _write_crossmatch_results(client, batch_results)
+    designations = _load_designation_index(storage, designation_index_max_bytes, report_func)
+    counts_by_resolver: list[StatusCounts] = [defaultdict(int) for _ in resolvers]
+    total = 0
+    skipped = 0
+    last_id = ""
+    state: CrossmatchState | None = None
+    state_cells: set[int] = set()
+    if state_path is not None and not write:
+        report_func(report.LogEvent(message="Dry run: crossmatch state is not saved."))
+    elif state_path is not None:
+        state = CrossmatchState(
+            table_name=table_name,
+            resolver_name=resolvers[0].name,
+            radius_deg=resolvers[0].search_radius_deg,
+        )
 
-            log.logger.info(
-                "processed batch",
-                rows=len(by_record),
-                last_id=last_id,
-                total=total,
+    with contextlib.ExitStack() as stack:
+        capture: EvidenceWriter | None = None
+        if capture_path is not None:
+            capture = stack.enter_context(
+                EvidenceWriter(
+                    capture_path,
+                    CaptureHeader(table_name=table_name, radius_deg=radius_deg, pgc_column=resolvers[0].pgc_column),
+                )
             )
             report_func(
                 report.LogEvent(
-                    message=(f"Batch processed: {batch_processed} objects; manual check: {batch_pending} objects.")
+                    message=f"Capturing evidence within {radius_deg * 3600:g} arcsec to {capture_path}.",
                 )
             )
-            progress = 100.0 if total_records == 0 else (100.0 * total / total_records)
-            report_func(report.ProgressEvent(percent=min(progress, 100.0)))
-            _emit_status_distribution_image(report_func, counts, caption=f"{total} records crossmatched")
-    finally:
-
-        def pct(n: int) -> float:
-            return (100.0 * n / total) if total else 0.0
-
-        summary_rows = [
-            (
-                status.value,
-                triage.value,
-                reason.value if reason is not None else "",
-                counts[(status, triage, reason)],
-                pct(counts[(status, triage, reason)]),
-            )
-            for status, triage, reason in sorted(
-                counts.keys(),
-                key=lambda k: (-counts[k], k[0].value, k[1].value, k[2].value if k[2] is not None else ""),
+        pending = stack.enter_context(PendingWriter(pending_path)) if pending_path is not None else None
+
+        try:
+            while True:
+                requested = batch_sizer.size if batch_sizer is not None else batch_size
+                fetch_started = time.monotonic()
+                batch, last_id = _fetch_batch(storage, table_id, last_id, requested, radius_deg)
+                fetch_seconds = time.monotonic() - fetch_started
+                if len(batch) == 0:
+                    break
+
+                claimed_by_column = {
+                    col: _fetch_claimed_pgcs(storage, table_name, batch.record_ids, col) for col in pgc_columns
+                }
+                design_to_pgcs = _fetch_designation_pgcs(storage, batch, designations)
+                batch = batch.with_designation_pgcs(design_to_pgcs)
+                if nearest_duplicate is not None:
+                    batch = batch.with_duplicates(nearest_duplicate)
+                results_by_resolver = _resolve_batch(batch, claimed_by_column, resolvers, capture, pending)
+                if state is not None:
+                    _update_state(
+                        state,
+                        state_cells,
+                        batch,
+                        design_to_pgcs,
+                        claimed_by_column[resolvers[0].pgc_column],
+                    )
+                batch_results = results_by_resolver[0]
+                batch_processed = len(batch_results)
+                batch_pending = sum(
+                    1 for _record_id, result in batch_results if result.triage_status == TriageStatus.PENDING
+                )
+
+                for counts, resolver_results in zip(counts_by_resolver, results_by_resolver, strict=True):
+                    for _record_id, result in resolver_results:
+                        counts[(result.status, result.triage_status, result.pending_reason)] += 1
+                total += batch_processed
+
+                if write and client and batch_results:
+                    skipped += _write_batch(storage, client, batch_results, write_changed_only)
+
+                log.logger.info(
+                    "processed batch",
+                    rows=len(batch),
+                    candidates=len(batch.candidates),
+                    fetch_seconds=round(fetch_seconds, 3),
+                    last_id=last_id,
+                    total=total,
+                    peak_rss_mb=round(_peak_rss_mb()),
+                )
+                message = f"Batch processed: {batch_processed} objects; manual check: {batch_pending} objects."
+                if batch_sizer is not None:
+                    next_size = batch_sizer.observe(len(batch), len(batch.candidates), fetch_seconds)
+                    message += (
+                        f" Fetched {len(batch.candidates)} candidates in {fetch_seconds:.1f}s;"
+                        f" next batch size: {next_size}."
+                    )
+                report_func(report.LogEvent(message=message))
+                progress = 100.0 if total_records == 0 else (100.0 * total / total_records)
+                report_func(report.ProgressEvent(percent=min(progress, 100.0)))
+                emit_status_distribution_image(
+                    report_func, counts_by_resolver[0], caption=f"{total} records crossmatched"
+                )
+
+            if state is not None and state_path is not None:
+                state.cells = fetch_cell_digests(storage, state_cells)
+                save_state(state_path, state)
+                report_func(
+                    report.LogEvent(
+                        message=(
+                            f"Saved crossmatch state for {len(state.records)} records "
+                            f"and {len(state.cells)} sky cells to {state_path}."
+                        ),
+                    )
+                )
+        finally:
+            footer_lines: list[str] = []
+            if capture is not None:
+                footer_lines.append(f"Evidence captured: {capture.written} records ({capture_path})")
+            if pending is not None and pending_path is not None:
+                footer_lines.append(_report_pending(report_func, pending, pending_path))
+            if write and write_changed_only:
+                footer_lines.append(f"Skipped unchanged results: {skipped} records")
+            report_func(report.ProgressEvent(percent=100))
+            report_summaries(report_func, resolvers, counts_by_resolver, total, footer="\n".join(footer_lines))
+
+
+def run_self_match(
+    storage: PgStorage,
+    table_name: str,
+    radius_deg: float,
+    report_func: Callable[[report.Event], None],
+    *,
+    max_groups: int = 20,
+) -> None:
+    table_id = find_table(storage, table_name)
+    report_func(
+        report.LogEvent(
+            message=f"Searching {table_name} for records within {radius_deg * 3600:g} arcsec of each other.",
+        )
+    )
+    matches = find_self_matches(storage, table_id, radius_deg)
+    report_func(report.ProgressEvent(percent=100))
+    report_self_matches(matches, table_name, report_func, max_groups=max_groups)
+
+
+def run_incremental_crossmatch(
+    storage: PgStorage,
+    table_name: str,
+    batch_size: int,
+    client: adminapi.AuthenticatedClient,
+    resolver: Resolver,
+    report_func: Callable[[report.Event], None],
+    state_path: pathlib.Path,
+    *,
+    pending_path: pathlib.Path | None = None,
+    write: bool = False,
+    write_changed_only: bool = False,
+    designation_index_max_bytes: int | None = None,
+) -> None:
+    state = load_state(state_path)
+    if state is None or state.table_name != table_name or state.resolver_name != resolver.name:
+        report_func(
+            report.LogEvent(
+                message=f"No crossmatch state for {table_name} with {resolver.name}; running a full crossmatch.",
             )
-            if counts[(status, triage, reason)] > 0
-        ]
-        summary = format_table(
-            ("Status", "Triage", "Reason", "Count", "%"),
-            summary_rows,
-            title=f"Total records: {total}\n",
         )
+        run_crossmatch(
+            storage,
+            table_name,
+            batch_size,
+            client,
+            [resolver],
+            report_func,
+            pending_path=pending_path,
+            write=write,
+            state_path=state_path,
+            write_changed_only=write_changed_only,
+            designation_index_max_bytes=designation_index_max_bytes,
+        )
+        return
+
+    table_id = find_table(storage, table_name)
+    radius_deg = resolver.search_radius_deg
+    cell_digests = fetch_cell_digests(storage, state.cells.keys())
+    changed_cells = {cell for cell, digest in cell_digests.items() if state.cells.get(cell) != digest}
+    report_func(
+        report.LogEvent(
+            message=f"{len(changed_cells)} of {len(state.cells)} sky cells changed since the last run.",
+        )
+    )
 
-        report_func(report.ProgressEvent(percent=100))
-        _emit_status_distribution_image(report_func, counts, caption=f"Final: {total} records")
-        report_func(report.DoneEvent(message=summary))
+    designations = _load_designation_index(storage, designation_index_max_bytes, report_func)
+    affected: list[str] = []
+    seen: set[str] = set()
+    cells: set[int] = set()
+    last_id = ""
+    while True:
+        batch = EvidenceBatch.from_rows(storage.stream(RECORDS_QUERY, (table_id, last_id, batch_size)), radius_deg)
+        if len(batch) == 0:
+            break
+        last_id = batch.record_ids[-1]
+        design_to_pgcs = _fetch_designation_pgcs(storage, batch, designations)
+        claimed = _fetch_claimed_pgcs(storage, table_name, batch.record_ids, resolver.pgc_column)
+        seen.update(batch.record_ids)
+        affected.extend(_affected_records(state, batch, design_to_pgcs, claimed, changed_cells, cells))
+
+    removed = state.records.keys() - seen
+    for record_id in removed:
+        del state.records[record_id]
+    report_func(
+        report.LogEvent(
+            message=f"Scanned {len(seen)} records: {len(affected)} to re-resolve, {len(removed)} no longer in table.",
+        )
+    )
+
+    counts: StatusCounts = defaultdict(int)
+    rewritten = 0
+    processed = 0
+    skipped = 0
+    with contextlib.ExitStack() as stack:
+        pending = stack.enter_context(PendingWriter(pending_path)) if pending_path is not None else None
+        try:
+            for start in range(0, len(affected), batch_size):
+                chunk = affected[start : start + batch_size]
+                batch = _fetch_batch_by_ids(storage, chunk, radius_deg)
+                claimed_by_column = {
+                    resolver.pgc_column: _fetch_claimed_pgcs(storage, table_name, chunk, resolver.pgc_column)
+                }
+                design_to_pgcs = _fetch_designation_pgcs(storage, batch, designations)
+                batch = batch.with_designation_pgcs(design_to_pgcs)
+                [results] = _resolve_batch(batch, claimed_by_column, [resolver], pending=pending)
+
+                previous_states = {record_id: state.records.get(record_id) for record_id in batch.record_ids}
+                _update_state(
+                    state,
+                    cells,
+                    batch,
+                    design_to_pgcs,
+                    claimed_by_column[resolver.pgc_column],
+                )
+                changed = [
+                    (record_id, result)
+                    for record_id, result in results
+                    if previous_states[record_id] != state.records[record_id]
+                ]
+                for _record_id, result in changed:
+                    counts[(result.status, result.triage_status, result.pending_reason)] += 1
+                if write and client and changed:
+                    skipped += _write_batch(storage, client, changed, write_changed_only)
+                rewritten += len(changed)
+                processed += len(results)
+
+                log.logger.info("processed incremental batch", rows=len(batch), changed=len(changed))
+                progress = 100.0 if not affected else 100.0 * processed / len(affected)
+                report_func(report.ProgressEvent(percent=min(progress, 100.0)))
+
+            new_cells = cells - cell_digests.keys()
+            state.cells = {cell: cell_digests[cell] for cell in cells if cell in cell_digests}
+            state.cells.update(fetch_cell_digests(storage, new_cells))
+            if write:
+                save_state(state_path, state)
+            else:
+                report_func(report.LogEvent(message="Dry run: crossmatch state is not saved."))
+        finally:
+            steps: list[tuple[str, int]] = [
+                ("Scanned", len(seen)),
+                ("Re-resolved", processed),
+                ("Evidence changed", rewritten),
+                ("Unchanged", processed - rewritten),
+            ]
+            if write and write_changed_only:
+                steps.append(("Skipped unchanged results", skipped))
+            footer = format_table(
+                ("Step", "Records"),
+                steps,
+                title="Incremental crossmatch",
+                right_align_last_n=1,
+                percent_last_column=False,
+            )
+            if pending is not None and pending_path is not None:
+                footer += "\n\n" + _report_pending(report_func, pending, pending_path)
+            report_func(report.ProgressEvent(percent=100))
+            report_summaries(report_func, [resolver], [counts], rewritten, footer=footer)
@@ -0,0 +1,27 @@
+from uploader.app.crossmatch.batch import EvidenceBatch
+from uploader.app.crossmatch.layered.models import (
+    NEW,
+    PreliminaryBatch,
+    PreliminaryCrossmatchStatus,
+    PreliminaryCrossmatchStatusNew,
+)
+from uploader.app.crossmatch.models import PendingReason, RecordEvidence
+
+
+def duplicate_resolver(
+    evidence: RecordEvidence,
+    previous_result: PreliminaryCrossmatchStatus,
+    radius_deg: float,
+) -> tuple[PreliminaryCrossmatchStatus, PendingReason | None]:
+    if not isinstance(previous_result, PreliminaryCrossmatchStatusNew):
+        return previous_result, None
+
+    if evidence.duplicate_distance_deg is None or evidence.duplicate_distance_deg > radius_deg:
+        return previous_result, None
+
+    return previous_result, PendingReason.DUPLICATE_IN_TABLE
+
+
+def duplicate_resolver_batch(batch: EvidenceBatch, state: PreliminaryBatch, radius_deg: float) -> None:
+    duplicated = state.active & (state.kind == NEW) & (batch.duplicate_distance_deg <= radius_deg)
+    state.set_pending(duplicated, PendingReason.DUPLICATE_IN_TABLE)
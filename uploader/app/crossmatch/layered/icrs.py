@@ -1,8 +1,16 @@
+import numpy as np
+
+from uploader.app.crossmatch.batch import EvidenceBatch
 from uploader.app.crossmatch.layered.models import (
+    COLLIDING,
+    EXISTING,
+    NEW,
+    PreliminaryBatch,
     PreliminaryCrossmatchStatus,
     PreliminaryCrossmatchStatusColliding,
     PreliminaryCrossmatchStatusExisting,
     PreliminaryCrossmatchStatusNew,
+    group_keys,
 )
 from uploader.app.crossmatch.models import PendingReason, RecordEvidence
 
@@ -10,12 +18,30 @@ from uploader.app.crossmatch.models import PendingReason, RecordEvidence
 def icrs_simple_resolver(
     evidence: RecordEvidence, radius_deg: float
 ) -> tuple[PreliminaryCrossmatchStatus, PendingReason | None]:
-    neighbors_within_radius = [n for n in evidence.neighbors if n.distance_deg <= radius_deg]
+    neighbors = evidence.neighbors
+    pgcs_within_radius = neighbors.pgc[neighbors.distance_deg <= radius_deg].tolist()
 
-    if len(neighbors_within_radius) == 0:
+    if len(pgcs_within_radius) == 0:
         return PreliminaryCrossmatchStatusNew(), None
 
-    if len(neighbors_within_radius) == 1:
-        return PreliminaryCrossmatchStatusExisting(neighbors_within_radius[0].pgc), None
+    if len(pgcs_within_radius) == 1:
+        return PreliminaryCrossmatchStatusExisting(pgcs_within_radius[0]), None
+
+    return PreliminaryCrossmatchStatusColliding(set(pgcs_within_radius)), None
+
 
-    return PreliminaryCrossmatchStatusColliding({n.pgc for n in neighbors_within_radius}), None
+def icrs_simple_resolver_batch(batch: EvidenceBatch, radius_deg: float) -> PreliminaryBatch:
+    candidate_record = batch.candidate_records()
+    within = batch.candidates.distance_deg <= radius_deg
+    keys = group_keys(candidate_record, batch.candidates.pgc)
+    counts = np.bincount(candidate_record[within], minlength=len(batch))
+    pgc = np.full(len(batch), -1, dtype=np.int64)
+    pgc[candidate_record[within]] = batch.candidates.pgc[within]
+    return PreliminaryBatch(
+        kind=np.select([counts == 0, counts == 1], [NEW, EXISTING], COLLIDING).astype(np.int8),
+        pgc=pgc,
+        pending=np.full(len(batch), -1, dtype=np.int8),
+        candidate_record=candidate_record,
+        within_radius=within,
+        in_icrs_set=np.isin(keys, keys[within]),
+    )
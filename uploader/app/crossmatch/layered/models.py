@@ -1,4 +1,10 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+import numpy as np
+import numpy.typing as npt
+
+from uploader.app.crossmatch.batch import EvidenceBatch
+from uploader.app.crossmatch.models import PendingReason
 
 
 @dataclass
@@ -19,3 +25,60 @@ class PreliminaryCrossmatchStatusColliding:
 PreliminaryCrossmatchStatus = (
     PreliminaryCrossmatchStatusNew | PreliminaryCrossmatchStatusExisting | PreliminaryCrossmatchStatusColliding
 )
+
+
+NEW = 0
+EXISTING = 1
+COLLIDING = 2
+
+PENDING_REASONS = list(PendingReason)
+
+
+def group_keys(records: npt.NDArray[np.int64], pgcs: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+    return (records << 32) | pgcs
+
+
+@dataclass(slots=True)
+class PreliminaryBatch:
+    """
+    Preliminary statuses of a whole batch: `kind` is NEW, EXISTING or COLLIDING, `pgc` is set for EXISTING records
+    and `pending` holds an index into `PENDING_REASONS` (-1 while the record is still being resolved).
+    Colliding records use the pgcs of their candidates within the radius unless `explicit_pgcs` overrides them.
+    `in_icrs_set` marks candidates whose pgc is one of their record's candidates within the radius.
+    """
+
+    kind: npt.NDArray[np.int8]
+    pgc: npt.NDArray[np.int64]
+    pending: npt.NDArray[np.int8]
+    candidate_record: npt.NDArray[np.int64]
+    within_radius: npt.NDArray[np.bool_]
+    in_icrs_set: npt.NDArray[np.bool_]
+    explicit_pgcs: dict[int, set[int]] = field(default_factory=dict)
+
+    @property
+    def active(self) -> npt.NDArray[np.bool_]:
+        return self.pending < 0
+
+    def set_pending(self, mask: npt.NDArray[np.bool_], reason: PendingReason) -> None:
+        self.pending[mask] = PENDING_REASONS.index(reason)
+
+    def count_by_record(self, rows: npt.NDArray[np.bool_]) -> npt.NDArray[np.int64]:
+        return np.bincount(self.candidate_record[rows], minlength=len(self.kind))
+
+    def first_row(self, rows: npt.NDArray[np.bool_]) -> npt.NDArray[np.int64]:
+        """Index of the first candidate row of each record where `rows` is set, -1 if there is none."""
+        first = np.full(len(self.kind), -1, dtype=np.int64)
+        indices = np.flatnonzero(rows)
+        records, positions = np.unique(self.candidate_record[indices], return_index=True)
+        first[records] = indices[positions]
+        return first
+
+    def colliding_pgcs(self, batch: EvidenceBatch, i: int) -> set[int]:
+        explicit = self.explicit_pgcs.get(i)
+        if explicit is not None:
+            return explicit
+        lo, hi = batch.offsets[i], batch.offsets[i + 1]
+        return set(batch.candidates.pgc[lo:hi][self.within_radius[lo:hi]].tolist())
+
+    def name_pgcs(self, batch: EvidenceBatch, i: int) -> set[int]:
+        return set(batch.name_pgcs[batch.name_offsets[i] : batch.name_offsets[i + 1]].tolist())
@@ -1,8 +1,16 @@
+import numpy as np
+
+from uploader.app.crossmatch.batch import EvidenceBatch
 from uploader.app.crossmatch.layered.models import (
+    COLLIDING,
+    EXISTING,
+    NEW,
+    PreliminaryBatch,
     PreliminaryCrossmatchStatus,
     PreliminaryCrossmatchStatusColliding,
     PreliminaryCrossmatchStatusExisting,
     PreliminaryCrossmatchStatusNew,
+    group_keys,
 )
 from uploader.app.crossmatch.models import PendingReason, RecordEvidence
 
@@ -60,3 +68,38 @@ def name_resolver(
     return PreliminaryCrossmatchStatusColliding(
         previous_result.pgcs | name_pgcs
     ), PendingReason.MATCHED_NAME_OUTSIDE_CIRCLE
+
+
+def name_resolver_batch(batch: EvidenceBatch, state: PreliminaryBatch) -> None:
+    name_count = np.diff(batch.name_offsets)
+    has_names = state.active & (name_count > 0)
+    first_name = np.full(len(batch), -1, dtype=np.int64)
+    first_name[has_names] = batch.name_pgcs[batch.name_offsets[:-1][has_names]]
+
+    name_record = batch.name_records()
+    icrs_keys = group_keys(state.candidate_record[state.within_radius], batch.candidates.pgc[state.within_radius])
+    common = np.isin(group_keys(name_record, batch.name_pgcs), icrs_keys)
+    common_count = np.bincount(name_record[common], minlength=len(batch))
+    common_pgc = np.full(len(batch), -1, dtype=np.int64)
+    common_pgc[name_record[common]] = batch.name_pgcs[common]
+
+    new = has_names & (state.kind == NEW)
+    existing = has_names & (state.kind == EXISTING) & ~((name_count == 1) & (first_name == state.pgc))
+    colliding = has_names & (state.kind == COLLIDING)
+    resolved = colliding & (common_count == 1)
+
+    for i in np.flatnonzero(new & (name_count > 1)).tolist():
+        state.explicit_pgcs[i] = state.name_pgcs(batch, i)
+    for i in np.flatnonzero(existing).tolist():
+        state.explicit_pgcs[i] = state.name_pgcs(batch, i) | {int(state.pgc[i])}
+    for i in np.flatnonzero(colliding & ~resolved).tolist():
+        state.explicit_pgcs[i] = state.colliding_pgcs(batch, i) | state.name_pgcs(batch, i)
+
+    single_new = new & (name_count == 1)
+    state.kind[single_new] = EXISTING
+    state.pgc[single_new] = first_name[single_new]
+    state.kind[new & (name_count > 1)] = COLLIDING
+    state.kind[existing] = COLLIDING
+    state.kind[resolved] = EXISTING
+    state.pgc[resolved] = common_pgc[resolved]
+    state.set_pending(new | existing | (colliding & ~resolved), PendingReason.MATCHED_NAME_OUTSIDE_CIRCLE)
@@ -1,9 +1,16 @@
+import numpy as np
+import numpy.typing as npt
+
+from uploader.app.crossmatch.batch import EvidenceBatch
 from uploader.app.crossmatch.layered.models import (
+    COLLIDING,
+    EXISTING,
+    PreliminaryBatch,
     PreliminaryCrossmatchStatus,
     PreliminaryCrossmatchStatusExisting,
     PreliminaryCrossmatchStatusNew,
 )
-from uploader.app.crossmatch.models import PendingReason, RecordEvidence
+from uploader.app.crossmatch.models import PendingReason, RecordEvidence, known_type_names, type_name_of
 
 SIMILAR_TYPE_MAP = {
     "G": {"ext", "?", "QSO"},
@@ -26,21 +33,56 @@ def object_type_resolver(
 
     record_type = evidence.record_type_name
 
+    neighbors = evidence.neighbors
+
     if isinstance(previous_result, PreliminaryCrossmatchStatusExisting):
-        neighbor = next((n for n in evidence.neighbors if n.pgc == previous_result.pgc), None)
-        existing_type = neighbor.type_name if neighbor is not None else None
+        matches = np.flatnonzero(neighbors.pgc == previous_result.pgc)
+        existing_type = type_name_of(int(neighbors.type_code[matches[0]])) if len(matches) > 0 else None
 
         if existing_type is not None and not _types_match(record_type, existing_type):
             return previous_result, PendingReason.TYPE_MISMATCH
 
         return previous_result, None
 
-    same_type_neighbors = [
-        n
-        for n in evidence.neighbors
-        if n.pgc in previous_result.pgcs and n.type_name is not None and _types_match(record_type, n.type_name)
+    involved = np.isin(neighbors.pgc, list(previous_result.pgcs)) & (neighbors.type_code >= 0)
+    same_type_pgcs = [
+        pgc
+        for pgc, code in zip(neighbors.pgc[involved].tolist(), neighbors.type_code[involved].tolist(), strict=True)
+        if _types_match(record_type, type_name_of(code) or "")
     ]
-    if len(same_type_neighbors) == 1:
-        return PreliminaryCrossmatchStatusExisting(same_type_neighbors[0].pgc), None
+    if len(same_type_pgcs) == 1:
+        return PreliminaryCrossmatchStatusExisting(same_type_pgcs[0]), None
 
     return previous_result, None
+
+
+def _compatibility_matrix() -> npt.NDArray[np.bool_]:
+    names = known_type_names()
+    return np.array([[_types_match(a, b) for b in names] for a in names], dtype=np.bool_).reshape(
+        len(names), len(names)
+    )
+
+
+def object_type_resolver_batch(batch: EvidenceBatch, state: PreliminaryBatch) -> None:
+    record_type = batch.type_code.astype(np.int64)
+    active = state.active & (record_type >= 0)
+    candidate_type = batch.candidates.type_code.astype(np.int64)
+    known = candidate_type >= 0
+    compatible = np.zeros(len(candidate_type), dtype=np.bool_)
+    rows = known & (record_type[state.candidate_record] >= 0)
+    compatible[rows] = _compatibility_matrix()[record_type[state.candidate_record][rows], candidate_type[rows]]
+
+    first = state.first_row(batch.candidates.pgc == state.pgc[state.candidate_record])
+    existing = active & (state.kind == EXISTING) & (first >= 0)
+    matched = first[existing]
+    mismatch = np.zeros(len(first), dtype=np.bool_)
+    mismatch[existing] = known[matched] & ~compatible[matched]
+    state.set_pending(mismatch, PendingReason.TYPE_MISMATCH)
+
+    colliding = active & (state.kind == COLLIDING)
+    same_type = state.in_icrs_set & colliding[state.candidate_record] & compatible
+    resolved = colliding & (state.count_by_record(same_type) == 1)
+    same_type_pgc = np.full(len(batch), -1, dtype=np.int64)
+    same_type_pgc[state.candidate_record[same_type]] = batch.candidates.pgc[same_type]
+    state.kind[resolved] = EXISTING
+    state.pgc[resolved] = same_type_pgc[resolved]
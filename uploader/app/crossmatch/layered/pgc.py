@@ -1,4 +1,11 @@
+import numpy as np
+
+from uploader.app.crossmatch.batch import EvidenceBatch
 from uploader.app.crossmatch.layered.models import (
+    COLLIDING,
+    EXISTING,
+    NEW,
+    PreliminaryBatch,
     PreliminaryCrossmatchStatus,
     PreliminaryCrossmatchStatusColliding,
     PreliminaryCrossmatchStatusExisting,
@@ -33,3 +40,26 @@ def pgc_resolver(
         return PreliminaryCrossmatchStatusExisting(pgc), None
 
     return PreliminaryCrossmatchStatusColliding(previous_result.pgcs | {pgc}), PendingReason.MATCHED_PGC_OUTSIDE_CIRCLE
+
+
+def pgc_resolver_batch(batch: EvidenceBatch, state: PreliminaryBatch) -> None:
+    claimed = state.active & (batch.record_pgc >= 0)
+    state.set_pending(claimed & ~batch.claimed_pgc_exists, PendingReason.UNKNOWN_PGC)
+    claimed &= batch.claimed_pgc_exists
+    pgc = batch.record_pgc
+
+    new = claimed & (state.kind == NEW)
+    different = claimed & (state.kind == EXISTING) & (state.pgc != pgc)
+    colliding = claimed & (state.kind == COLLIDING)
+    in_set = state.count_by_record(state.in_icrs_set & (batch.candidates.pgc == pgc[state.candidate_record])) > 0
+
+    for i in np.flatnonzero(different).tolist():
+        state.explicit_pgcs[i] = {int(pgc[i]), int(state.pgc[i])}
+    for i in np.flatnonzero(colliding & ~in_set).tolist():
+        state.explicit_pgcs[i] = state.colliding_pgcs(batch, i) | {int(pgc[i])}
+
+    to_existing = new | (colliding & in_set)
+    state.kind[to_existing] = EXISTING
+    state.pgc[to_existing] = pgc[to_existing]
+    state.kind[different] = COLLIDING
+    state.set_pending(new | different | (colliding & ~in_set), PendingReason.MATCHED_PGC_OUTSIDE_CIRCLE)
@@ -1,4 +1,10 @@
+import numpy as np
+
+from uploader.app.crossmatch.batch import EvidenceBatch
 from uploader.app.crossmatch.layered.models import (
+    COLLIDING,
+    EXISTING,
+    PreliminaryBatch,
     PreliminaryCrossmatchStatus,
     PreliminaryCrossmatchStatusExisting,
     PreliminaryCrossmatchStatusNew,
@@ -19,25 +25,57 @@ def redshift_resolver(
     if isinstance(previous_result, PreliminaryCrossmatchStatusNew):
         return previous_result, None
 
+    neighbors = evidence.neighbors
+
     if isinstance(previous_result, PreliminaryCrossmatchStatusExisting):
-        neighbor = next((n for n in evidence.neighbors if n.pgc == previous_result.pgc), None)
+        matches = np.flatnonzero(neighbors.pgc == previous_result.pgc)
 
-        if neighbor is None or neighbor.redshift is None:
+        if len(matches) == 0 or np.isnan(neighbors.redshift[matches[0]]):
             return previous_result, None
 
-        if abs(neighbor.redshift - record_z) < redshift_tolerance:
+        if abs(float(neighbors.redshift[matches[0]]) - record_z) < redshift_tolerance:
             return previous_result, None
 
         return previous_result, PendingReason.REDSHIFT_MISMATCH
 
-    neighbors_involved = [n for n in evidence.neighbors if n.pgc in previous_result.pgcs]
-    if any(n.redshift is None for n in neighbors_involved):
+    involved = np.isin(neighbors.pgc, list(previous_result.pgcs))
+    redshifts = neighbors.redshift[involved]
+    if np.isnan(redshifts).any():
         return previous_result, None
 
-    close = [
-        n for n in neighbors_involved if n.redshift is not None and abs(n.redshift - record_z) < redshift_tolerance
-    ]
+    close = neighbors.pgc[involved][np.abs(redshifts - record_z) < redshift_tolerance].tolist()
     if len(close) == 1:
-        return PreliminaryCrossmatchStatusExisting(close[0].pgc), None
+        return PreliminaryCrossmatchStatusExisting(close[0]), None
 
     return previous_result, None
+
+
+def redshift_resolver_batch(
+    batch: EvidenceBatch,
+    state: PreliminaryBatch,
+    redshift_tolerance: float | None,
+) -> None:
+    if redshift_tolerance is None:
+        return
+
+    record_z = batch.redshift
+    active = state.active & ~np.isnan(record_z)
+    candidate_z = batch.candidates.redshift
+    delta_ok = np.abs(candidate_z - record_z[state.candidate_record]) < redshift_tolerance
+
+    first = state.first_row(batch.candidates.pgc == state.pgc[state.candidate_record])
+    existing = active & (state.kind == EXISTING) & (first >= 0)
+    matched = first[existing]
+    mismatch = np.zeros(len(first), dtype=np.bool_)
+    mismatch[existing] = ~np.isnan(candidate_z[matched]) & ~delta_ok[matched]
+    state.set_pending(mismatch, PendingReason.REDSHIFT_MISMATCH)
+
+    colliding = active & (state.kind == COLLIDING)
+    involved = state.in_icrs_set & colliding[state.candidate_record]
+    unknown = state.count_by_record(involved & np.isnan(candidate_z)) > 0
+    close = involved & delta_ok
+    resolved = colliding & ~unknown & (state.count_by_record(close) == 1)
+    close_pgc = np.full(len(batch), -1, dtype=np.int64)
+    close_pgc[state.candidate_record[close]] = batch.candidates.pgc[close]
+    state.kind[resolved] = EXISTING
+    state.pgc[resolved] = close_pgc[resolved]
@@ -1,5 +1,10 @@
-from uploader.app.crossmatch.layered import icrs, name, object_type, pgc, redshift
+from uploader.app.crossmatch.batch import EvidenceBatch
+from uploader.app.crossmatch.layered import duplicate, icrs, name, object_type, pgc, redshift
 from uploader.app.crossmatch.layered.models import (
+    EXISTING,
+    NEW,
+    PENDING_REASONS,
+    PreliminaryBatch,
     PreliminaryCrossmatchStatus,
     PreliminaryCrossmatchStatusExisting,
     PreliminaryCrossmatchStatusNew,
@@ -28,11 +33,65 @@ def _preliminary_to_final(results: PreliminaryCrossmatchStatus, pending_reason:
     return CrossmatchResult(
         status=CrossmatchStatus.COLLIDING,
         triage_status=TriageStatus.PENDING,
-        colliding_pgcs=list(results.pgcs),
+        colliding_pgcs=sorted(results.pgcs),
         pending_reason=pending_reason,
     )
 
 
+_RESOLVED_NEW = CrossmatchResult(status=CrossmatchStatus.NEW, triage_status=TriageStatus.RESOLVED)
+
+
+def _batch_to_final(batch: EvidenceBatch, state: PreliminaryBatch) -> list[CrossmatchResult]:
+    results: list[CrossmatchResult] = []
+    for i, (kind, matched_pgc, pending) in enumerate(
+        zip(state.kind.tolist(), state.pgc.tolist(), state.pending.tolist(), strict=True)
+    ):
+        if pending >= 0:
+            reason = PENDING_REASONS[pending]
+            if kind == NEW:
+                results.append(
+                    CrossmatchResult(
+                        status=CrossmatchStatus.NEW, triage_status=TriageStatus.PENDING, pending_reason=reason
+                    )
+                )
+            elif kind == EXISTING:
+                results.append(
+                    CrossmatchResult(
+                        status=CrossmatchStatus.EXISTING,
+                        triage_status=TriageStatus.PENDING,
+                        matched_pgc=matched_pgc,
+                        pending_reason=reason,
+                    )
+                )
+            else:
+                results.append(
+                    CrossmatchResult(
+                        status=CrossmatchStatus.COLLIDING,
+                        triage_status=TriageStatus.PENDING,
+                        colliding_pgcs=sorted(state.colliding_pgcs(batch, i)),
+                        pending_reason=reason,
+                    )
+                )
+        elif kind == NEW:
+            results.append(_RESOLVED_NEW)
+        elif kind == EXISTING:
+            results.append(
+                CrossmatchResult(
+                    status=CrossmatchStatus.EXISTING, triage_status=TriageStatus.RESOLVED, matched_pgc=matched_pgc
+                )
+            )
+        else:
+            results.append(
+                CrossmatchResult(
+                    status=CrossmatchStatus.COLLIDING,
+                    triage_status=TriageStatus.PENDING,
+                    colliding_pgcs=sorted(state.colliding_pgcs(batch, i)),
+                    pending_reason=PendingReason.MULTIPLE_OBJECTS_MATCHED,
+                )
+            )
+    return results
+
+
 class LayeredResolver:
     def __init__(
         self,
@@ -52,6 +111,19 @@ class LayeredResolver:
     def pgc_column(self) -> str | None:
         return self._pgc_column
 
+    @property
+    def redshift_tolerance(self) -> float | None:
+        return self._redshift_tolerance
+
+    @property
+    def name(self) -> str:
+        parts = [f'radius={self._radius_deg * 3600:g}"']
+        if self._pgc_column is not None:
+            parts.append(f"pgc_column={self._pgc_column}")
+        if self._redshift_tolerance is not None:
+            parts.append(f"redshift_tolerance={self._redshift_tolerance:g}")
+        return "layered(" + ", ".join(parts) + ")"
+
     def resolve(self, evidence: RecordEvidence) -> CrossmatchResult:
         icrs_result, pending_reason = icrs.icrs_simple_resolver(evidence, self._radius_deg)
         if pending_reason is not None:
@@ -72,7 +144,11 @@ class LayeredResolver:
         type_result, pending_reason = object_type.object_type_resolver(evidence, redshift_result)
         if pending_reason is not None:
             return _preliminary_to_final(type_result, pending_reason)
-        final_result = type_result
+
+        duplicate_result, pending_reason = duplicate.duplicate_resolver(evidence, type_result, self._radius_deg)
+        if pending_reason is not None:
+            return _preliminary_to_final(duplicate_result, pending_reason)
+        final_result = duplicate_result
 
         if isinstance(final_result, PreliminaryCrossmatchStatusNew):
             return CrossmatchResult(status=CrossmatchStatus.NEW, triage_status=TriageStatus.RESOLVED)
@@ -85,6 +161,15 @@ class LayeredResolver:
         return CrossmatchResult(
             status=CrossmatchStatus.COLLIDING,
             triage_status=TriageStatus.PENDING,
-            colliding_pgcs=list(final_result.pgcs),
+            colliding_pgcs=sorted(final_result.pgcs),
             pending_reason=PendingReason.MULTIPLE_OBJECTS_MATCHED,
         )
+
+    def resolve_batch(self, batch: EvidenceBatch) -> list[CrossmatchResult]:
+        state = icrs.icrs_simple_resolver_batch(batch, self._radius_deg)
+        pgc.pgc_resolver_batch(batch, state)
+        name.name_resolver_batch(batch, state)
+        redshift.redshift_resolver_batch(batch, state, self._redshift_tolerance)
+        object_type.object_type_resolver_batch(batch, state)
+        duplicate.duplicate_resolver_batch(batch, state, self._radius_deg)
+        return _batch_to_final(batch, state)
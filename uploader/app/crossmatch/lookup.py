@@ -0,0 +1,217 @@
+import array
+import math
+import threading
+from collections.abc import Callable
+from typing import Any, Self
+
+import numpy as np
+from psycopg import sql
+
+from uploader.app import log
+from uploader.app.crossmatch.batch import C_M_S, angular_distances_deg
+from uploader.app.crossmatch.capture import evidence_to_dict
+from uploader.app.crossmatch.designations import DesignationIndex
+from uploader.app.crossmatch.models import (
+    EMPTY_NEIGHBORS,
+    CrossmatchResult,
+    NeighborTable,
+    RecordEvidence,
+    type_code,
+)
+from uploader.app.crossmatch.resolver import Resolver
+from uploader.app.storage import PgStorage
+
+LAYER2_QUERY = sql.SQL("""
+    SELECT
+        l2.pgc,
+        l2.ra,
+        l2.dec,
+        l2_desig.design,
+        l2_cz.cz,
+        l2_nat.type_name
+    FROM layer2.icrs l2
+    LEFT JOIN layer2.designation l2_desig ON l2.pgc = l2_desig.pgc
+    LEFT JOIN layer2.cz l2_cz ON l2.pgc = l2_cz.pgc
+    LEFT JOIN layer2.nature l2_nat ON l2.pgc = l2_nat.pgc
+""")
+
+RECORD_QUERY = """
+    SELECT
+        t.table_name,
+        nc.ra,
+        nc.dec,
+        desig.design,
+        cz.cz,
+        nat.type_name
+    FROM layer0.records rec
+    JOIN layer0.tables t ON rec.table_id = t.id
+    LEFT JOIN icrs.data nc ON rec.id = nc.record_id
+    LEFT JOIN designation.data desig ON rec.id = desig.record_id
+    LEFT JOIN cz.data cz ON rec.id = cz.record_id
+    LEFT JOIN nature.data nat ON rec.id = nat.record_id
+    WHERE rec.id = %s
+"""
+
+
+class Layer2Index:
+    """
+    In-memory copy of the layer2 columns the crossmatch reads, sorted by declination
+    so that the candidates of one position are found with two binary searches.
+    """
+
+    def __init__(self, neighbors: NeighborTable, designations: DesignationIndex) -> None:
+        order = np.argsort(neighbors.dec, kind="stable")
+        self._neighbors = neighbors[order]
+        self._pgcs = np.unique(neighbors.pgc)
+        self._designations = designations
+
+    @classmethod
+    def load(cls, storage: PgStorage) -> Self:
+        pgc = array.array("q")
+        ra = array.array("d")
+        dec = array.array("d")
+        redshift = array.array("d")
+        types = array.array("h")
+        design: list[str | None] = []
+        for row_pgc, row_ra, row_dec, row_design, row_cz, row_type in storage.stream(LAYER2_QUERY):
+            if row_ra is None or row_dec is None:
+                continue
+            pgc.append(row_pgc)
+            ra.append(row_ra)
+            dec.append(row_dec)
+            redshift.append(float(row_cz) / C_M_S if row_cz is not None else math.nan)
+            types.append(type_code(row_type))
+            design.append(row_design)
+
+        designations = DesignationIndex.load(storage)
+        if designations is None:
+            raise RuntimeError("Unable to load layer2 designations")
+
+        neighbors = NeighborTable(
+            pgc=np.frombuffer(pgc, dtype=np.int64),
+            ra=np.frombuffer(ra, dtype=np.float64),
+            dec=np.frombuffer(dec, dtype=np.float64),
+            distance_deg=np.zeros(len(pgc), dtype=np.float64),
+            redshift=np.frombuffer(redshift, dtype=np.float64),
+            type_code=np.frombuffer(types, dtype=np.int16),
+            design=np.array(design, dtype=object),
+        )
+        return cls(neighbors, designations)
+
+    def __len__(self) -> int:
+        return len(self._neighbors)
+
+    def neighbors(self, ra: float, dec: float, radius_deg: float) -> NeighborTable:
+        lo = int(np.searchsorted(self._neighbors.dec, dec - radius_deg, side="left"))
+        hi = int(np.searchsorted(self._neighbors.dec, dec + radius_deg, side="right"))
+        strip = self._neighbors[lo:hi]
+        distance = angular_distances_deg(np.full(len(strip), ra), np.full(len(strip), dec), strip.ra, strip.dec)
+        keep = distance <= radius_deg
+        return NeighborTable(
+            pgc=strip.pgc[keep],
+            ra=strip.ra[keep],
+            dec=strip.dec[keep],
+            distance_deg=distance[keep],
+            redshift=strip.redshift[keep],
+            type_code=strip.type_code[keep],
+            design=strip.design[keep],
+        )
+
+    def same_name_pgcs(self, design: str | None) -> list[int] | None:
+        if design is None:
+            return None
+        return self._designations.get(design) or None
+
+    def has_pgc(self, pgc: int) -> bool:
+        i = int(np.searchsorted(self._pgcs, pgc))
+        return i < len(self._pgcs) and int(self._pgcs[i]) == pgc
+
+    def evidence(
+        self,
+        radius_deg: float,
+        *,
+        ra: float | None,
+        dec: float | None,
+        design: str | None = None,
+        redshift: float | None = None,
+        type_name: str | None = None,
+        record_pgc: int | None = None,
+    ) -> RecordEvidence:
+        neighbors = self.neighbors(ra, dec, radius_deg) if ra is not None and dec is not None else EMPTY_NEIGHBORS
+        return RecordEvidence(
+            neighbors=neighbors,
+            record_designation=design,
+            same_name_pgcs=self.same_name_pgcs(design),
+            record_pgc=record_pgc,
+            claimed_pgc_exists_in_layer2=record_pgc is not None and self.has_pgc(record_pgc),
+            record_redshift=redshift,
+            record_type_name=type_name,
+        )
+
+
+_indexes: dict[str, Layer2Index] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_layer2_index(key: str, storage_factory: Callable[[], Any], *, refresh: bool = False) -> Layer2Index:
+    """
+    Returns the index cached in this process under `key`, loading it on first use or when `refresh` is set.
+    `storage_factory` returns a context manager that yields a `PgStorage`.
+    """
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None or refresh:
+            with storage_factory() as storage:
+                index = Layer2Index.load(storage)
+            _indexes[key] = index
+            log.logger.info("loaded layer2 index", key=key, objects=len(index))
+        return index
+
+
+def fetch_record_evidence(
+    storage: PgStorage,
+    index: Layer2Index,
+    record_id: str,
+    radius_deg: float,
+    pgc_column: str | None,
+) -> RecordEvidence:
+    rows = storage.query(RECORD_QUERY, (record_id,))
+    if not rows:
+        raise RuntimeError(f"Record not found: {record_id}")
+    row = rows[0]
+    record_pgc: int | None = None
+    if pgc_column is not None:
+        raw_pgc_query = sql.SQL("SELECT {col} FROM rawdata.{t} WHERE hyperleda_internal_id = %s").format(
+            col=sql.Identifier(pgc_column),
+            t=sql.Identifier(row["table_name"]),
+        )
+        raw_rows = storage.query(raw_pgc_query, (record_id,))
+        if raw_rows and raw_rows[0][pgc_column] is not None:
+            record_pgc = int(raw_rows[0][pgc_column])
+    return index.evidence(
+        radius_deg,
+        ra=row["ra"],
+        dec=row["dec"],
+        design=row["design"],
+        redshift=float(row["cz"]) / C_M_S if row["cz"] is not None else None,
+        type_name=row["type_name"],
+        record_pgc=record_pgc,
+    )
+
+
+def result_to_dict(result: CrossmatchResult) -> dict[str, Any]:
+    return {
+        "status": result.status.value,
+        "triage_status": result.triage_status.value,
+        "matched_pgc": result.matched_pgc,
+        "colliding_pgcs": result.colliding_pgcs,
+        "pending_reason": result.pending_reason.value if result.pending_reason is not None else None,
+    }
+
+
+def resolve_evidence(resolver: Resolver, evidence: RecordEvidence) -> dict[str, Any]:
+    return {
+        "resolver": resolver.name,
+        "evidence": evidence_to_dict(evidence),
+        "result": result_to_dict(resolver.resolve(evidence)),
+    }
@@ -1,8 +1,42 @@
 import enum
+import threading
+from collections.abc import Iterable, Iterator, Sequence
 from dataclasses import dataclass
+from typing import Any, Self
 
+import numpy as np
+import numpy.typing as npt
 
-@dataclass
+_TYPE_NAMES: list[str] = []
+_TYPE_CODES: dict[str, int] = {}
+# crossmatch tasks and the lookup endpoint register type names from several threads
+_TYPE_LOCK = threading.Lock()
+
+
+def type_code(type_name: str | None) -> int:
+    if type_name is None:
+        return -1
+    code = _TYPE_CODES.get(type_name)
+    if code is not None:
+        return code
+    with _TYPE_LOCK:
+        code = _TYPE_CODES.get(type_name)
+        if code is None:
+            code = len(_TYPE_NAMES)
+            _TYPE_NAMES.append(type_name)
+            _TYPE_CODES[type_name] = code
+        return code
+
+
+def type_name_of(code: int) -> str | None:
+    return _TYPE_NAMES[code] if code >= 0 else None
+
+
+def known_type_names() -> list[str]:
+    return list(_TYPE_NAMES)
+
+
+@dataclass(frozen=True, slots=True)
 class Neighbor:
     pgc: int
     ra: float
@@ -13,15 +47,121 @@ class Neighbor:
     type_name: str | None = None
 
 
-@dataclass
+class NeighborTable:
+    """
+    Columnar storage of crossmatch candidates. Unknown redshifts are NaN and unknown types have code -1.
+    Slicing and masking return views over the same arrays; iterating materializes `Neighbor` objects.
+    """
+
+    __slots__ = ("dec", "design", "distance_deg", "pgc", "ra", "redshift", "type_code")
+
+    def __init__(
+        self,
+        pgc: npt.NDArray[np.int64],
+        ra: npt.NDArray[np.float64],
+        dec: npt.NDArray[np.float64],
+        distance_deg: npt.NDArray[np.float64],
+        redshift: npt.NDArray[np.float64],
+        type_code: npt.NDArray[np.int16],
+        design: npt.NDArray[np.object_],
+    ) -> None:
+        self.pgc = pgc
+        self.ra = ra
+        self.dec = dec
+        self.distance_deg = distance_deg
+        self.redshift = redshift
+        self.type_code = type_code
+        self.design = design
+
+    @classmethod
+    def from_neighbors(cls, neighbors: Iterable[Neighbor]) -> Self:
+        items = list(neighbors)
+        return cls(
+            pgc=np.array([n.pgc for n in items], dtype=np.int64),
+            ra=np.array([n.ra for n in items], dtype=np.float64),
+            dec=np.array([n.dec for n in items], dtype=np.float64),
+            distance_deg=np.array([n.distance_deg for n in items], dtype=np.float64),
+            redshift=np.array([np.nan if n.redshift is None else n.redshift for n in items], dtype=np.float64),
+            type_code=np.array([type_code(n.type_name) for n in items], dtype=np.int16),
+            design=np.array([n.design for n in items], dtype=object),
+        )
+
+    @classmethod
+    def concatenate(cls, tables: Sequence["NeighborTable"]) -> "NeighborTable":
+        if not tables:
+            return EMPTY_NEIGHBORS
+        return cls(
+            pgc=np.concatenate([t.pgc for t in tables]),
+            ra=np.concatenate([t.ra for t in tables]),
+            dec=np.concatenate([t.dec for t in tables]),
+            distance_deg=np.concatenate([t.distance_deg for t in tables]),
+            redshift=np.concatenate([t.redshift for t in tables]),
+            type_code=np.concatenate([t.type_code for t in tables]),
+            design=np.concatenate([t.design for t in tables]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.pgc)
+
+    def __getitem__(self, index: Any) -> "NeighborTable":
+        return NeighborTable(
+            pgc=self.pgc[index],
+            ra=self.ra[index],
+            dec=self.dec[index],
+            distance_deg=self.distance_deg[index],
+            redshift=self.redshift[index],
+            type_code=self.type_code[index],
+            design=self.design[index],
+        )
+
+    def __iter__(self) -> Iterator[Neighbor]:
+        for pgc, ra, dec, distance_deg, redshift, code, design in zip(
+            self.pgc.tolist(),
+            self.ra.tolist(),
+            self.dec.tolist(),
+            self.distance_deg.tolist(),
+            self.redshift.tolist(),
+            self.type_code.tolist(),
+            self.design.tolist(),
+            strict=True,
+        ):
+            yield Neighbor(
+                pgc=pgc,
+                ra=ra,
+                dec=dec,
+                distance_deg=distance_deg,
+                design=design,
+                redshift=None if np.isnan(redshift) else redshift,
+                type_name=type_name_of(code),
+            )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, NeighborTable):
+            return NotImplemented
+        return list(self) == list(other)
+
+    __hash__ = None
+
+    def within(self, radius_deg: float) -> "NeighborTable":
+        mask = self.distance_deg <= radius_deg
+        if mask.all():
+            return self
+        return self[mask]
+
+
+EMPTY_NEIGHBORS = NeighborTable.from_neighbors([])
+
+
+@dataclass(frozen=True, slots=True)
 class RecordEvidence:
-    neighbors: list[Neighbor]
+    neighbors: NeighborTable
     record_designation: str | None = None
     same_name_pgcs: list[int] | None = None
     record_pgc: int | None = None
     claimed_pgc_exists_in_layer2: bool = False
     record_redshift: float | None = None
     record_type_name: str | None = None
+    duplicate_distance_deg: float | None = None
 
 
 class CrossmatchStatus(enum.Enum):
@@ -42,9 +182,10 @@ class PendingReason(enum.Enum):
     UNKNOWN_PGC = "UNKNOWN_PGC"
     REDSHIFT_MISMATCH = "REDSHIFT_MISMATCH"
     TYPE_MISMATCH = "TYPE_MISMATCH"
+    DUPLICATE_IN_TABLE = "DUPLICATE_IN_TABLE"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class CrossmatchResult:
     status: CrossmatchStatus
     triage_status: TriageStatus
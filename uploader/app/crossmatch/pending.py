@@ -0,0 +1,96 @@
+import csv
+import gzip
+import math
+import pathlib
+from collections import defaultdict
+from typing import IO, Self
+
+from uploader.app.crossmatch.batch import EvidenceBatch
+from uploader.app.crossmatch.models import CrossmatchResult, TriageStatus, type_name_of
+
+PENDING_COLUMNS = (
+    "record_id",
+    "status",
+    "pending_reason",
+    "matched_pgc",
+    "colliding_pgcs",
+    "record_designation",
+    "record_redshift",
+    "record_type",
+    "record_pgc",
+    "neighbor_pgc",
+    "neighbor_distance_arcsec",
+    "neighbor_designation",
+    "neighbor_redshift",
+    "neighbor_type",
+)
+
+
+def _optional(value: float) -> float | str:
+    return "" if math.isnan(value) else value
+
+
+class PendingWriter:
+    """
+    Streams pending crossmatch cases to a gzip-compressed CSV file with one row per record and candidate;
+    records without candidates get a single row with empty neighbor columns.
+    Rows of a batch are collected first and written with a single call.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self._path = path
+        self._file: IO[str] | None = None
+        self.counts: dict[str, int] = defaultdict(int)
+
+    @property
+    def written(self) -> int:
+        return sum(self.counts.values())
+
+    def __enter__(self) -> Self:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(self._path, "wt", encoding="utf-8", newline="")
+        csv.writer(self._file).writerow(PENDING_COLUMNS)
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def write_batch(self, batch: EvidenceBatch, results: list[tuple[str, CrossmatchResult]]) -> None:
+        if self._file is None:
+            raise RuntimeError("PendingWriter is not open")
+        candidates = batch.candidates
+        rows: list[tuple[object, ...]] = []
+        for i, (record_id, result) in enumerate(results):
+            if result.triage_status != TriageStatus.PENDING:
+                continue
+            reason = result.pending_reason.value if result.pending_reason is not None else ""
+            self.counts[reason] += 1
+            record = (
+                record_id,
+                result.status.value,
+                reason,
+                result.matched_pgc if result.matched_pgc is not None else "",
+                ";".join(str(pgc) for pgc in result.colliding_pgcs or []),
+                batch.designation[i] or "",
+                _optional(float(batch.redshift[i])),
+                batch.record_type_name(i) or "",
+                batch.record_pgc[i] if batch.record_pgc[i] >= 0 else "",
+            )
+            lo, hi = int(batch.offsets[i]), int(batch.offsets[i + 1])
+            if lo == hi:
+                rows.append((*record, "", "", "", "", ""))
+                continue
+            for j in range(lo, hi):
+                rows.append(
+                    (
+                        *record,
+                        int(candidates.pgc[j]),
+                        round(float(candidates.distance_deg[j]) * 3600, 4),
+                        candidates.design[j] or "",
+                        _optional(float(candidates.redshift[j])),
+                        type_name_of(int(candidates.type_code[j])) or "",
+                    )
+                )
+        csv.writer(self._file).writerows(rows)
@@ -0,0 +1,44 @@
+from uploader.app.storage import PgStorage
+
+# columns of `EvidenceBatch.from_rows` for the records of a `batch` CTE and their layer2 candidates
+BATCH_SELECT = """
+    SELECT
+        b.id AS new_id,
+        nc.ra AS new_ra,
+        nc.dec AS new_dec,
+        new_desig.design AS new_design,
+        new_cz.cz AS new_cz,
+        rec_nat.type_name AS new_type,
+        l2.pgc AS existing_pgc,
+        l2.ra AS existing_ra,
+        l2.dec AS existing_dec,
+        l2_desig.design AS existing_design,
+        l2_cz.cz AS existing_cz,
+        l2_nat.type_name AS existing_type
+    FROM batch b
+    LEFT JOIN icrs.data nc ON b.id = nc.record_id
+    LEFT JOIN designation.data new_desig ON b.id = new_desig.record_id
+    LEFT JOIN cz.data new_cz ON b.id = new_cz.record_id
+    LEFT JOIN nature.data rec_nat ON b.id = rec_nat.record_id
+    LEFT JOIN layer2.icrs l2
+        ON nc.record_id IS NOT NULL
+        AND ST_DWithin(
+            ST_MakePoint(nc.dec, nc.ra - 180),
+            ST_MakePoint(l2.dec, l2.ra - 180),
+            %s / GREATEST(COS(RADIANS(nc.dec)), 0.01)
+        )
+    LEFT JOIN layer2.designation l2_desig ON l2.pgc = l2_desig.pgc
+    LEFT JOIN layer2.cz l2_cz ON l2.pgc = l2_cz.pgc
+    LEFT JOIN layer2.nature l2_nat ON l2.pgc = l2_nat.pgc
+    ORDER BY b.id ASC
+"""
+
+
+def find_table(storage: PgStorage, table_name: str) -> str:
+    rows = storage.query(
+        "SELECT id FROM layer0.tables WHERE table_name = %s",
+        (table_name,),
+    )
+    if not rows:
+        raise RuntimeError(f"Table not found: {table_name}")
+    return rows[0]["id"]
@@ -0,0 +1,64 @@
+import dataclasses
+import itertools
+import pathlib
+from collections import defaultdict
+from collections.abc import Callable, Sequence
+
+import numpy as np
+
+import uploader.app.report as report
+from uploader.app.crossmatch.batch import EvidenceBatch
+from uploader.app.crossmatch.capture import read_evidence, read_header
+from uploader.app.crossmatch.engine import StatusCounts, report_summaries
+from uploader.app.crossmatch.resolver import Resolver
+
+REPLAY_BATCH_SIZE = 10_000
+REPORT_EVERY_RECORDS = 100_000
+
+
+def run_replay(
+    capture_path: pathlib.Path,
+    resolvers: Sequence[Resolver],
+    report_func: Callable[[report.Event], None],
+) -> None:
+    if not resolvers:
+        raise ValueError("At least one resolver is required")
+    header = read_header(capture_path)
+    for resolver in resolvers:
+        if resolver.search_radius_deg > header.radius_deg:
+            raise RuntimeError(
+                f"Search radius {resolver.search_radius_deg * 3600:g} arcsec exceeds "
+                f"captured radius {header.radius_deg * 3600:g} arcsec"
+            )
+        if resolver.pgc_column is not None and resolver.pgc_column != header.pgc_column:
+            raise RuntimeError(f"Evidence was not captured with PGC column {resolver.pgc_column!r}")
+
+    report_func(
+        report.LogEvent(
+            message=(
+                f"Replaying crossmatch evidence for {header.table_name} from {capture_path} "
+                f"(captured within {header.radius_deg * 3600:g} arcsec, {len(resolvers)} configuration(s))."
+            ),
+        )
+    )
+
+    counts_by_resolver: list[StatusCounts] = [defaultdict(int) for _ in resolvers]
+    total = 0
+    for chunk in itertools.batched(read_evidence(capture_path), REPLAY_BATCH_SIZE, strict=False):
+        batch = EvidenceBatch.from_evidence(chunk)
+        without_pgc = dataclasses.replace(
+            batch,
+            record_pgc=np.full(len(batch), -1, dtype=np.int64),
+            claimed_pgc_exists=np.zeros(len(batch), dtype=np.bool_),
+        )
+        for counts, resolver in zip(counts_by_resolver, resolvers, strict=True):
+            resolver_batch = batch if resolver.pgc_column is not None else without_pgc
+            for result in resolver.resolve_batch(resolver_batch.within_radius(resolver.search_radius_deg)):
+                counts[(result.status, result.triage_status, result.pending_reason)] += 1
+        previous_total = total
+        total += len(batch)
+        if total // REPORT_EVERY_RECORDS > previous_total // REPORT_EVERY_RECORDS:
+            report_func(report.LogEvent(message=f"Replayed {total} records."))
+
+    report_func(report.ProgressEvent(percent=100))
+    report_summaries(report_func, resolvers, counts_by_resolver, total)
@@ -1,6 +1,7 @@
 from typing import Protocol
 
 from uploader.app.crossmatch import layered
+from uploader.app.crossmatch.batch import EvidenceBatch
 from uploader.app.crossmatch.models import (
     CrossmatchResult,
     RecordEvidence,
@@ -14,7 +15,12 @@ class Resolver(Protocol):
     @property
     def pgc_column(self) -> str | None: ...
 
+    @property
+    def name(self) -> str: ...
+
     def resolve(self, evidence: RecordEvidence) -> CrossmatchResult: ...
 
+    def resolve_batch(self, batch: EvidenceBatch) -> list[CrossmatchResult]: ...
+
 
 LayeredResolver = layered.LayeredResolver
@@ -0,0 +1,202 @@
+import dataclasses
+from collections.abc import Callable
+
+import numpy as np
+import numpy.typing as npt
+from psycopg import sql
+
+import uploader.app.report as report
+from uploader.app import log
+from uploader.app.display import format_table
+from uploader.app.storage import PgStorage
+
+POSITIONS_QUERY = sql.SQL("""
+    SELECT rec.id, nc.ra, nc.dec
+    FROM layer0.records rec
+    JOIN icrs.data nc ON nc.record_id = rec.id
+    WHERE rec.table_id = %s
+""")
+
+
+def _unit_vectors(ra: npt.NDArray[np.float64], dec: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    ra_rad = np.radians(ra)
+    dec_rad = np.radians(dec)
+    cos_dec = np.cos(dec_rad)
+    return np.column_stack((cos_dec * np.cos(ra_rad), cos_dec * np.sin(ra_rad), np.sin(dec_rad)))
+
+
+# smallest grid cell on the unit sphere, about 0.2 arcsec; keeps the cell keys of the whole sphere within int64
+MIN_CELL_SIDE = 1e-6
+
+# offsets to the neighbouring grid cells that come after a cell, so every pair of cells is visited once
+_FORWARD_OFFSETS = [
+    (dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1) if (dx, dy, dz) > (0, 0, 0)
+]
+
+
+def _cell_pairs(
+    starts: npt.NDArray[np.int64],
+    counts: npt.NDArray[np.int64],
+    a: npt.NDArray[np.int64],
+    b: npt.NDArray[np.int64],
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """Every combination of a point of cell `a[k]` with a point of cell `b[k]`, as sorted positions."""
+    sizes = counts[a] * counts[b]
+    total = int(sizes.sum())
+    k = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    width = np.repeat(counts[b], sizes)
+    return np.repeat(starts[a], sizes) + k // width, np.repeat(starts[b], sizes) + k % width
+
+
+def find_pairs(
+    ra: npt.NDArray[np.float64],
+    dec: npt.NDArray[np.float64],
+    radius_deg: float,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+    """
+    Finds all pairs of positions closer than `radius_deg` to each other.
+    Unit vectors of the positions are put in a grid of cubes at least as wide as the chord of the radius
+    and each position is compared only with the positions of its own and the neighbouring cubes, so
+    the cost is a sort plus the number of positions near each other, wherever they are on the sky.
+    Returns the indices of both positions (first < second) and their great-circle distance in degrees.
+    """
+    if len(ra) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float64)
+    vectors = _unit_vectors(ra, dec)
+    max_chord_sq = (2 * np.sin(np.radians(radius_deg) / 2)) ** 2
+    side = max(float(np.sqrt(max_chord_sq)), MIN_CELL_SIDE)
+
+    cells = np.floor(vectors / side).astype(np.int64)
+    lo = cells.min(axis=0) - 1
+    dims = cells.max(axis=0) - lo + 2
+    keys = ((cells[:, 0] - lo[0]) * dims[1] + (cells[:, 1] - lo[1])) * dims[2] + (cells[:, 2] - lo[2])
+    order = np.argsort(keys, kind="stable")
+    cell_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    vectors = vectors[order]
+    all_cells = np.arange(len(cell_keys), dtype=np.int64)
+
+    first: list[npt.NDArray[np.int64]] = []
+    second: list[npt.NDArray[np.int64]] = []
+    chord_sq: list[npt.NDArray[np.float64]] = []
+    for offset in [(0, 0, 0), *_FORWARD_OFFSETS]:
+        dx, dy, dz = offset
+        neighbor_keys = cell_keys + (dx * dims[1] + dy) * dims[2] + dz
+        pos = np.minimum(np.searchsorted(cell_keys, neighbor_keys), len(cell_keys) - 1)
+        found = cell_keys[pos] == neighbor_keys
+        i, j = _cell_pairs(starts, counts, all_cells[found], pos[found])
+        if offset == (0, 0, 0):
+            i, j = i[i < j], j[i < j]
+        d = np.sum((vectors[i] - vectors[j]) ** 2, axis=1)
+        close = d <= max_chord_sq
+        first.append(i[close])
+        second.append(j[close])
+        chord_sq.append(d[close])
+
+    a = order[np.concatenate(first)]
+    b = order[np.concatenate(second)]
+    distance = np.degrees(2 * np.arcsin(np.sqrt(np.concatenate(chord_sq)) / 2))
+    return np.minimum(a, b), np.maximum(a, b), distance
+
+
+def connected_groups(size: int, first: npt.NDArray[np.int64], second: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+    """
+    Labels every index with the smallest index connected to it through the pairs.
+    """
+    labels = np.arange(size, dtype=np.int64)
+    while True:
+        smallest = np.minimum(labels[first], labels[second])
+        previous = labels.copy()
+        np.minimum.at(labels, first, smallest)
+        np.minimum.at(labels, second, smallest)
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+@dataclasses.dataclass
+class SelfMatch:
+    """
+    Pairs of records of one table that lie within `radius_deg` of each other.
+    """
+
+    radius_deg: float
+    record_ids: list[str]
+    first: npt.NDArray[np.int64]
+    second: npt.NDArray[np.int64]
+    distance_deg: npt.NDArray[np.float64]
+
+    def groups(self) -> list[list[str]]:
+        """Records connected by pairs, largest groups first."""
+        if len(self.first) == 0:
+            return []
+        labels = connected_groups(len(self.record_ids), self.first, self.second)
+        members = np.unique(np.concatenate((self.first, self.second)))
+        order = members[np.argsort(labels[members], kind="stable")]
+        _, starts = np.unique(labels[order], return_index=True)
+        groups = [[self.record_ids[i] for i in group] for group in np.split(order, starts[1:])]
+        groups.sort(key=lambda g: (-len(g), g[0]))
+        return groups
+
+    def nearest_duplicate_deg(self) -> dict[str, float]:
+        """Distance from every record that has a duplicate to its closest one."""
+        nearest = np.full(len(self.record_ids), np.inf)
+        np.minimum.at(nearest, self.first, self.distance_deg)
+        np.minimum.at(nearest, self.second, self.distance_deg)
+        indices = np.flatnonzero(np.isfinite(nearest))
+        return dict(zip([self.record_ids[i] for i in indices], nearest[indices].tolist(), strict=True))
+
+
+def find_self_matches(storage: PgStorage, table_id: str, radius_deg: float) -> SelfMatch:
+    record_ids: list[str] = []
+    ra: list[float] = []
+    dec: list[float] = []
+    for record_id, record_ra, record_dec in storage.stream(POSITIONS_QUERY, (table_id,)):
+        if record_ra is None or record_dec is None:
+            continue
+        record_ids.append(record_id)
+        ra.append(record_ra)
+        dec.append(record_dec)
+    first, second, distance = find_pairs(np.array(ra, dtype=np.float64), np.array(dec, dtype=np.float64), radius_deg)
+    return SelfMatch(radius_deg=radius_deg, record_ids=record_ids, first=first, second=second, distance_deg=distance)
+
+
+def report_self_matches(
+    matches: SelfMatch,
+    table_name: str,
+    report_func: Callable[[report.Event], None],
+    *,
+    max_groups: int = 20,
+) -> None:
+    groups = matches.groups()
+    in_groups = sum(len(g) for g in groups)
+    log.logger.info(
+        "self-match",
+        table_name=table_name,
+        records=len(matches.record_ids),
+        pairs=len(matches.first),
+        groups=len(groups),
+    )
+    summary = format_table(
+        ("Step", "Count"),
+        [
+            ("Records with positions", len(matches.record_ids)),
+            ("Pairs within radius", len(matches.first)),
+            ("Duplicate groups", len(groups)),
+            ("Records in groups", in_groups),
+            ("Largest group", len(groups[0]) if groups else 0),
+        ],
+        title=f"Self-match of {table_name} within {matches.radius_deg * 3600:g} arcsec",
+        right_align_last_n=1,
+        percent_last_column=False,
+    )
+    if groups:
+        listed = format_table(
+            ("Size", "Records"),
+            [(len(g), ", ".join(g)) for g in groups[:max_groups]],
+            title=f"Largest duplicate groups (showing {min(len(groups), max_groups)} of {len(groups)})",
+            right_align_last_n=0,
+            percent_last_column=False,
+        )
+        summary += f"\n\n{listed}"
+    report_func(report.DoneEvent(message=summary))
@@ -0,0 +1,130 @@
+import dataclasses
+import gzip
+import hashlib
+import json
+import math
+import pathlib
+from collections.abc import Iterable
+
+from psycopg import sql
+
+from uploader.app.crossmatch.models import RecordEvidence
+from uploader.app.storage import PgStorage
+
+STATE_FORMAT_VERSION = 1
+
+CELL_DEG = 0.25
+CELL_STRIDE = 100_000
+
+CELL_DIGEST_QUERY = sql.SQL("""
+    SELECT
+        c.cell,
+        md5(string_agg(c.pgc::text || ':' || c.ra::text || ':' || c.dec::text, ',' ORDER BY c.pgc)) AS digest
+    FROM (
+        SELECT pgc, ra, dec, FLOOR(dec / %s)::bigint * %s + FLOOR(ra / %s)::bigint AS cell
+        FROM layer2.icrs
+    ) c
+    WHERE c.cell = ANY(%s)
+    GROUP BY c.cell
+""")
+
+
+@dataclasses.dataclass
+class RecordState:
+    input_digest: int
+    fingerprint: int
+
+
+@dataclasses.dataclass
+class CrossmatchState:
+    table_name: str
+    resolver_name: str
+    radius_deg: float
+    cells: dict[int, str] = dataclasses.field(default_factory=dict)
+    records: dict[str, RecordState] = dataclasses.field(default_factory=dict)
+
+
+def _digest(value: object) -> int:
+    return int.from_bytes(hashlib.blake2b(repr(value).encode(), digest_size=8).digest(), "big")
+
+
+def record_input_digest(
+    ra: float | None,
+    dec: float | None,
+    design: str | None,
+    redshift: float | None,
+    type_name: str | None,
+    design_pgcs: Iterable[int],
+    claimed_pgc: int | None,
+    claimed_pgc_exists: bool,
+) -> int:
+    return _digest((ra, dec, design, redshift, type_name, sorted(set(design_pgcs)), claimed_pgc, claimed_pgc_exists))
+
+
+def evidence_fingerprint(evidence: RecordEvidence) -> int:
+    return _digest(
+        (
+            sorted(evidence.neighbors.pgc.tolist()),
+            sorted(set(evidence.same_name_pgcs or [])),
+        )
+    )
+
+
+def cell_key(ra: float, dec: float) -> int:
+    return math.floor(dec / CELL_DEG) * CELL_STRIDE + math.floor(ra / CELL_DEG)
+
+
+def cells_for_position(ra: float, dec: float, radius_deg: float) -> set[int]:
+    """
+    Every cell overlapping the box the crossmatch searches around the position. Near the poles the box
+    can span several cells in RA.
+    """
+    ra_radius = radius_deg / max(math.cos(math.radians(dec)), 0.01)
+    dec_cells = range(math.floor((dec - radius_deg) / CELL_DEG), math.floor((dec + radius_deg) / CELL_DEG) + 1)
+    ra_cells = range(math.floor((ra - ra_radius) / CELL_DEG), math.floor((ra + ra_radius) / CELL_DEG) + 1)
+    return {d * CELL_STRIDE + r for d in dec_cells for r in ra_cells}
+
+
+def fetch_cell_digests(storage: PgStorage, cells: Iterable[int]) -> dict[int, str]:
+    keys = list(cells)
+    if not keys:
+        return {}
+    digests = dict.fromkeys(keys, "")
+    for row in storage.query(CELL_DIGEST_QUERY, (CELL_DEG, CELL_STRIDE, CELL_DEG, keys)):
+        digests[int(row["cell"])] = row["digest"]
+    return digests
+
+
+def load_state(path: pathlib.Path) -> CrossmatchState | None:
+    if not path.exists():
+        return None
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != STATE_FORMAT_VERSION:
+        return None
+    return CrossmatchState(
+        table_name=data["table_name"],
+        resolver_name=data["resolver_name"],
+        radius_deg=data["radius_deg"],
+        cells={int(k): v for k, v in data["cells"].items()},
+        records={k: RecordState(input_digest=v[0], fingerprint=v[1]) for k, v in data["records"].items()},
+    )
+
+
+def save_state(path: pathlib.Path, state: CrossmatchState) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(
+            {
+                "version": STATE_FORMAT_VERSION,
+                "table_name": state.table_name,
+                "resolver_name": state.resolver_name,
+                "radius_deg": state.radius_deg,
+                "cells": {str(k): v for k, v in state.cells.items()},
+                "records": {k: [v.input_digest, v.fingerprint] for k, v in state.records.items()},
+            },
+            f,
+            separators=(",", ":"),
+        )
+    tmp_path.replace(path)
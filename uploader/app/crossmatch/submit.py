@@ -1,9 +1,17 @@
+import collections
+import dataclasses
+import json
+import pathlib
+import time
 from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
 from psycopg import sql
 
 import uploader.app.action_description as action_description
 import uploader.app.report as report
+from uploader.app import log
+from uploader.app.lib.batching import AdaptiveBatchSizer
 from uploader.app.storage import PgStorage
 from uploader.app.upload import handle_call
 from uploader.clients.gen.client import adminapi
@@ -28,12 +36,68 @@ ELIGIBLE_COUNT_QUERY = """
     FROM layer0.records r
     JOIN layer0.crossmatch c ON c.record_id = r.id
     WHERE r.table_id = %s
+      AND r.id > %s
       AND r.pgc IS NULL
       AND c.triage_status = 'resolved'
       AND NOT (c.metadata::jsonb ? 'possible_matches')
 """
 
 
+def load_progress(path: pathlib.Path, table_name: str) -> str:
+    """Last acknowledged record id of an earlier submission of `table_name`, empty if there is none."""
+    if not path.exists():
+        return ""
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if data.get("table_name") != table_name:
+        return ""
+    return data["last_id"]
+
+
+def save_progress(path: pathlib.Path, table_name: str, last_id: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps({"table_name": table_name, "last_id": last_id}), encoding="utf-8")
+    tmp_path.replace(path)
+
+
+@dataclasses.dataclass
+class SubmitBatch:
+    last_id: str
+    acknowledged: bool = False
+
+
+class Watermark:
+    """
+    Tracks batches that may be acknowledged out of order; `last_id` is the last record id
+    of the longest prefix of batches that are all acknowledged.
+    """
+
+    def __init__(self, last_id: str) -> None:
+        self.last_id = last_id
+        self._batches: collections.deque[SubmitBatch] = collections.deque()
+
+    def add(self, last_id: str) -> SubmitBatch:
+        batch = SubmitBatch(last_id)
+        self._batches.append(batch)
+        return batch
+
+    def acknowledge(self, batch: SubmitBatch) -> bool:
+        """Marks the batch as acknowledged and returns whether `last_id` moved."""
+        batch.acknowledged = True
+        moved = False
+        while self._batches and self._batches[0].acknowledged:
+            self.last_id = self._batches.popleft().last_id
+            moved = True
+        return moved
+
+
+def _assign(client: adminapi.AuthenticatedClient, body: AssignRecordPgcsRequest, write: bool) -> float:
+    started = time.monotonic()
+    if write:
+        handle_call(assign_record_pgcs.sync_detailed(client=client, body=body))
+    return time.monotonic() - started
+
+
 def run_submit_crossmatch(
     storage: PgStorage,
     table_name: str,
@@ -42,6 +106,9 @@ def run_submit_crossmatch(
     report_func: Callable[[report.Event], None],
     *,
     write: bool = False,
+    concurrency: int = 1,
+    progress_path: pathlib.Path | None = None,
+    batch_sizer: AdaptiveBatchSizer | None = None,
 ) -> None:
     table_rows = storage.query(
         "SELECT id FROM layer0.tables WHERE table_name = %s",
@@ -51,38 +118,69 @@ def run_submit_crossmatch(
         raise RuntimeError(f"Table not found: {table_name}")
     table_id = table_rows[0]["id"]
 
-    eligible_total = int(storage.query(ELIGIBLE_COUNT_QUERY, (table_id,))[0]["cnt"])
+    start_id = load_progress(progress_path, table_name) if progress_path is not None else ""
+    eligible_total = int(storage.query(ELIGIBLE_COUNT_QUERY, (table_id, start_id))[0]["cnt"])
+    resume_note = f", resuming after record {start_id}" if start_id else ""
     report_func(
         report.LogEvent(
-            message=f"Submitting crossmatch for {table_name}: {eligible_total} eligible records (write={write}).",
+            message=f"Submitting crossmatch for {table_name}: {eligible_total} eligible records "
+            f"(write={write}, concurrency={concurrency}{resume_note}).",
         )
     )
 
+    def fetch_page(last_id: str, size: int) -> list[str]:
+        return [r["id"] for r in storage.query(ELIGIBLE_QUERY, (table_id, last_id, size))]
+
     submitted = 0
-    last_id = ""
-    while True:
-        rows = storage.query(ELIGIBLE_QUERY, (table_id, last_id, batch_size))
-        if not rows:
-            break
-        record_ids = [r["id"] for r in rows]
-        last_id = record_ids[-1]
-        if write:
-            handle_call(
-                assign_record_pgcs.sync_detailed(
-                    client=client,
-                    body=action_description.apply(
-                        AssignRecordPgcsRequest(record_ids=record_ids),
-                    ),
+    watermark = Watermark(start_id)
+    in_flight: dict[Future[float], tuple[SubmitBatch, int]] = {}
+
+    def collect() -> None:
+        nonlocal submitted
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            batch, count = in_flight.pop(future)
+            seconds = future.result()
+            submitted += count
+            message = f"Batch submitted: {count} records in {seconds:.1f}s ({submitted}/{eligible_total})."
+            if batch_sizer is not None:
+                message += f" Next batch size: {batch_sizer.observe(count, 0, seconds)}."
+            if watermark.acknowledge(batch) and write and progress_path is not None:
+                save_progress(progress_path, table_name, watermark.last_id)
+            report_func(report.LogEvent(message=message))
+            progress = 100.0 if eligible_total == 0 else (100.0 * submitted / eligible_total)
+            report_func(report.ProgressEvent(percent=min(progress, 100.0)))
+
+    with ThreadPoolExecutor(max_workers=1) as fetcher, ThreadPoolExecutor(max_workers=concurrency) as senders:
+        last_id = start_id
+        next_page = fetcher.submit(fetch_page, last_id, batch_sizer.size if batch_sizer is not None else batch_size)
+        try:
+            while True:
+                record_ids = next_page.result()
+                if not record_ids:
+                    break
+                last_id = record_ids[-1]
+                next_page = fetcher.submit(
+                    fetch_page, last_id, batch_sizer.size if batch_sizer is not None else batch_size
                 )
+                body = action_description.apply(AssignRecordPgcsRequest(record_ids=record_ids))
+                while len(in_flight) >= concurrency:
+                    collect()
+                future = senders.submit(_assign, client, body, write)
+                in_flight[future] = (watermark.add(last_id), len(record_ids))
+            while in_flight:
+                collect()
+        except BaseException:
+            for future in in_flight:
+                future.cancel()
+            raise
+        finally:
+            log.logger.info(
+                "submit crossmatch stopped",
+                table_name=table_name,
+                submitted=submitted,
+                last_acknowledged_id=watermark.last_id,
             )
-        submitted += len(record_ids)
-        report_func(
-            report.LogEvent(
-                message=f"Batch submitted: {len(record_ids)} records ({submitted}/{eligible_total}).",
-            )
-        )
-        progress = 100.0 if eligible_total == 0 else (100.0 * submitted / eligible_total)
-        report_func(report.ProgressEvent(percent=min(progress, 100.0)))
 
     report_func(report.ProgressEvent(percent=100))
     report_func(
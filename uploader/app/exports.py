@@ -0,0 +1,25 @@
+import json
+import uuid
+from pathlib import Path
+
+import uploader.app.action_description as action_description
+
+EXPORTS_DIR = Path("exports")
+
+
+def export_path(prefix: str, suffix: str) -> Path:
+    """Path for a file produced by the current task run, named after its run id."""
+    description = action_description.current()
+    run_id = json.loads(description)["run_id"] if description is not None else str(uuid.uuid4())
+    return EXPORTS_DIR / f"{prefix}-{run_id}{suffix}"
+
+
+def export_url(path: Path) -> str:
+    return f"/api/exports/{path.name}"
+
+
+def resolve_export(name: str) -> Path | None:
+    path = EXPORTS_DIR / name
+    if not path.is_file() or not path.resolve().is_relative_to(EXPORTS_DIR.resolve()):
+        return None
+    return path
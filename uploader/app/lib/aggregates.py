@@ -0,0 +1,102 @@
+import dataclasses
+from collections.abc import Sequence
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+from psycopg import sql
+
+from uploader.app.storage import PgStorage
+
+
+def float_value(column: str) -> sql.Composed:
+    return sql.SQL("{}::float8").format(sql.Identifier(column))
+
+
+def not_null(columns: Sequence[str]) -> sql.Composable:
+    if not columns:
+        return sql.SQL("TRUE")
+    return sql.SQL(" AND ").join(sql.SQL("{} IS NOT NULL").format(sql.Identifier(col)) for col in columns)
+
+
+def histogram_bin(value: sql.Composable, edges: npt.NDArray[np.float64], where: sql.Composable) -> sql.Composed:
+    """
+    0-based bin of `value` among `edges` the way np.histogram assigns it: bins include their lower edge
+    and the last one also its upper edge. NULL for values outside of the edges, NaN and rows not matching `where`.
+    """
+    return sql.SQL(
+        "CASE WHEN {where} THEN CASE WHEN {v} = {last} THEN {last_bin} "
+        "WHEN {v} >= {first} AND {v} < {last} THEN width_bucket({v}, {edges}) - 1 END END"
+    ).format(
+        where=where,
+        v=value,
+        first=sql.Literal(float(edges[0])),
+        last=sql.Literal(float(edges[-1])),
+        last_bin=sql.Literal(len(edges) - 2),
+        edges=sql.Literal([float(e) for e in edges[:-1]]),
+    )
+
+
+@dataclasses.dataclass
+class Histogram:
+    """Counts of rows per bin; one `histogram_bin` expression per axis."""
+
+    bins: list[sql.Composable]
+    shape: tuple[int, ...]
+
+
+def table_aggregates(
+    storage: PgStorage,
+    table_name: str,
+    aggregates: dict[str, sql.Composable],
+    histograms: Sequence[Histogram],
+) -> tuple[dict[str, Any], list[npt.NDArray[np.int64]]]:
+    """
+    Computes `aggregates` over the whole table and the counts of `histograms` in one query, grouping
+    by one grouping set per histogram. No rows of the table are transferred.
+    """
+    select: list[sql.Composable] = [
+        sql.SQL("{} AS {}").format(expr, sql.Identifier(name)) for name, expr in aggregates.items()
+    ]
+    all_bins = [b for hist in histograms for b in hist.bins]
+    if all_bins:
+        select.append(sql.SQL("GROUPING({}) AS {}").format(sql.SQL(", ").join(all_bins), sql.Identifier("grouping")))
+    for k, hist in enumerate(histograms):
+        select.extend(
+            sql.SQL("{} AS {}").format(b, sql.Identifier(f"bin_{k}_{axis}")) for axis, b in enumerate(hist.bins)
+        )
+    select.append(sql.SQL("COUNT(*) AS bin_count"))
+    grouping_sets: list[sql.Composable] = [sql.SQL("()")]
+    grouping_sets.extend(sql.SQL("({})").format(sql.SQL(", ").join(hist.bins)) for hist in histograms)
+    query = sql.SQL("SELECT {select} FROM rawdata.{t} GROUP BY GROUPING SETS ({sets})").format(
+        select=sql.SQL(", ").join(select),
+        t=sql.Identifier(table_name),
+        sets=sql.SQL(", ").join(grouping_sets),
+    )
+    return _collect(storage.query(query, ()), aggregates, histograms)
+
+
+def _collect(
+    rows: list[dict[str, Any]],
+    aggregates: dict[str, sql.Composable],
+    histograms: Sequence[Histogram],
+) -> tuple[dict[str, Any], list[npt.NDArray[np.int64]]]:
+    # GROUPING() has one bit per bin expression, most significant first, set when the expression
+    # is not grouped by in the row's grouping set
+    all_bins = [b for hist in histograms for b in hist.bins]
+    masks = {
+        sum(1 << (len(all_bins) - 1 - i) for i, b in enumerate(all_bins) if b not in hist.bins): k
+        for k, hist in enumerate(histograms)
+    }
+    totals: dict[str, Any] = {}
+    counts = [np.zeros(hist.shape, dtype=np.int64) for hist in histograms]
+    for row in rows:
+        k = masks.get(row["grouping"]) if all_bins else None
+        if k is None:
+            totals = {name: row[name] for name in aggregates}
+            continue
+        index = tuple(row[f"bin_{k}_{axis}"] for axis in range(len(histograms[k].bins)))
+        if any(i is None for i in index):
+            continue
+        counts[k][index] += int(row["bin_count"])
+    return totals, counts
@@ -0,0 +1,48 @@
+import dataclasses
+
+
+@dataclasses.dataclass
+class AdaptiveBatchSizer:
+    """
+    Chooses the number of records for the next batch from what the previous batches cost.
+    Rows and seconds per record are smoothed over batches; the next size is the largest one expected
+    to stay within both `target_rows` and `target_seconds`, limited to `min_size`..`max_size`
+    and to growing by at most `max_growth` times per batch.
+    """
+
+    initial_size: int
+    min_size: int
+    max_size: int
+    target_rows: int | None = None
+    target_seconds: float | None = None
+    max_growth: float = 2.0
+    smoothing: float = 0.5
+    size: int = dataclasses.field(init=False)
+    _rows_per_record: float | None = dataclasses.field(init=False, default=None)
+    _seconds_per_record: float | None = dataclasses.field(init=False, default=None)
+
+    def __post_init__(self) -> None:
+        if self.min_size < 1 or self.min_size > self.max_size:
+            raise ValueError(f"Invalid batch size bounds: {self.min_size}..{self.max_size}")
+        if self.target_rows is None and self.target_seconds is None:
+            raise ValueError("Adaptive batch sizing needs a target number of rows or seconds")
+        self.size = min(max(self.initial_size, self.min_size), self.max_size)
+
+    def _smooth(self, previous: float | None, observed: float) -> float:
+        if previous is None:
+            return observed
+        return self.smoothing * observed + (1 - self.smoothing) * previous
+
+    def observe(self, records: int, rows: int, seconds: float) -> int:
+        if records <= 0:
+            return self.size
+        self._rows_per_record = self._smooth(self._rows_per_record, rows / records)
+        self._seconds_per_record = self._smooth(self._seconds_per_record, seconds / records)
+
+        limits: list[float] = [self.size * self.max_growth, self.max_size]
+        if self.target_rows is not None and self._rows_per_record > 0:
+            limits.append(self.target_rows / self._rows_per_record)
+        if self.target_seconds is not None and self._seconds_per_record > 0:
+            limits.append(self.target_seconds / self._seconds_per_record)
+        self.size = max(self.min_size, int(min(limits)))
+        return self.size
@@ -0,0 +1,27 @@
+from collections.abc import Sequence
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+
+def float_column(values: Sequence[Any]) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.bool_]]:
+    """
+    Column values converted to float, and the mask of non-NULL values.
+    NULL values are NaN; the mask tells them from NaN stored in the table.
+    """
+    floats = np.array(values, dtype=np.float64)
+    present = ~np.isnan(floats)
+    (nan,) = np.nonzero(~present)
+    if len(nan):
+        present[nan] = [values[i] is not None for i in nan.tolist()]
+    return floats, present
+
+
+def factorize(values: Sequence[Any]) -> tuple[list[Any], npt.NDArray[np.intp]]:
+    """
+    Distinct values in order of first appearance, and the index of every value among them.
+    """
+    index: dict[Any, int] = {}
+    codes = np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.intp, count=len(values))
+    return list(index), codes
@@ -110,6 +110,17 @@ class Expression:
     def evaluate(self, values: dict[str, float], units: dict[str, str]) -> u.Quantity:
         return _Evaluator(values, units).visit(self._tree.body)
 
+    @property
+    def column(self) -> str | None:
+        """Name of the column if the expression is nothing but a reference to one."""
+        match self._tree.body:
+            case ast.Name(id=name) if name not in NAMED_CONSTANTS:
+                return name
+            case ast.Call() as call:
+                return _column_from_call(call)
+            case _:
+                return None
+
 
 def parse(source: str) -> Expression:
     tree = ast.parse(source.strip(), mode="eval")
@@ -1,3 +1,4 @@
+import itertools
 from collections.abc import Iterator, Sequence
 from typing import Any
 
@@ -7,22 +8,73 @@ from uploader.app import log
 from uploader.app.storage import PgStorage
 
 
-def rawdata_batches(
-    storage: PgStorage,
-    table_name: str,
-    columns: Sequence[str],
-    batch_size: int,
-) -> Iterator[list[dict[str, Any]]]:
+def _batch_query(table_name: str, columns: Sequence[str]) -> sql.Composed:
     id_col = sql.Identifier("hyperleda_internal_id")
     select_cols: list[sql.Identifier] = [id_col]
     for col in columns:
         select_cols.append(sql.Identifier(col))
     table = sql.SQL("rawdata.") + sql.Identifier(table_name)
     select_list = sql.SQL(", ").join(select_cols)
-    query = sql.SQL("SELECT {cols} FROM {t} WHERE {id_col} > %s ORDER BY {id_col} ASC LIMIT %s").format(
+    return sql.SQL("SELECT {cols} FROM {t} WHERE {id_col} > %s ORDER BY {id_col} ASC LIMIT %s").format(
         cols=select_list, t=table, id_col=id_col
     )
 
+
+def _sample_query(table_name: str, columns: Sequence[str], sample_percent: float, seed: int = 0) -> sql.Composed:
+    id_col = sql.Identifier("hyperleda_internal_id")
+    select_list = sql.SQL(", ").join([id_col, *(sql.Identifier(col) for col in columns)])
+    return sql.SQL(
+        "SELECT {cols} FROM rawdata.{t} TABLESAMPLE BERNOULLI ({pct}) REPEATABLE ({seed}) ORDER BY {id_col} ASC"
+    ).format(
+        cols=select_list,
+        t=sql.Identifier(table_name),
+        pct=sql.Literal(sample_percent),
+        seed=sql.Literal(seed),
+        id_col=id_col,
+    )
+
+
+def _sampled_batches(
+    storage: PgStorage,
+    table_name: str,
+    columns: Sequence[str],
+    batch_size: int,
+    sample_percent: float,
+    seed: int,
+) -> Iterator[tuple[tuple[Any, ...], ...]]:
+    # a sample scan cannot use the id index, so the sample is read with one query through a server-side
+    # cursor instead of one keyset query per batch
+    total = 0
+    for rows in itertools.batched(
+        storage.stream(_sample_query(table_name, columns, sample_percent, seed), chunk_size=batch_size),
+        batch_size,
+        strict=False,
+    ):
+        total += len(rows)
+        log.logger.debug("read sampled batch", rows=len(rows), last_id=rows[-1][0], total=total)
+        yield rows
+
+
+def rawdata_batches(
+    storage: PgStorage,
+    table_name: str,
+    columns: Sequence[str],
+    batch_size: int,
+    *,
+    sample_percent: float | None = None,
+    seed: int = 0,
+) -> Iterator[list[dict[str, Any]]]:
+    """
+    Rows of the table in batches of `batch_size` ordered by id. With `sample_percent`, only a Bernoulli sample
+    of that percent of the rows is read, the same one for the same `seed`.
+    """
+    if sample_percent is not None:
+        names = ["hyperleda_internal_id", *columns]
+        for sampled in _sampled_batches(storage, table_name, columns, batch_size, sample_percent, seed):
+            yield [dict(zip(names, row, strict=True)) for row in sampled]
+        return
+    query = _batch_query(table_name, columns)
+
     last_id = ""
     total = 0
     while True:
@@ -38,3 +90,40 @@ def rawdata_batches(
         )
         yield rows
         last_id = rows[-1]["hyperleda_internal_id"]
+
+
+def rawdata_column_batches(
+    storage: PgStorage,
+    table_name: str,
+    columns: Sequence[str],
+    batch_size: int,
+    *,
+    sample_percent: float | None = None,
+    seed: int = 0,
+) -> Iterator[dict[str, tuple[Any, ...]]]:
+    """
+    Same batches as `rawdata_batches`, with each batch given as one tuple of values per column.
+    """
+    if sample_percent is not None:
+        names = ["hyperleda_internal_id", *columns]
+        for sampled in _sampled_batches(storage, table_name, columns, batch_size, sample_percent, seed):
+            yield dict(zip(names, zip(*sampled, strict=True), strict=True))
+        return
+    query = _batch_query(table_name, columns)
+
+    last_id = ""
+    total = 0
+    while True:
+        batch = storage.query_columns(query, (last_id, batch_size))
+        ids = batch["hyperleda_internal_id"]
+        if not ids:
+            break
+        total += len(ids)
+        log.logger.debug(
+            "read batch",
+            rows=len(ids),
+            last_id=ids[-1],
+            total=total,
+        )
+        yield batch
+        last_id = ids[-1]
@@ -1,30 +1,72 @@
-from collections.abc import Sequence
+import itertools
+from collections.abc import Iterator, Sequence
 from typing import Any, LiteralString, cast
 
 from psycopg import sql
 from psycopg.connection import Connection
-from psycopg.rows import dict_row
+from psycopg.rows import dict_row, tuple_row
 
 from uploader.app import log
 
+_cursor_ids = itertools.count()
+
 
 class PgStorage:
     def __init__(self, conn: Connection) -> None:
         self._conn = conn
 
+    def _prepare(self, query: str | sql.Composed | sql.SQL) -> sql.SQL | sql.Composed:
+        query_str = query if isinstance(query, str) else query.as_string(self._conn)
+        log.logger.debug("Started query", query=query_str)
+        if isinstance(query, str):
+            return sql.SQL(cast(LiteralString, query))
+        return query
+
     def query(
         self,
         query: str | sql.Composed | sql.SQL,
         params: Sequence[Any] | None = None,
     ) -> list[dict[str, Any]]:
-        query_str = query if isinstance(query, str) else query.as_string(self._conn)
-        log.logger.debug("Started query", query=query_str)
-        if isinstance(query, str):
-            query_exec: sql.SQL | sql.Composed = sql.SQL(cast(LiteralString, query))
-        else:
-            query_exec = query
+        query_exec = self._prepare(query)
         with self._conn.cursor(row_factory=dict_row) as cur:
             cur.execute(query_exec, params)
             rows = list(cur.fetchall())
         log.logger.debug("Finished query", rows=len(rows))
         return rows
+
+    def query_columns(
+        self,
+        query: str | sql.Composed | sql.SQL,
+        params: Sequence[Any] | None = None,
+    ) -> dict[str, tuple[Any, ...]]:
+        """
+        Returns the result as one tuple of values per column, keyed by column name.
+        """
+        query_exec = self._prepare(query)
+        with self._conn.cursor(row_factory=tuple_row) as cur:
+            cur.execute(query_exec, params)
+            rows = cur.fetchall()
+            names = [c.name for c in cur.description or []]
+        log.logger.debug("Finished query", rows=len(rows))
+        columns = list(zip(*rows, strict=True)) if rows else [() for _ in names]
+        return dict(zip(names, columns, strict=True))
+
+    def stream(
+        self,
+        query: str | sql.Composed | sql.SQL,
+        params: Sequence[Any] | None = None,
+        *,
+        chunk_size: int = 10000,
+    ) -> Iterator[tuple[Any, ...]]:
+        """
+        Yields result rows as tuples through a server-side cursor, holding at most `chunk_size` rows at a time.
+        """
+        query_exec = self._prepare(query)
+        rows = 0
+        with self._conn.cursor(name=f"uploader_stream_{next(_cursor_ids)}", row_factory=tuple_row) as cur:
+            cur.itersize = chunk_size
+            cur.execute(query_exec, params)
+            for row in cur:
+                rows += 1
+                yield row
+        log.logger.debug("Finished query", rows=rows)
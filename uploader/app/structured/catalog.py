@@ -0,0 +1,56 @@
+import dataclasses
+from collections.abc import Sequence
+from typing import Any, Protocol
+
+import uploader.app.action_description as action_description
+from uploader.app.upload import handle_call
+from uploader.clients.gen.client import adminapi
+from uploader.clients.gen.client.adminapi.api.default import save_structured_data
+from uploader.clients.gen.client.adminapi.models.save_structured_data_request import (
+    SaveStructuredDataRequest,
+)
+from uploader.clients.gen.client.adminapi.models.save_structured_data_request_units import (
+    SaveStructuredDataRequestUnits,
+)
+from uploader.clients.gen.client.adminapi.types import UNSET
+
+type ColumnBatch = dict[str, Sequence[Any]]
+
+
+@dataclasses.dataclass
+class CatalogBatch:
+    ids: list[str]
+    data: list[list[Any]]
+
+
+class CatalogTransformer(Protocol):
+    """
+    Turns rawdata column batches into rows of one structured catalog and keeps the counts for its report.
+    """
+
+    catalog: str
+    columns: list[str]
+    units: SaveStructuredDataRequestUnits | None
+    raw_columns: list[str]
+    uploaded: int
+    skipped: int
+
+    def transform(self, batch: ColumnBatch) -> CatalogBatch: ...
+
+    def details(self) -> str: ...
+
+
+def catalog_request(transformer: CatalogTransformer, batch: CatalogBatch) -> SaveStructuredDataRequest:
+    return action_description.apply(
+        SaveStructuredDataRequest(
+            catalog=transformer.catalog,
+            columns=transformer.columns,
+            ids=batch.ids,
+            data=batch.data,
+            units=transformer.units if transformer.units is not None else UNSET,
+        ),
+    )
+
+
+def save_catalog(client: adminapi.AuthenticatedClient, body: SaveStructuredDataRequest) -> None:
+    handle_call(save_structured_data.sync_detailed(client=client, body=body))
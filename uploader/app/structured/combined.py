@@ -0,0 +1,121 @@
+from collections.abc import Callable, Sequence
+
+from psycopg import sql
+
+import uploader.app.report as report
+from uploader.app import log
+from uploader.app.display import format_table
+from uploader.app.lib.rawdata import rawdata_column_batches
+from uploader.app.storage import PgStorage
+from uploader.app.structured.catalog import CatalogTransformer, catalog_request
+from uploader.app.structured.diff import CATALOG_TABLES, CatalogDiff
+from uploader.app.structured.sample import DrySample
+from uploader.app.structured.writer import DEFAULT_MAX_IN_FLIGHT, StructuredWriter
+from uploader.clients.gen.client import adminapi
+
+
+def upload_structured(
+    storage: PgStorage,
+    table_name: str,
+    transformers: Sequence[CatalogTransformer],
+    batch_size: int,
+    client: adminapi.AuthenticatedClient,
+    *,
+    write: bool = False,
+    sample_percent: float = 0.0,
+    sample_rows: int = 0,
+    diff_tolerance: float | None = None,
+    report_func: Callable[[report.Event], None],
+) -> int:
+    """
+    Uploads several structured catalogs from one scan of the rawdata table. Every batch is read once with
+    the columns all catalogs need, handed to each transformer, and the save calls of all catalogs are sent
+    concurrently while the next batch is read. With `diff_tolerance`, rows of the catalogs that support it
+    are sent only if they differ from the stored values.
+    """
+    if not transformers:
+        raise ValueError("No catalogs selected")
+    raw_columns = sorted({col for t in transformers for col in t.raw_columns})
+    cnt = storage.query(
+        sql.SQL("SELECT COUNT(*) AS cnt FROM rawdata.{}").format(sql.Identifier(table_name)),
+        (),
+    )
+    total_count = int(cnt[0]["cnt"]) if cnt else 0
+    sample = DrySample.resolve(total_count, sample_percent, sample_rows, write=write)
+    scan_rows = total_count if sample is None else sample.expected_rows
+    catalogs = ", ".join(t.catalog for t in transformers)
+    report_func(
+        report.LogEvent(
+            message=f"Uploading {catalogs} for {table_name} ({total_count} rows, {len(raw_columns)} columns).",
+        )
+    )
+
+    diffs: dict[str, CatalogDiff] = {}
+    if diff_tolerance is not None:
+        diffs = {
+            t.catalog: CatalogDiff.for_transformer(storage, t, diff_tolerance)
+            for t in transformers
+            if t.catalog in CATALOG_TABLES
+        }
+
+    processed_rows = 0
+    with StructuredWriter(client, max(DEFAULT_MAX_IN_FLIGHT, len(transformers))) as writer:
+        for batch in rawdata_column_batches(
+            storage,
+            table_name,
+            raw_columns,
+            batch_size,
+            sample_percent=None if sample is None else sample.percent,
+        ):
+            for t in transformers:
+                output = t.transform(batch)
+                if t.catalog in diffs:
+                    output = diffs[t.catalog].filter(output)
+                if write and output.ids:
+                    writer.submit(catalog_request(t, output))
+
+            rows_read = len(batch["hyperleda_internal_id"])
+            processed_rows += rows_read
+            if sample is not None:
+                sample.add(rows_read)
+            log.logger.info(
+                "processed batch",
+                rows=rows_read,
+                total=processed_rows,
+                pending_writes=writer.pending,
+                **{t.catalog: t.uploaded for t in transformers},
+            )
+            row_pct = int(100 * processed_rows / scan_rows) if scan_rows else 0
+            report_func(report.ProgressEvent(percent=min(99, row_pct)))
+            report_func(
+                report.LogEvent(
+                    message=f"batch: rows_read={rows_read} "
+                    + " ".join(f"{t.catalog}={t.uploaded}" for t in transformers)
+                    + f" pending_writes={writer.pending}",
+                ),
+            )
+
+    report_func(report.ProgressEvent(percent=100))
+    summary = format_table(
+        ("Catalog", "Uploaded", "Skipped", "Details"),
+        [(t.catalog, t.uploaded, t.skipped, t.details()) for t in transformers],
+        title=f"Total source rows: {processed_rows} (write={write})\n",
+        right_align_last_n=0,
+        percent_last_column=False,
+    )
+    if sample is not None:
+        estimated: list[tuple[str, int]] = []
+        for t in transformers:
+            estimated.append((f"{t.catalog}: rows with data", processed_rows - t.skipped))
+            estimated.append((f"{t.catalog}: skipped", t.skipped))
+        summary += "\n\n" + sample.summary(estimated)
+    if diffs:
+        summary += "\n\n" + format_table(
+            ("Catalog", "Unchanged (not sent)", "Changed", "New"),
+            [(catalog, d.unchanged, d.changed, d.new) for catalog, d in diffs.items()],
+            title=f"Compared with stored values (tolerance {diff_tolerance:g})\n",
+            right_align_last_n=3,
+            percent_last_column=False,
+        )
+    report_func(report.DoneEvent(message=summary))
+    return processed_rows
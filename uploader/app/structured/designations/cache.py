@@ -0,0 +1,163 @@
+import collections
+import itertools
+import multiprocessing
+import pathlib
+import sqlite3
+from collections.abc import Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Self
+
+from uploader.app.structured.designations.profile import RuleProfile
+from uploader.app.structured.designations.rules import RULES, match, rules_fingerprint
+
+type Normalized = tuple[str, str] | None
+
+SQLITE_CHUNK = 500
+MATCH_CHUNK = 2000
+
+
+def match_names(names: list[str]) -> list[Normalized]:
+    return [match(name) for name in names]
+
+
+class DiskCache:
+    """
+    Normalized names stored in a SQLite file. Entries are keyed by the raw name and the fingerprint
+    of the rules that produced them, so changing any rule makes the old entries unreachable.
+    """
+
+    def __init__(self, path: pathlib.Path, fingerprint: str) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.fingerprint = fingerprint
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS names ("
+            "fingerprint TEXT NOT NULL, raw TEXT NOT NULL, design TEXT, rule TEXT, "
+            "PRIMARY KEY (fingerprint, raw))"
+        )
+        self._conn.execute("DELETE FROM names WHERE fingerprint <> ?", (fingerprint,))
+        self._conn.commit()
+
+    def get_many(self, names: list[str]) -> dict[str, Normalized]:
+        found: dict[str, Normalized] = {}
+        for start in range(0, len(names), SQLITE_CHUNK):
+            chunk = names[start : start + SQLITE_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT raw, design, rule FROM names WHERE fingerprint = ? AND raw IN ({placeholders})",
+                (self.fingerprint, *chunk),
+            )
+            for raw, design, rule in rows:
+                found[raw] = (design, rule) if rule is not None else None
+        return found
+
+    def put_many(self, items: Iterable[tuple[str, Normalized]]) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO names (fingerprint, raw, design, rule) VALUES (?, ?, ?, ?)",
+            ((self.fingerprint, raw, *(result if result is not None else (None, None))) for raw, result in items),
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class NameNormalizer:
+    """
+    Normalizes names with `match`, computing every distinct name once: names are deduplicated within
+    a batch, recent results are kept in an LRU of `max_size` entries and, if `disk` is given,
+    all results are also kept on disk for later runs. With an `executor`, names that are not cached
+    are matched in chunks of `chunk_size` on its workers; results keep the order of the names.
+    With a `profile`, names are matched through it in this process instead.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 100_000,
+        disk: DiskCache | None = None,
+        executor: Executor | None = None,
+        chunk_size: int = MATCH_CHUNK,
+        profile: RuleProfile | None = None,
+    ) -> None:
+        self.max_size = max_size
+        self.disk = disk
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.profile = profile
+        self.hits = 0
+        self.disk_hits = 0
+        self.computed = 0
+        self._lru: collections.OrderedDict[str, Normalized] = collections.OrderedDict()
+
+    def _remember(self, name: str, result: Normalized) -> None:
+        if self.max_size <= 0:
+            return
+        self._lru[name] = result
+        if len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    def normalize(self, names: Iterable[str]) -> dict[str, Normalized]:
+        """Results for every distinct name of `names`."""
+        results: dict[str, Normalized] = {}
+        missing: list[str] = []
+        for name in dict.fromkeys(names):
+            if name in self._lru:
+                self._lru.move_to_end(name)
+                results[name] = self._lru[name]
+                self.hits += 1
+            else:
+                missing.append(name)
+
+        if missing and self.disk is not None:
+            stored = self.disk.get_many(missing)
+            self.disk_hits += len(stored)
+            for name, result in stored.items():
+                results[name] = result
+                self._remember(name, result)
+            missing = [name for name in missing if name not in stored]
+
+        if self.profile is not None:
+            matched = [self.profile.match(name) for name in missing]
+        elif self.executor is not None and len(missing) > self.chunk_size:
+            chunks = [missing[i : i + self.chunk_size] for i in range(0, len(missing), self.chunk_size)]
+            matched = itertools.chain.from_iterable(self.executor.map(match_names, chunks))
+        else:
+            matched = match_names(missing)
+        computed = list(zip(missing, matched, strict=True))
+        self.computed += len(computed)
+        for name, result in computed:
+            results[name] = result
+            self._remember(name, result)
+        if computed and self.disk is not None:
+            self.disk.put_many(computed)
+        return results
+
+    def close(self) -> None:
+        if self.disk is not None:
+            self.disk.close()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+
+def open_normalizer(
+    max_size: int,
+    cache_path: pathlib.Path | None = None,
+    workers: int = 1,
+    profile: RuleProfile | None = None,
+) -> NameNormalizer:
+    """With a `profile`, the LRU and the disk cache are not used so that every distinct name is profiled."""
+    if profile is not None:
+        return NameNormalizer(0, profile=profile)
+    disk = DiskCache(cache_path, rules_fingerprint(RULES)) if cache_path is not None else None
+    executor = (
+        ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        if workers > 1
+        else None
+    )
+    return NameNormalizer(max_size, disk, executor, profile=profile)
@@ -0,0 +1,62 @@
+import collections
+import dataclasses
+import time
+
+from uploader.app.structured.designations.rules import NameRule
+
+
+@dataclasses.dataclass
+class RuleStats:
+    attempts: int = 0
+    hits: int = 0
+    seconds: float = 0.0
+    shadowed: int = 0
+    shadowed_by: collections.Counter[int] = dataclasses.field(default_factory=collections.Counter)
+
+
+class RuleProfile:
+    """
+    Matches names against `rules` one by one, the way the rule list is defined, and records for every rule
+    how many names it was tried on, how many it won and how long its regex took before a winner was found.
+    Rules after the winner are still tried (outside of the timings) to count names they would have matched
+    if the earlier rule did not take them first.
+    """
+
+    def __init__(self, rules: list[NameRule]) -> None:
+        self.rules = rules
+        self.stats = [RuleStats() for _ in rules]
+        self.names = 0
+
+    def label(self, i: int) -> str:
+        return f"#{i + 1} {self.rules[i].name}"
+
+    def match(self, name: str) -> tuple[str, str] | None:
+        value = name.strip() if name else ""
+        if not value:
+            return None
+        self.names += 1
+        winner: int | None = None
+        result: tuple[str, str] | None = None
+        for i, rule in enumerate(self.rules):
+            stats = self.stats[i]
+            if winner is None:
+                started = time.perf_counter()
+                m = rule.pattern.match(value)
+                stats.seconds += time.perf_counter() - started
+                stats.attempts += 1
+                if m is not None:
+                    stats.hits += 1
+                    winner = i
+                    result = (rule.format(m), rule.name)
+            elif rule.pattern.match(value) is not None:
+                stats.shadowed += 1
+                stats.shadowed_by[winner] += 1
+        return result
+
+    def shadowed_rules(self) -> list[tuple[int, int]]:
+        """Rules that never won although their pattern matched, with the earlier rule that most often won instead."""
+        return [
+            (i, stats.shadowed_by.most_common(1)[0][0])
+            for i, stats in enumerate(self.stats)
+            if stats.hits == 0 and stats.shadowed > 0
+        ]
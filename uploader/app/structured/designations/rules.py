@@ -1,3 +1,4 @@
+import hashlib
 import re
 from collections.abc import Callable
 from dataclasses import dataclass
@@ -25,11 +26,41 @@ class NameRule:
         m = self.pattern.match(value.strip())
         if m is None:
             return None
+        return self.format(m)
+
+    def format(self, m: re.Match[str]) -> str:
         if self.replacer is not None:
             return self.replacer(m)
         return self.replacement.format(*m.groups())
 
 
+class RuleMatcher:
+    """
+    Finds the first rule of `rules` that matches a name with a single combined regex.
+    Every rule pattern becomes one named alternative, tried in the order of `rules`, so the
+    first rule that matches wins exactly as in a linear scan. The winning rule is then matched
+    on its own so that its replacer sees the group numbers of its own pattern.
+    """
+
+    def __init__(self, rules: list[NameRule]) -> None:
+        self.rules = rules
+        alternatives: list[str] = []
+        for i, rule in enumerate(rules):
+            flags = "i" if rule.pattern.flags & re.IGNORECASE else "-i"
+            alternatives.append(f"(?P<r{i}>(?{flags}:{rule.pattern.pattern}))")
+        self._pattern = re.compile("|".join(alternatives))
+
+    def match(self, value: str) -> tuple[str, str] | None:
+        m = self._pattern.match(value)
+        if m is None or m.lastgroup is None:
+            return None
+        rule = self.rules[int(m.lastgroup[1:])]
+        rule_match = rule.pattern.match(value)
+        if rule_match is None:
+            return None
+        return (rule.format(rule_match), rule.name)
+
+
 RULES: list[NameRule] = [
     # Most popular catalogs
     NameRule(
@@ -459,12 +490,24 @@ RULES: list[NameRule] = [
 ]
 
 
+def rules_fingerprint(rules: list[NameRule]) -> str:
+    """Hash of everything that determines how `rules` normalize a name."""
+    digest = hashlib.sha256()
+    for rule in rules:
+        parts = [rule.name, rule.pattern.pattern, str(rule.pattern.flags), rule.replacement]
+        if rule.replacer is not None:
+            code = rule.replacer.__code__
+            parts += [code.co_code.hex(), repr(code.co_consts), repr(code.co_names)]
+        digest.update("\x1f".join(parts).encode())
+        digest.update(b"\x1e")
+    return digest.hexdigest()[:16]
+
+
+_MATCHER = RuleMatcher(RULES)
+
+
 def match(name: str) -> tuple[str, str] | None:
     value = name.strip() if name else ""
     if not value:
         return None
-    for rule in RULES:
-        formatted = rule.match(value)
-        if formatted is not None:
-            return (formatted, rule.name)
-    return None
+    return _MATCHER.match(value)
@@ -1,21 +1,24 @@
+import pathlib
 from collections.abc import Callable
+from typing import Any
 
 import matplotlib.pyplot as plt
+import numpy as np
 from psycopg import sql
 
-import uploader.app.action_description as action_description
 import uploader.app.report as report
 from uploader.app import log
 from uploader.app.display import format_table
-from uploader.app.lib.rawdata import rawdata_batches
+from uploader.app.lib.rawdata import rawdata_column_batches
 from uploader.app.storage import PgStorage
-from uploader.app.structured.designations.rules import RULES, match
-from uploader.app.upload import handle_call
+from uploader.app.structured.catalog import CatalogBatch, ColumnBatch, catalog_request
+from uploader.app.structured.designations.cache import NameNormalizer, open_normalizer
+from uploader.app.structured.designations.profile import RuleProfile
+from uploader.app.structured.designations.rules import RULES
+from uploader.app.structured.diff import CatalogDiff
+from uploader.app.structured.sample import DrySample
+from uploader.app.structured.writer import StructuredWriter
 from uploader.clients.gen.client import adminapi
-from uploader.clients.gen.client.adminapi.api.default import save_structured_data
-from uploader.clients.gen.client.adminapi.models.save_structured_data_request import (
-    SaveStructuredDataRequest,
-)
 
 CHART_FIGSIZE = (8, 6)
 
@@ -41,6 +44,7 @@ def _emit_rule_distribution_image(
     unmatched: int,
     *,
     caption: str,
+    sample: DrySample | None = None,
 ) -> None:
     bars = _rule_distribution_bars(rule_counts, unmatched)
     if not bars:
@@ -48,9 +52,14 @@ def _emit_rule_distribution_image(
     labels = [name for name, _ in bars]
     counts = [count for _, count in bars]
     fig, ax = plt.subplots(figsize=CHART_FIGSIZE)
-    ax.barh(labels, counts)
+    if sample is None:
+        ax.barh(labels, counts)
+        ax.set_xlabel("Count")
+    else:
+        estimated, low, high = sample.estimate_counts(np.array(counts, dtype=np.int64))
+        ax.barh(labels, estimated, xerr=(estimated - low, high - estimated), ecolor="gray")
+        ax.set_xlabel(f"Estimated count ({sample.percent:.2f}% sample, 95% CI)")
     ax.invert_yaxis()
-    ax.set_xlabel("Count")
     ax.set_title("Designation rule distribution")
     report_func(report.image_event_from_figure(fig, caption=caption))
 
@@ -63,13 +72,16 @@ def _report_batch_progress(
     matched: int,
     unmatched: int,
     progress_pct: int,
+    pending_writes: int,
     rule_counts: dict[str, int],
+    sample: DrySample | None,
 ) -> None:
     report_func(report.ProgressEvent(percent=min(99, progress_pct)))
     report_func(
         report.LogEvent(
             message=(
-                f"batch: rows_read={rows_read} cumulative_names={total_so_far} matched={matched} unmatched={unmatched}"
+                f"batch: rows_read={rows_read} cumulative_names={total_so_far} matched={matched} unmatched={unmatched} "
+                f"pending_writes={pending_writes}"
             ),
         ),
     )
@@ -78,14 +90,74 @@ def _report_batch_progress(
         rule_counts,
         unmatched,
         caption=f"{total_so_far} names processed",
+        sample=sample,
     )
 
 
+def _emit_profile_image(report_func: Callable[[report.Event], None], profile: RuleProfile) -> None:
+    timed = sorted(range(len(profile.rules)), key=lambda i: -profile.stats[i].seconds)[:20]
+    if not timed:
+        return
+    fig, ax = plt.subplots(figsize=CHART_FIGSIZE)
+    ax.barh([profile.label(i) for i in timed], [profile.stats[i].seconds * 1000 for i in timed])
+    ax.invert_yaxis()
+    ax.set_xlabel("Regex time, ms")
+    ax.set_title("Designation rule cost")
+    fig.tight_layout()
+    report_func(report.image_event_from_figure(fig, caption=f"Rule cost over {profile.names} names"))
+
+
+def _rule_profile_summary(report_func: Callable[[report.Event], None], profile: RuleProfile) -> str:
+    """Emits the cost chart and returns the profile tables to be appended to the final summary."""
+    _emit_profile_image(report_func, profile)
+    total_seconds = sum(s.seconds for s in profile.stats)
+
+    def share(seconds: float) -> float:
+        return (100.0 * seconds / total_seconds) if total_seconds else 0.0
+
+    rows = [
+        (
+            profile.label(i),
+            stats.attempts,
+            stats.hits,
+            stats.shadowed,
+            f"{stats.seconds * 1000:.2f}",
+            f"{stats.seconds / stats.attempts * 1e6:.2f}" if stats.attempts else "-",
+            share(stats.seconds),
+        )
+        for i, stats in enumerate(profile.stats)
+    ]
+    summary = format_table(
+        ("Rule", "Attempts", "Hits", "Shadowed", "Time, ms", "Per try, us", "% time"),
+        rows,
+        title=f"Rule profile over {profile.names} names",
+        right_align_last_n=6,
+    )
+
+    never = [profile.label(i) for i, stats in enumerate(profile.stats) if stats.hits == 0 and stats.shadowed == 0]
+    shadowed = profile.shadowed_rules()
+    if shadowed:
+        listed = format_table(
+            ("Rule", "Taken first by"),
+            [(profile.label(i), profile.label(by)) for i, by in shadowed],
+            title="Rules that matched names only after an earlier rule already had",
+            right_align_last_n=0,
+            percent_last_column=False,
+        )
+        summary += f"\n\n{listed}"
+    if never:
+        summary += "\n\nRules that matched no names: " + ", ".join(never)
+    return summary
+
+
 def _report_rule_distribution(
     report_func: Callable[[report.Event], None],
     rule_counts: dict[str, int],
     unmatched: int,
     total: int,
+    profile: RuleProfile | None = None,
+    sample: DrySample | None = None,
+    diff: CatalogDiff | None = None,
 ) -> None:
     def pct(n: int) -> float:
         return (100.0 * n / total) if total else 0.0
@@ -104,6 +176,7 @@ def _report_rule_distribution(
         rule_counts,
         unmatched,
         caption=f"Final: {total} names",
+        sample=sample,
     )
 
     summary = format_table(
@@ -111,9 +184,72 @@ def _report_rule_distribution(
         table_rows,
         title=f"Total names: {total}\n",
     )
+    if sample is not None:
+        summary += "\n\n" + sample.summary([(name, count) for name, count, _ in table_rows])
+    if profile is not None:
+        summary += f"\n\n{_rule_profile_summary(report_func, profile)}"
+    if diff is not None:
+        summary += "\n\n" + diff.summary()
     report_func(report.DoneEvent(message=summary))
 
 
+class DesignationTransformer:
+    """
+    Normalizes the designation column. Empty names are skipped and counted as unmatched; names that
+    no rule matches are uploaded as they are.
+    """
+
+    catalog = "designation"
+    columns = ["design"]
+    units = None
+
+    def __init__(
+        self,
+        column_name: str,
+        normalizer: NameNormalizer,
+        on_unmatched: Callable[[str], None] | None = None,
+    ) -> None:
+        self.column_name = column_name
+        self.raw_columns = [column_name]
+        self.normalizer = normalizer
+        self.on_unmatched = on_unmatched
+        self.rule_counts: dict[str, int] = {r.name: 0 for r in RULES}
+        self.unmatched = 0
+        self.uploaded = 0
+        self.skipped = 0
+
+    def transform(self, batch: ColumnBatch) -> CatalogBatch:
+        batch_ids: list[str] = []
+        batch_names: list[list[Any]] = []
+
+        row_names: list[tuple[str, str]] = []
+        for internal_id, name_val in zip(batch["hyperleda_internal_id"], batch[self.column_name], strict=True):
+            if name_val is None or (isinstance(name_val, str) and not name_val.strip()):
+                self.unmatched += 1
+                self.skipped += 1
+                continue
+            row_names.append((internal_id, str(name_val).strip()))
+        normalized = self.normalizer.normalize(name for _, name in row_names)
+
+        for internal_id, name_str in row_names:
+            match_result = normalized[name_str]
+            if match_result is not None:
+                transformed, rule_name = match_result
+                self.rule_counts[rule_name] += 1
+            else:
+                self.unmatched += 1
+                transformed = name_str
+                if self.on_unmatched is not None:
+                    self.on_unmatched(name_str)
+            batch_ids.append(internal_id)
+            batch_names.append([transformed])
+        self.uploaded += len(batch_ids)
+        return CatalogBatch(ids=batch_ids, data=batch_names)
+
+    def details(self) -> str:
+        return f"{self.unmatched - self.skipped} names matched no rule"
+
+
 def upload_designations(
     storage: PgStorage,
     table_name: str,
@@ -123,83 +259,87 @@ def upload_designations(
     *,
     write: bool = False,
     print_unmatched: bool = False,
+    cache_size: int = 100_000,
+    cache_path: pathlib.Path | None = None,
+    workers: int = 1,
+    profile_rules: bool = False,
+    sample_percent: float = 0.0,
+    sample_rows: int = 0,
+    diff_tolerance: float | None = None,
     report_func: Callable[[report.Event], None],
 ) -> int:
-    rule_counts: dict[str, int] = {r.name: 0 for r in RULES}
-    unmatched = 0
     total_count = 0
     cnt = storage.query(
         sql.SQL("SELECT COUNT(*) AS cnt FROM rawdata.{}").format(sql.Identifier(table_name)),
         (),
     )
     total_count = int(cnt[0]["cnt"]) if cnt else 0
+    sample = DrySample.resolve(total_count, sample_percent, sample_rows, write=write)
+    scan_rows = total_count if sample is None else sample.expected_rows
 
     processed_rows = 0
+    profile = RuleProfile(RULES) if profile_rules else None
+    with open_normalizer(cache_size, cache_path, workers, profile) as normalizer:
+        transformer = DesignationTransformer(
+            column_name,
+            normalizer,
+            (lambda name: report_func(report.LogEvent(message=name))) if print_unmatched else None,
+        )
+        rule_counts = transformer.rule_counts
+        diff = None if diff_tolerance is None else CatalogDiff.for_transformer(storage, transformer, diff_tolerance)
 
-    for rows in rawdata_batches(storage, table_name, [column_name], batch_size):
-        batch_ids: list[str] = []
-        batch_names: list[list[str]] = []
-
-        for row in rows:
-            internal_id = row["hyperleda_internal_id"]
-            name_val = row[column_name]
-            if name_val is None or (isinstance(name_val, str) and not name_val.strip()):
-                unmatched += 1
-                continue
-            name_str = str(name_val).strip()
-            match_result = match(name_str)
-            if match_result is not None:
-                transformed, rule_name = match_result
-                rule_counts[rule_name] += 1
-            else:
-                unmatched += 1
-                transformed = name_str
-                if print_unmatched:
-                    report_func(report.LogEvent(message=name_str))
-            batch_ids.append(internal_id)
-            batch_names.append([transformed])
+        with StructuredWriter(client) as writer:
+            for batch in rawdata_column_batches(
+                storage,
+                table_name,
+                transformer.raw_columns,
+                batch_size,
+                sample_percent=None if sample is None else sample.percent,
+            ):
+                catalog_batch = transformer.transform(batch)
+                unmatched = transformer.unmatched
 
-        if write and batch_ids:
-            handle_call(
-                save_structured_data.sync_detailed(
-                    client=client,
-                    body=action_description.apply(
-                        SaveStructuredDataRequest(
-                            catalog="designation",
-                            columns=["design"],
-                            ids=batch_ids,
-                            data=batch_names,
-                        ),
-                    ),
-                )
-            )
+                if diff is not None:
+                    catalog_batch = diff.filter(catalog_batch)
+                if write and catalog_batch.ids:
+                    writer.submit(catalog_request(transformer, catalog_batch))
 
-        processed_rows += len(rows)
-        total_so_far = sum(rule_counts.values()) + unmatched
+                rows_read = len(batch["hyperleda_internal_id"])
+                processed_rows += rows_read
+                if sample is not None:
+                    sample.add(rows_read)
+                total_so_far = sum(rule_counts.values()) + unmatched
 
-        def total_pct(n: int, t: int = total_so_far) -> float:
-            return (100.0 * n / t) if t else 0.0
+                def total_pct(n: int, t: int = total_so_far) -> float:
+                    return (100.0 * n / t) if t else 0.0
 
-        log.logger.info(
-            "processed batch",
-            total=total_so_far,
-            matched=sum(rule_counts.values()),
-            matched_pct=round(total_pct(sum(rule_counts.values())), 1),
-            unmatched=unmatched,
-            unmatched_pct=round(total_pct(unmatched), 1),
-        )
-        progress_pct = int(100 * processed_rows / total_count) if total_count else 0
-        _report_batch_progress(
-            report_func,
-            rows_read=len(rows),
-            total_so_far=total_so_far,
-            matched=sum(rule_counts.values()),
-            unmatched=unmatched,
-            progress_pct=progress_pct,
-            rule_counts=rule_counts,
-        )
+                log.logger.info(
+                    "processed batch",
+                    total=total_so_far,
+                    matched=sum(rule_counts.values()),
+                    matched_pct=round(total_pct(sum(rule_counts.values())), 1),
+                    unmatched=unmatched,
+                    unmatched_pct=round(total_pct(unmatched), 1),
+                    cache_hits=normalizer.hits,
+                    disk_cache_hits=normalizer.disk_hits,
+                    computed=normalizer.computed,
+                    pending_writes=writer.pending,
+                )
+                progress_pct = int(100 * processed_rows / scan_rows) if scan_rows else 0
+                _report_batch_progress(
+                    report_func,
+                    rows_read=rows_read,
+                    total_so_far=total_so_far,
+                    matched=sum(rule_counts.values()),
+                    unmatched=unmatched,
+                    progress_pct=progress_pct,
+                    pending_writes=writer.pending,
+                    rule_counts=rule_counts,
+                    sample=sample,
+                )
 
+    unmatched = transformer.unmatched
     total = sum(rule_counts.values()) + unmatched
-    _report_rule_distribution(report_func, rule_counts, unmatched, total)
+    _report_rule_distribution(report_func, rule_counts, unmatched, total, profile, sample, diff)
 
     return total
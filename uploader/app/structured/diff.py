@@ -0,0 +1,116 @@
+import math
+from typing import Any
+
+import astropy.units as u
+from psycopg import sql
+
+from uploader.app.display import format_table
+from uploader.app.storage import PgStorage
+from uploader.app.structured.catalog import CatalogBatch, CatalogTransformer
+
+# schema of the table each catalog is stored in, `<schema>.data`
+CATALOG_TABLES = {
+    "designation": "designation",
+    "icrs": "icrs",
+    "nature": "nature",
+    "redshift": "cz",
+}
+
+# units of the values in the catalog tables
+STORED_UNITS = {
+    "icrs": {"ra": "deg", "dec": "deg", "e_ra": "deg", "e_dec": "deg"},
+    "redshift": {"cz": "km/s", "e_cz": "km/s"},
+}
+
+DEFAULT_TOLERANCE = 1e-9
+
+
+class CatalogDiff:
+    """
+    Drops the rows of catalog batches whose values are already stored for the same records.
+    Numbers are compared in the units of the catalog table and are unchanged if they differ by less than
+    `tolerance`, absolute or relative; other values must be equal.
+    """
+
+    def __init__(
+        self,
+        storage: PgStorage,
+        catalog: str,
+        columns: list[str],
+        units: dict[str, str] | None = None,
+        tolerance: float = DEFAULT_TOLERANCE,
+    ) -> None:
+        schema = CATALOG_TABLES.get(catalog)
+        if schema is None:
+            raise ValueError(f"Diff mode is not available for the {catalog} catalog")
+        stored_units = STORED_UNITS.get(catalog, {})
+        units = units or {}
+        self.storage = storage
+        self.columns = columns
+        self.tolerance = tolerance
+        self.scales = [
+            u.Unit(units[col]).to(u.Unit(stored_units[col])) if col in units and col in stored_units else 1.0
+            for col in columns
+        ]
+        self.query = sql.SQL("SELECT record_id, {cols} FROM {t} WHERE record_id = ANY(%s)").format(
+            cols=sql.SQL(", ").join(sql.Identifier(col) for col in columns),
+            t=sql.Identifier(schema, "data"),
+        )
+        self.unchanged = 0
+        self.changed = 0
+        self.new = 0
+
+    @classmethod
+    def for_transformer(
+        cls,
+        storage: PgStorage,
+        transformer: CatalogTransformer,
+        tolerance: float = DEFAULT_TOLERANCE,
+    ) -> "CatalogDiff":
+        units = transformer.units.to_dict() if transformer.units is not None else None
+        return cls(storage, transformer.catalog, transformer.columns, units, tolerance)
+
+    def filter(self, batch: CatalogBatch) -> CatalogBatch:
+        if not batch.ids:
+            return batch
+        stored = {row["record_id"]: row for row in self.storage.query(self.query, (batch.ids,))}
+        ids: list[str] = []
+        data: list[list[Any]] = []
+        for record_id, values in zip(batch.ids, batch.data, strict=True):
+            old = stored.get(record_id)
+            if old is None:
+                self.new += 1
+            elif all(
+                self._same(value, old[col], scale)
+                for col, value, scale in zip(self.columns, values, self.scales, strict=True)
+            ):
+                self.unchanged += 1
+                continue
+            else:
+                self.changed += 1
+            ids.append(record_id)
+            data.append(values)
+        return CatalogBatch(ids=ids, data=data)
+
+    def _same(self, value: Any, stored: Any, scale: float) -> bool:
+        if value is None or stored is None:
+            return value is None and stored is None
+        if isinstance(value, int | float) and not isinstance(value, bool):
+            return math.isclose(value * scale, float(stored), rel_tol=self.tolerance, abs_tol=self.tolerance)
+        return value == stored
+
+    def summary(self) -> str:
+        total = self.unchanged + self.changed + self.new
+
+        def pct(n: int) -> float:
+            return (100.0 * n / total) if total else 0.0
+
+        return format_table(
+            ("Diff", "Count", "%"),
+            [
+                ("Unchanged (not sent)", self.unchanged, pct(self.unchanged)),
+                ("Changed", self.changed, pct(self.changed)),
+                ("New", self.new, pct(self.new)),
+            ],
+            title=f"Compared with stored values (tolerance {self.tolerance:g})\n",
+        )
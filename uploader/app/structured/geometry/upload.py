@@ -1,4 +1,5 @@
 from collections.abc import Callable
+from typing import Any
 
 import astropy.units as u
 import matplotlib.pyplot as plt
@@ -8,12 +9,15 @@ from psycopg import sql
 import uploader.app.action_description as action_description
 import uploader.app.report as report
 from uploader.app.display import format_table
+from uploader.app.lib.aggregates import Histogram, float_value, histogram_bin, not_null, table_aggregates
 from uploader.app.lib.expression import Expression, parse
 from uploader.app.lib.rawdata import rawdata_batches
 from uploader.app.storage import PgStorage
+from uploader.app.structured.sample import DrySample, check_server_stats
+from uploader.app.structured.writer import StructuredWriter
 from uploader.app.upload import handle_call
 from uploader.clients.gen.client import adminapi
-from uploader.clients.gen.client.adminapi.api.default import get_table, save_structured_data
+from uploader.clients.gen.client.adminapi.api.default import get_table
 from uploader.clients.gen.client.adminapi.models.save_structured_data_request import (
     SaveStructuredDataRequest,
 )
@@ -60,14 +64,22 @@ def _plot_axis_panel(
     vmin: float | None,
     vmax: float | None,
     vmean: float | None,
+    sample: DrySample | None = None,
 ) -> None:
     centers = np.sqrt(AXIS_BIN_EDGES[:-1] * AXIS_BIN_EDGES[1:])
     widths = np.diff(AXIS_BIN_EDGES)
-    ax.bar(centers, counts, width=widths, align="center")
+    if sample is None:
+        ax.bar(centers, counts, width=widths, align="center")
+        ax.set_ylabel("Count")
+    else:
+        estimated, low, high = sample.estimate_counts(counts)
+        ax.bar(
+            centers, estimated, width=widths, align="center", yerr=(estimated - low, high - estimated), ecolor="gray"
+        )
+        ax.set_ylabel(f"Estimated count ({sample.percent:.2f}% sample, 95% CI)")
     ax.set_xscale("log")
     ax.set_yscale("log")
     ax.set_xlabel(xlabel)
-    ax.set_ylabel("Count")
     ax.set_title(title)
     if vmin is not None and vmin > 0:
         ax.axvline(vmin, color="gray", linestyle=":", linewidth=1)
@@ -87,6 +99,10 @@ class _GeometryDistributionAccumulator:
         self._a_counts += _positive_histogram(a_values)
         self._b_counts += _positive_histogram(b_values)
 
+    def add_counts(self, a_counts: np.ndarray, b_counts: np.ndarray) -> None:
+        self._a_counts += a_counts
+        self._b_counts += b_counts
+
     @property
     def total(self) -> int:
         return int(self._a_counts.sum())
@@ -102,6 +118,7 @@ class _GeometryDistributionAccumulator:
         b_mean: float | None = None,
         b_min: float | None = None,
         b_max: float | None = None,
+        sample: DrySample | None = None,
     ) -> None:
         if self.total == 0:
             return
@@ -114,6 +131,7 @@ class _GeometryDistributionAccumulator:
             vmin=a_min,
             vmax=a_max,
             vmean=a_mean,
+            sample=sample,
         )
         _plot_axis_panel(
             ax_b,
@@ -123,6 +141,7 @@ class _GeometryDistributionAccumulator:
             vmin=b_min,
             vmax=b_max,
             vmean=b_mean,
+            sample=sample,
         )
         fig.tight_layout()
         report_func(report.image_event_from_figure(fig, caption=caption))
@@ -166,6 +185,48 @@ def _evaluate_field(
     return float(quantity.value)
 
 
+def _server_column(expr: Expression, column_units: dict[str, str], field: str) -> tuple[str, float]:
+    """Column that a plain column expression refers to and the factor that converts it to the target unit."""
+    column = expr.column
+    if column is None:
+        raise ValueError(f"Server-side statistics need {field} to be a single column, got an expression")
+    try:
+        return column, _evaluate_field(expr, {column: 1.0}, column_units, field)
+    except (u.UnitConversionError, u.UnitTypeError) as e:
+        raise ValueError(f"Server-side statistics cannot convert {field} to {TARGET_UNITS[field]}: {e}") from e
+
+
+def _aggregate_on_server(
+    storage: PgStorage,
+    table_name: str,
+    parsed: dict[str, Expression],
+    needed_cols: set[str],
+    column_units: dict[str, str],
+    axis_dist: _GeometryDistributionAccumulator,
+) -> dict[str, Any]:
+    """
+    Row counts and a/b statistics of the rows that would be uploaded, computed with one aggregate query;
+    the axis distributions are added to `axis_dist`. Expressions other than a and b are not evaluated.
+    """
+    complete = not_null(sorted(needed_cols))
+    aggregates: dict[str, sql.Composable] = {
+        "total": sql.SQL("COUNT(*)"),
+        "uploaded": sql.SQL("COUNT(*) FILTER (WHERE {})").format(complete),
+    }
+    histograms: list[Histogram] = []
+    for field in ("a", "b"):
+        column, scale = _server_column(parsed[field], column_units, field)
+        value = sql.SQL("({} * {})").format(float_value(column), sql.Literal(scale))
+        finite = sql.SQL("{} AND {} <> 'NaN'").format(complete, value)
+        aggregates[f"{field}_min"] = sql.SQL("MIN({}) FILTER (WHERE {})").format(value, finite)
+        aggregates[f"{field}_max"] = sql.SQL("MAX({}) FILTER (WHERE {})").format(value, finite)
+        aggregates[f"{field}_sum"] = sql.SQL("SUM({}) FILTER (WHERE {})").format(value, complete)
+        histograms.append(Histogram([histogram_bin(value, AXIS_BIN_EDGES, complete)], (N_AXIS_BINS,)))
+    totals, (a_counts, b_counts) = table_aggregates(storage, table_name, aggregates, histograms)
+    axis_dist.add_counts(a_counts, b_counts)
+    return totals
+
+
 def upload_geometry_isophotal(
     storage: PgStorage,
     table_name: str,
@@ -175,6 +236,9 @@ def upload_geometry_isophotal(
     client: adminapi.AuthenticatedClient,
     *,
     write: bool = False,
+    sample_percent: float = 0.0,
+    sample_rows: int = 0,
+    server_stats: bool = False,
     report_func: Callable[[report.Event], None],
 ) -> int:
     parsed = _parse_expressions(expressions)
@@ -194,99 +258,123 @@ def upload_geometry_isophotal(
     b_min = float("inf")
     b_max = float("-inf")
     b_sum = 0.0
-    cnt = storage.query(
-        sql.SQL("SELECT COUNT(*) AS cnt FROM rawdata.{}").format(sql.Identifier(table_name)),
-        (),
-    )
-    total_count = int(cnt[0]["cnt"]) if cnt else 0
-    processed_rows = 0
     axis_dist = _GeometryDistributionAccumulator()
 
-    for rows in rawdata_batches(storage, table_name, sorted(needed_cols), batch_size):
-        batch_ids: list[str] = []
-        batch_data: list[list[str | float]] = []
-        batch_a: list[float] = []
-        batch_b: list[float] = []
-
-        for row in rows:
-            if any(row[col] is None for col in needed_cols):
-                skipped += 1
-                continue
-
-            values = {col: float(row[col]) for col in needed_cols}
-            try:
-                evaluated = {
-                    field: _evaluate_field(expr, values, column_units, field) for field, expr in parsed.items()
-                }
-            except (ValueError, u.UnitConversionError, u.UnitTypeError) as e:
-                raise RuntimeError(
-                    f"failed to evaluate expressions for row {row['hyperleda_internal_id']}: {e}",
-                ) from e
-
-            row_data: dict[str, str | float | None] = {
-                "band": band,
-                "method": "isophotal",
-                "isophote": evaluated["isophote"],
-                "a": evaluated["a"],
-                "e_a": evaluated["e_a"],
-                "b": evaluated["b"],
-                "e_b": evaluated["e_b"],
-            }
-            for col in OPTIONAL_GEOMETRY_COLUMNS:
-                if col in parsed:
-                    row_data[col] = evaluated[col]
-
-            batch_ids.append(row["hyperleda_internal_id"])
-            batch_data.append([row_data[col] for col in geometry_columns])
-            uploaded += 1
-            a_val = evaluated["a"]
-            a_min = min(a_min, a_val)
-            a_max = max(a_max, a_val)
-            a_sum += a_val
-            batch_a.append(a_val)
-            b_val = evaluated["b"]
-            b_min = min(b_min, b_val)
-            b_max = max(b_max, b_val)
-            b_sum += b_val
-            batch_b.append(b_val)
-
-        axis_dist.add(batch_a, batch_b)
-
-        if write and batch_ids:
-            handle_call(
-                save_structured_data.sync_detailed(
-                    client=client,
-                    body=action_description.apply(
-                        SaveStructuredDataRequest(
-                            catalog="geometry",
-                            columns=geometry_columns,
-                            ids=batch_ids,
-                            data=batch_data,
-                            units=geometry_units,
+    sample: DrySample | None = None
+    if server_stats:
+        check_server_stats(write=write, sample_percent=sample_percent, sample_rows=sample_rows)
+        totals = _aggregate_on_server(storage, table_name, parsed, needed_cols, column_units, axis_dist)
+        uploaded = int(totals["uploaded"])
+        skipped = int(totals["total"]) - uploaded
+        if totals["a_min"] is not None:
+            a_min, a_max = float(totals["a_min"]), float(totals["a_max"])
+        if totals["b_min"] is not None:
+            b_min, b_max = float(totals["b_min"]), float(totals["b_max"])
+        if totals["a_sum"] is not None:
+            a_sum, b_sum = float(totals["a_sum"]), float(totals["b_sum"])
+    else:
+        cnt = storage.query(
+            sql.SQL("SELECT COUNT(*) AS cnt FROM rawdata.{}").format(sql.Identifier(table_name)),
+            (),
+        )
+        total_count = int(cnt[0]["cnt"]) if cnt else 0
+        sample = DrySample.resolve(total_count, sample_percent, sample_rows, write=write)
+        scan_rows = total_count if sample is None else sample.expected_rows
+        processed_rows = 0
+
+        with StructuredWriter(client) as writer:
+            for rows in rawdata_batches(
+                storage,
+                table_name,
+                sorted(needed_cols),
+                batch_size,
+                sample_percent=None if sample is None else sample.percent,
+            ):
+                batch_ids: list[str] = []
+                batch_data: list[list[str | float]] = []
+                batch_a: list[float] = []
+                batch_b: list[float] = []
+
+                for row in rows:
+                    if any(row[col] is None for col in needed_cols):
+                        skipped += 1
+                        continue
+
+                    values = {col: float(row[col]) for col in needed_cols}
+                    try:
+                        evaluated = {
+                            field: _evaluate_field(expr, values, column_units, field) for field, expr in parsed.items()
+                        }
+                    except (ValueError, u.UnitConversionError, u.UnitTypeError) as e:
+                        raise RuntimeError(
+                            f"failed to evaluate expressions for row {row['hyperleda_internal_id']}: {e}",
+                        ) from e
+
+                    row_data: dict[str, str | float | None] = {
+                        "band": band,
+                        "method": "isophotal",
+                        "isophote": evaluated["isophote"],
+                        "a": evaluated["a"],
+                        "e_a": evaluated["e_a"],
+                        "b": evaluated["b"],
+                        "e_b": evaluated["e_b"],
+                    }
+                    for col in OPTIONAL_GEOMETRY_COLUMNS:
+                        if col in parsed:
+                            row_data[col] = evaluated[col]
+
+                    batch_ids.append(row["hyperleda_internal_id"])
+                    batch_data.append([row_data[col] for col in geometry_columns])
+                    uploaded += 1
+                    a_val = evaluated["a"]
+                    a_min = min(a_min, a_val)
+                    a_max = max(a_max, a_val)
+                    a_sum += a_val
+                    batch_a.append(a_val)
+                    b_val = evaluated["b"]
+                    b_min = min(b_min, b_val)
+                    b_max = max(b_max, b_val)
+                    b_sum += b_val
+                    batch_b.append(b_val)
+
+                axis_dist.add(batch_a, batch_b)
+
+                if write and batch_ids:
+                    writer.submit(
+                        action_description.apply(
+                            SaveStructuredDataRequest(
+                                catalog="geometry",
+                                columns=geometry_columns,
+                                ids=batch_ids,
+                                data=batch_data,
+                                units=geometry_units,
+                            ),
                         ),
+                    )
+
+                processed_rows += len(rows)
+                if sample is not None:
+                    sample.add(len(rows))
+                row_pct = int(100 * processed_rows / scan_rows) if scan_rows else 0
+                report_func(report.ProgressEvent(percent=min(99, row_pct)))
+                report_func(
+                    report.LogEvent(
+                        message=f"batch: rows_read={len(rows)} uploaded={uploaded} skipped={skipped} "
+                        f"pending_writes={writer.pending}",
                     ),
-                ),
-            )
-
-        processed_rows += len(rows)
-        row_pct = int(100 * processed_rows / total_count) if total_count else 0
-        report_func(report.ProgressEvent(percent=min(99, row_pct)))
-        report_func(
-            report.LogEvent(
-                message=f"batch: rows_read={len(rows)} uploaded={uploaded} skipped={skipped}",
-            ),
-        )
-        if uploaded > 0:
-            axis_dist.emit_image(
-                report_func,
-                caption=f"a/b distribution: {uploaded} objects",
-                a_mean=a_sum / uploaded,
-                a_min=a_min,
-                a_max=a_max,
-                b_mean=b_sum / uploaded,
-                b_min=b_min,
-                b_max=b_max,
-            )
+                )
+                if uploaded > 0:
+                    axis_dist.emit_image(
+                        report_func,
+                        caption=f"a/b distribution: {uploaded} objects",
+                        a_mean=a_sum / uploaded,
+                        a_min=a_min,
+                        a_max=a_max,
+                        b_mean=b_sum / uploaded,
+                        b_min=b_min,
+                        b_max=b_max,
+                        sample=sample,
+                    )
 
     total = uploaded + skipped
 
@@ -317,11 +405,14 @@ def upload_geometry_isophotal(
             b_mean=b_sum / uploaded,
             b_min=b_min,
             b_max=b_max,
+            sample=sample,
         )
     summary = format_table(
         ("Status", "Count", "%"),
         table_rows,
         title=f"Total rows: {total}\n",
     )
+    if sample is not None:
+        summary += "\n\n" + sample.summary([("Uploaded", uploaded), ("Skipped (null)", skipped)])
     report_func(report.DoneEvent(message=summary))
     return total
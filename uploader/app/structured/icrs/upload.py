@@ -1,22 +1,24 @@
 from collections.abc import Callable
+from typing import Any, Self
 
 import astropy.units as u
 import matplotlib.pyplot as plt
 import numpy as np
 from psycopg import sql
 
-import uploader.app.action_description as action_description
 import uploader.app.report as report
 from uploader.app.display import format_table
+from uploader.app.lib.aggregates import Histogram, float_value, histogram_bin, not_null, table_aggregates
 from uploader.app.lib.expression import Expression, parse
-from uploader.app.lib.rawdata import rawdata_batches
+from uploader.app.lib.rawdata import rawdata_column_batches
 from uploader.app.storage import PgStorage
+from uploader.app.structured.catalog import CatalogBatch, ColumnBatch, catalog_request
+from uploader.app.structured.diff import CatalogDiff
+from uploader.app.structured.sample import DrySample, check_server_stats
+from uploader.app.structured.writer import StructuredWriter
 from uploader.app.upload import handle_call
 from uploader.clients.gen.client import adminapi
-from uploader.clients.gen.client.adminapi.api.default import get_table, save_structured_data
-from uploader.clients.gen.client.adminapi.models.save_structured_data_request import (
-    SaveStructuredDataRequest,
-)
+from uploader.clients.gen.client.adminapi.api.default import get_table
 from uploader.clients.gen.client.adminapi.models.save_structured_data_request_units import (
     SaveStructuredDataRequestUnits,
 )
@@ -46,6 +48,9 @@ class _SkyCoverageAccumulator:
         batch_counts, _, _ = np.histogram2d(ra_arr, dec_arr, bins=[RA_BIN_EDGES, DEC_BIN_EDGES])
         self._counts += batch_counts.astype(np.int64)
 
+    def add_counts(self, counts: np.ndarray) -> None:
+        self._counts += counts
+
     @property
     def total(self) -> int:
         return int(self._counts.sum())
@@ -55,6 +60,7 @@ class _SkyCoverageAccumulator:
         report_func: Callable[[report.Event], None],
         *,
         caption: str,
+        sample: DrySample | None = None,
     ) -> None:
         if self.total == 0:
             return
@@ -63,8 +69,13 @@ class _SkyCoverageAccumulator:
         theta, phi = np.meshgrid(-np.deg2rad(ra_centers), np.deg2rad(dec_centers))
         fig = plt.figure(figsize=CHART_FIGSIZE)
         ax = fig.add_subplot(111, projection="aitoff")
-        ax.pcolormesh(theta, phi, self._counts.T, shading="auto", cmap="viridis")
-        ax.set_title("ICRS sky coverage")
+        if sample is None:
+            ax.pcolormesh(theta, phi, self._counts.T, shading="auto", cmap="viridis")
+            ax.set_title("ICRS sky coverage")
+        else:
+            estimated, _, _ = sample.estimate_counts(self._counts)
+            ax.pcolormesh(theta, phi, estimated.T, shading="auto", cmap="viridis")
+            ax.set_title(f"ICRS sky coverage (estimated from a {sample.percent:.2f}% sample)")
         ax.grid(True)
         report_func(report.image_event_from_figure(fig, caption=caption))
 
@@ -103,6 +114,138 @@ def _fetch_column_units(
     return column_names, column_units
 
 
+class IcrsTransformer:
+    catalog = "icrs"
+    columns = ICRS_COLUMNS
+
+    def __init__(
+        self,
+        ra_column: str,
+        dec_column: str,
+        parsed: dict[str, Expression],
+        column_units: dict[str, str],
+    ) -> None:
+        self.ra_column = ra_column
+        self.dec_column = dec_column
+        self.parsed = parsed
+        self.column_units = column_units
+        self.error_cols: set[str] = set().union(*(expr.referenced_columns for expr in parsed.values()))
+        self.needed_cols = {ra_column, dec_column} | self.error_cols
+        self.raw_columns = sorted(self.needed_cols)
+        self.units = SaveStructuredDataRequestUnits.from_dict(
+            {
+                "ra": column_units[ra_column],
+                "dec": column_units[dec_column],
+                **TARGET_ERROR_UNITS,
+            }
+        )
+        self.uploaded = 0
+        self.skipped = 0
+
+    @classmethod
+    def create(
+        cls,
+        client: adminapi.AuthenticatedClient,
+        table_name: str,
+        ra_column: str,
+        dec_column: str,
+        expressions: dict[str, str],
+    ) -> Self:
+        parsed = _parse_expressions(expressions)
+        column_names, column_units = _fetch_column_units(client, table_name)
+
+        error_cols = set().union(*(expr.referenced_columns for expr in parsed.values()))
+        all_needed_cols = {ra_column, dec_column} | error_cols
+        missing = sorted(col for col in all_needed_cols if col not in column_names)
+        if missing:
+            raise RuntimeError(f"Table {table_name} has no column(s): {missing}")
+
+        missing_units = [c for c in (ra_column, dec_column) if c not in column_units]
+        if missing_units:
+            raise RuntimeError(f"Table {table_name} has no unit for column(s): {missing_units}")
+        return cls(ra_column, dec_column, parsed, column_units)
+
+    def transform(self, batch: ColumnBatch) -> CatalogBatch:
+        batch_ids: list[str] = []
+        batch_data: list[list[Any]] = []
+        ids = batch["hyperleda_internal_id"]
+        needed = [batch[col] for col in self.needed_cols]
+        ra_values = batch[self.ra_column]
+        dec_values = batch[self.dec_column]
+        error_values = {col: batch[col] for col in self.error_cols}
+
+        for i, internal_id in enumerate(ids):
+            if any(values[i] is None for values in needed):
+                self.skipped += 1
+                continue
+
+            values = {col: float(column[i]) for col, column in error_values.items()}
+            try:
+                e_ra_val = _evaluate_error_field(self.parsed["e_ra"], values, self.column_units, "e_ra")
+                e_dec_val = _evaluate_error_field(self.parsed["e_dec"], values, self.column_units, "e_dec")
+            except (ValueError, u.UnitConversionError, u.UnitTypeError) as e:
+                raise RuntimeError(
+                    f"failed to evaluate expressions for row {internal_id}: {e}",
+                ) from e
+
+            batch_ids.append(internal_id)
+            batch_data.append([float(ra_values[i]), float(dec_values[i]), e_ra_val, e_dec_val])
+        self.uploaded += len(batch_ids)
+        return CatalogBatch(ids=batch_ids, data=batch_data)
+
+    def details(self) -> str:
+        return ""
+
+
+def _sky_longitude(ra: sql.Composable) -> sql.Composed:
+    """Same as `_ra_to_longitude_deg` in SQL."""
+    wrapped = sql.SQL("({ra} - 360 * floor({ra} / 360) + 180)").format(ra=ra)
+    return sql.SQL("({w} - 360 * floor({w} / 360) - 180)").format(w=wrapped)
+
+
+def _aggregate_on_server(
+    storage: PgStorage,
+    table_name: str,
+    transformer: IcrsTransformer,
+    sky: _SkyCoverageAccumulator,
+) -> dict[str, Any]:
+    """
+    Row counts and RA/Dec statistics of the rows the transformer would upload, computed with one aggregate
+    query; the sky coverage bins are added to `sky`. Error expressions are not evaluated.
+    """
+    ra = float_value(transformer.ra_column)
+    dec = float_value(transformer.dec_column)
+    complete = not_null(transformer.raw_columns)
+    aggregates: dict[str, sql.Composable] = {
+        "total": sql.SQL("COUNT(*)"),
+        "uploaded": sql.SQL("COUNT(*) FILTER (WHERE {})").format(complete),
+    }
+    # PostgreSQL sorts NaN above every number, so it is excluded before clipping or comparing
+    finite: dict[str, sql.Composable] = {}
+    for name, value in (("ra", ra), ("dec", dec)):
+        finite[name] = sql.SQL("{} AND {} <> 'NaN'").format(complete, value)
+        aggregates[f"{name}_min"] = sql.SQL("MIN({}) FILTER (WHERE {})").format(value, finite[name])
+        aggregates[f"{name}_max"] = sql.SQL("MAX({}) FILTER (WHERE {})").format(value, finite[name])
+        aggregates[f"{name}_sum"] = sql.SQL("SUM({}) FILTER (WHERE {})").format(value, complete)
+    clipped_dec = sql.SQL("LEAST(GREATEST({}, -90.0), 90.0)").format(dec)
+    totals, (counts,) = table_aggregates(
+        storage,
+        table_name,
+        aggregates,
+        [
+            Histogram(
+                [
+                    histogram_bin(_sky_longitude(ra), RA_BIN_EDGES, finite["ra"]),
+                    histogram_bin(clipped_dec, DEC_BIN_EDGES, finite["dec"]),
+                ],
+                (N_RA_BINS, N_DEC_BINS),
+            )
+        ],
+    )
+    sky.add_counts(counts)
+    return totals
+
+
 def upload_icrs(
     storage: PgStorage,
     table_name: str,
@@ -113,28 +256,13 @@ def upload_icrs(
     client: adminapi.AuthenticatedClient,
     *,
     write: bool = False,
+    sample_percent: float = 0.0,
+    sample_rows: int = 0,
+    server_stats: bool = False,
+    diff_tolerance: float | None = None,
     report_func: Callable[[report.Event], None],
 ) -> int:
-    parsed = _parse_expressions(expressions)
-    column_names, column_units = _fetch_column_units(client, table_name)
-
-    error_cols = set().union(*(expr.referenced_columns for expr in parsed.values()))
-    all_needed_cols = {ra_column, dec_column} | error_cols
-    missing = sorted(col for col in all_needed_cols if col not in column_names)
-    if missing:
-        raise RuntimeError(f"Table {table_name} has no column(s): {missing}")
-
-    missing_units = [c for c in (ra_column, dec_column) if c not in column_units]
-    if missing_units:
-        raise RuntimeError(f"Table {table_name} has no unit for column(s): {missing_units}")
-
-    units = SaveStructuredDataRequestUnits.from_dict(
-        {
-            "ra": column_units[ra_column],
-            "dec": column_units[dec_column],
-            **TARGET_ERROR_UNITS,
-        }
-    )
+    transformer = IcrsTransformer.create(client, table_name, ra_column, dec_column, expressions)
 
     uploaded = 0
     skipped = 0
@@ -144,77 +272,78 @@ def upload_icrs(
     dec_max = float("-inf")
     ra_sum = 0.0
     dec_sum = 0.0
-    cnt = storage.query(
-        sql.SQL("SELECT COUNT(*) AS cnt FROM rawdata.{}").format(sql.Identifier(table_name)),
-        (),
-    )
-    total_count = int(cnt[0]["cnt"]) if cnt else 0
-    processed_rows = 0
     sky = _SkyCoverageAccumulator()
 
-    fetch_columns = sorted(all_needed_cols)
-    for rows in rawdata_batches(storage, table_name, fetch_columns, batch_size):
-        batch_ids: list[str] = []
-        batch_data: list[list[float]] = []
-        batch_ra: list[float] = []
-        batch_dec: list[float] = []
-
-        for row in rows:
-            if any(row[col] is None for col in all_needed_cols):
-                skipped += 1
-                continue
-
-            ra_f = float(row[ra_column])
-            dec_f = float(row[dec_column])
-
-            values = {col: float(row[col]) for col in error_cols}
-            try:
-                e_ra_val = _evaluate_error_field(parsed["e_ra"], values, column_units, "e_ra")
-                e_dec_val = _evaluate_error_field(parsed["e_dec"], values, column_units, "e_dec")
-            except (ValueError, u.UnitConversionError, u.UnitTypeError) as e:
-                raise RuntimeError(
-                    f"failed to evaluate expressions for row {row['hyperleda_internal_id']}: {e}",
-                ) from e
-
-            batch_ids.append(row["hyperleda_internal_id"])
-            batch_data.append([ra_f, dec_f, e_ra_val, e_dec_val])
-            uploaded += 1
-            ra_min = min(ra_min, ra_f)
-            ra_max = max(ra_max, ra_f)
-            dec_min = min(dec_min, dec_f)
-            dec_max = max(dec_max, dec_f)
-            ra_sum += ra_f
-            dec_sum += dec_f
-            batch_ra.append(ra_f)
-            batch_dec.append(dec_f)
-
-        sky.add(batch_ra, batch_dec)
-
-        if write and batch_ids:
-            handle_call(
-                save_structured_data.sync_detailed(
-                    client=client,
-                    body=action_description.apply(
-                        SaveStructuredDataRequest(
-                            catalog="icrs",
-                            columns=ICRS_COLUMNS,
-                            ids=batch_ids,
-                            data=batch_data,
-                            units=units,
-                        ),
+    sample: DrySample | None = None
+    diff: CatalogDiff | None = None
+    if server_stats:
+        check_server_stats(
+            write=write,
+            sample_percent=sample_percent,
+            sample_rows=sample_rows,
+            diff=diff_tolerance is not None,
+        )
+        totals = _aggregate_on_server(storage, table_name, transformer, sky)
+        uploaded = int(totals["uploaded"])
+        skipped = int(totals["total"]) - uploaded
+        if totals["ra_min"] is not None:
+            ra_min, ra_max = float(totals["ra_min"]), float(totals["ra_max"])
+            dec_min, dec_max = float(totals["dec_min"]), float(totals["dec_max"])
+        if totals["ra_sum"] is not None:
+            ra_sum, dec_sum = float(totals["ra_sum"]), float(totals["dec_sum"])
+    else:
+        cnt = storage.query(
+            sql.SQL("SELECT COUNT(*) AS cnt FROM rawdata.{}").format(sql.Identifier(table_name)),
+            (),
+        )
+        total_count = int(cnt[0]["cnt"]) if cnt else 0
+        sample = DrySample.resolve(total_count, sample_percent, sample_rows, write=write)
+        scan_rows = total_count if sample is None else sample.expected_rows
+        processed_rows = 0
+        if diff_tolerance is not None:
+            diff = CatalogDiff.for_transformer(storage, transformer, diff_tolerance)
+
+        with StructuredWriter(client) as writer:
+            for batch in rawdata_column_batches(
+                storage,
+                table_name,
+                transformer.raw_columns,
+                batch_size,
+                sample_percent=None if sample is None else sample.percent,
+            ):
+                catalog_batch = transformer.transform(batch)
+                uploaded = transformer.uploaded
+                skipped = transformer.skipped
+                batch_ra = [row[0] for row in catalog_batch.data]
+                batch_dec = [row[1] for row in catalog_batch.data]
+                for ra_f, dec_f in zip(batch_ra, batch_dec, strict=True):
+                    ra_min = min(ra_min, ra_f)
+                    ra_max = max(ra_max, ra_f)
+                    dec_min = min(dec_min, dec_f)
+                    dec_max = max(dec_max, dec_f)
+                    ra_sum += ra_f
+                    dec_sum += dec_f
+
+                sky.add(batch_ra, batch_dec)
+
+                if diff is not None:
+                    catalog_batch = diff.filter(catalog_batch)
+                if write and catalog_batch.ids:
+                    writer.submit(catalog_request(transformer, catalog_batch))
+
+                rows_read = len(batch["hyperleda_internal_id"])
+                processed_rows += rows_read
+                if sample is not None:
+                    sample.add(rows_read)
+                row_pct = int(100 * processed_rows / scan_rows) if scan_rows else 0
+                report_func(report.ProgressEvent(percent=min(99, row_pct)))
+                report_func(
+                    report.LogEvent(
+                        message=f"batch: rows_read={rows_read} uploaded={uploaded} skipped={skipped} "
+                        f"pending_writes={writer.pending}",
                     ),
                 )
-            )
-
-        processed_rows += len(rows)
-        row_pct = int(100 * processed_rows / total_count) if total_count else 0
-        report_func(report.ProgressEvent(percent=min(99, row_pct)))
-        report_func(
-            report.LogEvent(
-                message=f"batch: rows_read={len(rows)} uploaded={uploaded} skipped={skipped}",
-            ),
-        )
-        sky.emit_image(report_func, caption=f"Sky coverage: {uploaded} objects")
+                sky.emit_image(report_func, caption=f"Sky coverage: {uploaded} objects", sample=sample)
 
     total = uploaded + skipped
 
@@ -239,11 +368,15 @@ def upload_icrs(
             ]
         )
     report_func(report.ProgressEvent(percent=100))
-    sky.emit_image(report_func, caption=f"Final: {uploaded} objects")
+    sky.emit_image(report_func, caption=f"Final: {uploaded} objects", sample=sample)
     summary = format_table(
         ("Status", "Count", "%"),
         table_rows,
         title=f"Total rows: {total}\n",
     )
+    if sample is not None:
+        summary += "\n\n" + sample.summary([("Uploaded", uploaded), ("Skipped (null)", skipped)])
+    if diff is not None:
+        summary += "\n\n" + diff.summary()
     report_func(report.DoneEvent(message=summary))
     return total
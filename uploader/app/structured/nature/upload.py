@@ -1,20 +1,21 @@
 from collections import Counter
-from collections.abc import Callable
+from collections.abc import Callable, Sequence
+from typing import Any
 
 import matplotlib.pyplot as plt
+import numpy as np
 from psycopg import sql
 
-import uploader.app.action_description as action_description
 import uploader.app.report as report
 from uploader.app.display import format_table
-from uploader.app.lib.rawdata import rawdata_batches
+from uploader.app.lib.columns import factorize
+from uploader.app.lib.rawdata import rawdata_column_batches
 from uploader.app.storage import PgStorage
-from uploader.app.upload import handle_call
+from uploader.app.structured.catalog import CatalogBatch, ColumnBatch, catalog_request
+from uploader.app.structured.diff import CatalogDiff
+from uploader.app.structured.sample import DrySample
+from uploader.app.structured.writer import StructuredWriter
 from uploader.clients.gen.client import adminapi
-from uploader.clients.gen.client.adminapi.api.default import save_structured_data
-from uploader.clients.gen.client.adminapi.models.save_structured_data_request import (
-    SaveStructuredDataRequest,
-)
 
 NATURE_COLUMNS = ["type_name"]
 
@@ -36,6 +37,7 @@ def _emit_type_distribution_image(
     type_counts: Counter[str],
     *,
     caption: str,
+    sample: DrySample | None = None,
 ) -> None:
     bars = _type_distribution_bars(type_counts)
     if not bars:
@@ -43,13 +45,80 @@ def _emit_type_distribution_image(
     labels = [name for name, _ in bars]
     counts = [count for _, count in bars]
     fig, ax = plt.subplots(figsize=CHART_FIGSIZE)
-    ax.barh(labels, counts)
+    if sample is None:
+        ax.barh(labels, counts)
+        ax.set_xlabel("Count")
+    else:
+        estimated, low, high = sample.estimate_counts(np.array(counts, dtype=np.int64))
+        ax.barh(labels, estimated, xerr=(estimated - low, high - estimated), ecolor="gray")
+        ax.set_xlabel(f"Estimated count ({sample.percent:.2f}% sample, 95% CI)")
     ax.invert_yaxis()
-    ax.set_xlabel("Count")
     ax.set_title("LEDA type distribution")
     report_func(report.image_event_from_figure(fig, caption=caption))
 
 
+def map_types(
+    values: Sequence[Any] | None,
+    size: int,
+    type_mapping: dict[str, str],
+    default_type: str | None,
+) -> tuple[list[str], Counter[str]]:
+    """
+    LEDA type of every row and the number of rows of each type. `type_mapping` and `default_type`
+    are applied once per distinct raw value; `values` is None when there is no type column.
+    """
+    if values is None:
+        uniques: list[Any] = [None]
+        codes = np.zeros(size, dtype=np.intp)
+        leda_types: list[str | None] = [default_type]
+    else:
+        uniques, codes = factorize(values)
+        leda_types = []
+        for raw_val in uniques:
+            raw_key = str(raw_val).strip() if raw_val is not None else ""
+            leda_types.append(type_mapping.get(raw_key, default_type if default_type is not None else raw_key))
+
+    counts = np.bincount(codes, minlength=len(uniques)).tolist()
+    type_counts: Counter[str] = Counter()
+    mapped: list[str] = []
+    for leda_type, count in zip(leda_types, counts, strict=True):
+        if leda_type is None:
+            raise RuntimeError("leda_type is None: set --default or ensure type_mapping covers all values")
+        mapped.append(leda_type)
+        type_counts[leda_type] += count
+    return [mapped[c] for c in codes.tolist()], type_counts
+
+
+class NatureTransformer:
+    catalog = "nature"
+    columns = NATURE_COLUMNS
+    units = None
+
+    def __init__(self, column_name: str | None, type_mapping: dict[str, str], default_type: str | None) -> None:
+        self.column_name = column_name
+        self.type_mapping = type_mapping
+        self.default_type = default_type
+        self.raw_columns = [] if column_name is None else [column_name]
+        self.type_counts: Counter[str] = Counter()
+        self.uploaded = 0
+        self.skipped = 0
+
+    def transform(self, batch: ColumnBatch) -> CatalogBatch:
+        ids = batch["hyperleda_internal_id"]
+        types, counts = map_types(
+            batch[self.column_name] if self.column_name is not None else None,
+            len(ids),
+            self.type_mapping,
+            self.default_type,
+        )
+        self.type_counts.update(counts)
+        self.uploaded += len(ids)
+        return CatalogBatch(ids=list(ids), data=[[leda_type] for leda_type in types])
+
+    def details(self) -> str:
+        return ", ".join(f"{leda_type}: {count}" for leda_type, count in self.type_counts.most_common(5))
+
+
 def upload_nature(
     storage: PgStorage,
     table_name: str,
@@ -60,67 +129,61 @@ def upload_nature(
     client: adminapi.AuthenticatedClient,
     *,
     write: bool = False,
+    sample_percent: float = 0.0,
+    sample_rows: int = 0,
+    diff_tolerance: float | None = None,
     report_func: Callable[[report.Event], None],
 ) -> int:
-    total_uploaded = 0
-    type_counts: Counter[str] = Counter()
+    transformer = NatureTransformer(column_name, type_mapping, default_type)
+    type_counts = transformer.type_counts
 
-    columns: list[str] = [] if column_name is None else [column_name]
     total_count = 0
     cnt = storage.query(
         sql.SQL("SELECT COUNT(*) AS cnt FROM rawdata.{}").format(sql.Identifier(table_name)),
         (),
     )
     total_count = int(cnt[0]["cnt"]) if cnt else 0
+    sample = DrySample.resolve(total_count, sample_percent, sample_rows, write=write)
+    scan_rows = total_count if sample is None else sample.expected_rows
     processed_rows = 0
-
-    for rows in rawdata_batches(storage, table_name, columns, batch_size):
-        batch_ids: list[str] = []
-        batch_data: list[list[str]] = []
-
-        for row in rows:
-            leda_type: str | None = default_type
-            if column_name is not None:
-                raw_val = row[column_name]
-                raw_key = str(raw_val).strip() if raw_val is not None else ""
-                leda_type = type_mapping.get(raw_key, default_type if default_type is not None else raw_key)
-
-            if leda_type is None:
-                raise RuntimeError("leda_type is None: set --default or ensure type_mapping covers all values")
-            batch_ids.append(row["hyperleda_internal_id"])
-            batch_data.append([leda_type])
-            type_counts[leda_type] += 1
-            total_uploaded += 1
-
-        if write and batch_ids:
-            handle_call(
-                save_structured_data.sync_detailed(
-                    client=client,
-                    body=action_description.apply(
-                        SaveStructuredDataRequest(
-                            catalog="nature",
-                            columns=NATURE_COLUMNS,
-                            ids=batch_ids,
-                            data=batch_data,
-                        ),
-                    ),
-                )
+    diff = None if diff_tolerance is None else CatalogDiff.for_transformer(storage, transformer, diff_tolerance)
+
+    with StructuredWriter(client) as writer:
+        for batch in rawdata_column_batches(
+            storage,
+            table_name,
+            transformer.raw_columns,
+            batch_size,
+            sample_percent=None if sample is None else sample.percent,
+        ):
+            batch_ids = batch["hyperleda_internal_id"]
+            catalog_batch = transformer.transform(batch)
+            total_uploaded = transformer.uploaded
+
+            if diff is not None:
+                catalog_batch = diff.filter(catalog_batch)
+            if write and catalog_batch.ids:
+                writer.submit(catalog_request(transformer, catalog_batch))
+
+            processed_rows += len(batch_ids)
+            if sample is not None:
+                sample.add(len(batch_ids))
+            batch_pct = int(100 * processed_rows / scan_rows) if scan_rows else 0
+            report_func(report.ProgressEvent(percent=min(99, batch_pct)))
+            report_func(
+                report.LogEvent(
+                    message=f"batch: rows_read={len(batch_ids)} total_uploaded_so_far={total_uploaded} "
+                    f"pending_writes={writer.pending}",
+                ),
+            )
+            _emit_type_distribution_image(
+                report_func,
+                type_counts,
+                caption=f"{total_uploaded} rows classified",
+                sample=sample,
             )
 
-        processed_rows += len(rows)
-        batch_pct = int(100 * processed_rows / total_count) if total_count else 0
-        report_func(report.ProgressEvent(percent=min(99, batch_pct)))
-        report_func(
-            report.LogEvent(
-                message=f"batch: rows_read={len(rows)} total_uploaded_so_far={total_uploaded}",
-            ),
-        )
-        _emit_type_distribution_image(
-            report_func,
-            type_counts,
-            caption=f"{total_uploaded} rows classified",
-        )
-
+    total_uploaded = transformer.uploaded
     table_rows: list[tuple[str, int, float | str]] = [
         (
             leda_type,
@@ -134,11 +197,16 @@ def upload_nature(
         report_func,
         type_counts,
         caption=f"Final: {total_uploaded} rows",
+        sample=sample,
     )
     summary = format_table(
         ("LEDA type", "Count", "%"),
         table_rows,
         title=f"Total rows: {total_uploaded}\n",
     )
+    if sample is not None:
+        summary += "\n\n" + sample.summary(sorted(type_counts.items()))
+    if diff is not None:
+        summary += "\n\n" + diff.summary()
     report_func(report.DoneEvent(message=summary))
     return total_uploaded
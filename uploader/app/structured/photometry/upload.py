@@ -1,19 +1,20 @@
+import dataclasses
 from collections.abc import Callable
 
+import numpy as np
+import numpy.typing as npt
 from psycopg import sql
 
-import uploader.app.action_description as action_description
 import uploader.app.report as report
 from uploader.app import log
 from uploader.app.display import format_table
-from uploader.app.lib.rawdata import rawdata_batches
+from uploader.app.lib.columns import float_column
+from uploader.app.lib.rawdata import rawdata_column_batches
 from uploader.app.storage import PgStorage
-from uploader.app.upload import handle_call
+from uploader.app.structured.catalog import CatalogBatch, ColumnBatch, catalog_request
+from uploader.app.structured.sample import DrySample
+from uploader.app.structured.writer import StructuredWriter
 from uploader.clients.gen.client import adminapi
-from uploader.clients.gen.client.adminapi.api.default import save_structured_data
-from uploader.clients.gen.client.adminapi.models.save_structured_data_request import (
-    SaveStructuredDataRequest,
-)
 from uploader.clients.gen.client.adminapi.models.save_structured_data_request_units import (
     SaveStructuredDataRequestUnits,
 )
@@ -32,6 +33,77 @@ BANDS = [
 
 PHOTOMETRY_RAW_COLUMNS = [c for _, mag, err in BANDS for c in (mag, err)]
 
+PHOTOMETRY_METHOD = "asymptotic"
+
+
+@dataclasses.dataclass
+class PhotometryBatch:
+    ids: list[str]
+    data: list[list[str | float]]
+    objects: int
+    band_counts: npt.NDArray[np.int64]
+    band_mag_sums: npt.NDArray[np.float64]
+
+
+def unpivot_bands(batch: ColumnBatch) -> PhotometryBatch:
+    """
+    Turns a rawdata column batch with one column pair per band into one photometry row per band that has
+    both a magnitude and an error, ordered by source row and then by band.
+    """
+    size = len(batch["hyperleda_internal_id"])
+    mags = np.empty((size, len(BANDS)), dtype=np.float64)
+    errs = np.empty((size, len(BANDS)), dtype=np.float64)
+    ok = np.empty((size, len(BANDS)), dtype=np.bool_)
+    for j, (_, mag_col, err_col) in enumerate(BANDS):
+        mags[:, j], mag_present = float_column(batch[mag_col])
+        errs[:, j], err_present = float_column(batch[err_col])
+        ok[:, j] = mag_present & err_present
+
+    row_index, band_index = np.nonzero(ok)
+    ids = batch["hyperleda_internal_id"]
+    band_names = [band for band, _, _ in BANDS]
+    picked_mags = mags[row_index, band_index]
+    data: list[list[str | float]] = [
+        [band_names[j], mag, err, PHOTOMETRY_METHOD]
+        for j, mag, err in zip(
+            band_index.tolist(), picked_mags.tolist(), errs[row_index, band_index].tolist(), strict=True
+        )
+    ]
+    return PhotometryBatch(
+        ids=[ids[i] for i in row_index.tolist()],
+        data=data,
+        objects=int(np.count_nonzero(ok.any(axis=1))),
+        band_counts=np.bincount(band_index, minlength=len(BANDS)),
+        band_mag_sums=np.bincount(band_index, weights=picked_mags, minlength=len(BANDS)),
+    )
+
+
+class PhotometryTransformer:
+    catalog = "photometry"
+    columns = PHOTOMETRY_COLUMNS
+    units = PHOTOMETRY_UNITS
+    raw_columns = PHOTOMETRY_RAW_COLUMNS
+
+    def __init__(self) -> None:
+        self.uploaded = 0
+        self.skipped = 0
+        self.objects = 0
+        self.band_counts: dict[str, int] = {band: 0 for band, _, _ in BANDS}
+        self.band_mag_sums: dict[str, float] = {band: 0.0 for band, _, _ in BANDS}
+
+    def transform(self, batch: ColumnBatch) -> CatalogBatch:
+        photometry = unpivot_bands(batch)
+        self.uploaded += len(photometry.ids)
+        self.objects += photometry.objects
+        self.skipped += len(batch["hyperleda_internal_id"]) - photometry.objects
+        for j, (band, _, _) in enumerate(BANDS):
+            self.band_counts[band] += int(photometry.band_counts[j])
+            self.band_mag_sums[band] += float(photometry.band_mag_sums[j])
+        return CatalogBatch(ids=photometry.ids, data=photometry.data)
+
+    def details(self) -> str:
+        return f"{self.objects} source rows with at least one band"
+
 
 def upload_photometry_hyperleda(
     storage: PgStorage,
@@ -41,69 +113,53 @@ def upload_photometry_hyperleda(
     report_func: Callable[[report.Event], None],
     *,
     write: bool = False,
+    sample_percent: float = 0.0,
+    sample_rows: int = 0,
 ) -> None:
-    uploaded_objects = 0
-    skipped = 0
     total_source_rows = 0
     total_rows = int(
         storage.query(sql.SQL("SELECT COUNT(*) AS cnt FROM rawdata.{t}").format(t=sql.Identifier(table_name)))[0]["cnt"]
     )
     report_func(report.LogEvent(message=f"Starting photometry upload for {table_name} ({total_rows} rows)."))
-    band_counts: dict[str, int] = {band: 0 for band, _, _ in BANDS}
-    band_mag_sums: dict[str, float] = {band: 0.0 for band, _, _ in BANDS}
+    sample = DrySample.resolve(total_rows, sample_percent, sample_rows, write=write)
+    scan_rows = total_rows if sample is None else sample.expected_rows
+    transformer = PhotometryTransformer()
 
     try:
-        for rows in rawdata_batches(storage, table_name, PHOTOMETRY_RAW_COLUMNS, batch_size):
-            total_source_rows += len(rows)
-            batch_ids: list[str] = []
-            batch_data: list[list[str | float]] = []
-
-            for row in rows:
-                internal_id = row["hyperleda_internal_id"]
-                had_any = False
-                for band, mag_col, err_col in BANDS:
-                    mag_val = row.get(mag_col)
-                    err_val = row.get(err_col)
-                    if mag_val is not None and err_val is not None:
-                        batch_ids.append(internal_id)
-                        batch_data.append([band, float(mag_val), float(err_val), "asymptotic"])
-                        band_counts[band] += 1
-                        band_mag_sums[band] += float(mag_val)
-                        had_any = True
-                if had_any:
-                    uploaded_objects += 1
-                else:
-                    skipped += 1
-
-            if write and batch_ids:
-                handle_call(
-                    save_structured_data.sync_detailed(
-                        client=client,
-                        body=action_description.apply(
-                            SaveStructuredDataRequest(
-                                catalog="photometry",
-                                columns=PHOTOMETRY_COLUMNS,
-                                ids=batch_ids,
-                                data=batch_data,
-                                units=PHOTOMETRY_UNITS,
-                            ),
-                        ),
-                    )
+        with StructuredWriter(client) as writer:
+            for columns in rawdata_column_batches(
+                storage,
+                table_name,
+                transformer.raw_columns,
+                batch_size,
+                sample_percent=None if sample is None else sample.percent,
+            ):
+                source_rows = len(columns["hyperleda_internal_id"])
+                total_source_rows += source_rows
+                if sample is not None:
+                    sample.add(source_rows)
+                batch = transformer.transform(columns)
+
+                if write and batch.ids:
+                    writer.submit(catalog_request(transformer, batch))
+
+                log.logger.info(
+                    "processed batch",
+                    source_rows=source_rows,
+                    total_source_rows=total_source_rows,
+                    objects=transformer.objects,
+                    photometry_rows=transformer.uploaded,
+                    pending_writes=writer.pending,
                 )
-
-            uploaded_rows = sum(band_counts.values())
-            log.logger.info(
-                "processed batch",
-                source_rows=len(rows),
-                total_source_rows=total_source_rows,
-                objects=uploaded_objects,
-                photometry_rows=uploaded_rows,
-            )
-            progress = 100.0 if total_rows == 0 else (100.0 * total_source_rows / total_rows)
-            report_func(report.ProgressEvent(percent=min(progress, 100.0)))
+                progress = 100.0 if scan_rows == 0 else (100.0 * total_source_rows / scan_rows)
+                report_func(report.ProgressEvent(percent=min(progress, 100.0)))
     finally:
+        uploaded_objects = transformer.objects
+        skipped = transformer.skipped
+        band_counts = transformer.band_counts
+        band_mag_sums = transformer.band_mag_sums
         total = uploaded_objects + skipped
-        total_photometry_rows = sum(band_counts.values())
+        total_photometry_rows = transformer.uploaded
 
         def pct(n: int, denom: int) -> float:
             return (100.0 * n / denom) if denom else 0.0
@@ -126,6 +182,10 @@ def upload_photometry_hyperleda(
             title=f"Total source rows: {total}\n",
             percent_last_column=False,
         )
+        if sample is not None:
+            estimated = [("Source rows with ≥1 band", uploaded_objects), ("Source rows with no band", skipped)]
+            estimated.extend((band, band_counts[band]) for band, _, _ in BANDS)
+            summary += "\n\n" + sample.summary(estimated)
 
         report_func(report.ProgressEvent(percent=100))
         report_func(report.DoneEvent(message=summary))
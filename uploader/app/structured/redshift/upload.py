@@ -1,20 +1,22 @@
-from collections.abc import Callable
+from collections.abc import Callable, Sequence
+from typing import Any
 
 import matplotlib.pyplot as plt
 import numpy as np
+import numpy.typing as npt
 from psycopg import sql
 
-import uploader.app.action_description as action_description
 import uploader.app.report as report
 from uploader.app.display import format_table
-from uploader.app.lib.rawdata import rawdata_batches
+from uploader.app.lib.aggregates import Histogram, float_value, histogram_bin, not_null, table_aggregates
+from uploader.app.lib.columns import float_column
+from uploader.app.lib.rawdata import rawdata_column_batches
 from uploader.app.storage import PgStorage
-from uploader.app.upload import handle_call
+from uploader.app.structured.catalog import CatalogBatch, ColumnBatch, catalog_request
+from uploader.app.structured.diff import CatalogDiff
+from uploader.app.structured.sample import DrySample, check_server_stats
+from uploader.app.structured.writer import StructuredWriter
 from uploader.clients.gen.client import adminapi
-from uploader.clients.gen.client.adminapi.api.default import save_structured_data
-from uploader.clients.gen.client.adminapi.models.save_structured_data_request import (
-    SaveStructuredDataRequest,
-)
 from uploader.clients.gen.client.adminapi.models.save_structured_data_request_units import (
     SaveStructuredDataRequestUnits,
 )
@@ -36,12 +38,15 @@ class _CzDistributionAccumulator:
     def __init__(self) -> None:
         self._counts = np.zeros(N_CZ_BINS, dtype=np.int64)
 
-    def add(self, cz_values: list[float]) -> None:
-        if not cz_values:
+    def add(self, cz_values: npt.NDArray[np.float64]) -> None:
+        if len(cz_values) == 0:
             return
-        batch_counts, _ = np.histogram(np.asarray(cz_values, dtype=np.float64), bins=CZ_BIN_EDGES)
+        batch_counts, _ = np.histogram(cz_values, bins=CZ_BIN_EDGES)
         self._counts += batch_counts.astype(np.int64)
 
+    def add_counts(self, counts: npt.NDArray[np.int64]) -> None:
+        self._counts += counts
+
     @property
     def total(self) -> int:
         return int(self._counts.sum())
@@ -54,16 +59,22 @@ class _CzDistributionAccumulator:
         cz_mean: float | None = None,
         cz_min: float | None = None,
         cz_max: float | None = None,
+        sample: DrySample | None = None,
     ) -> None:
         if self.total == 0:
             return
         centers = 0.5 * (CZ_BIN_EDGES[:-1] + CZ_BIN_EDGES[1:])
         widths = np.diff(CZ_BIN_EDGES)
         fig, ax = plt.subplots(figsize=CHART_FIGSIZE)
-        ax.bar(centers, self._counts, width=widths, align="center")
+        if sample is None:
+            ax.bar(centers, self._counts, width=widths, align="center")
+            ax.set_ylabel("Count")
+        else:
+            counts, low, high = sample.estimate_counts(self._counts)
+            ax.bar(centers, counts, width=widths, align="center", yerr=(counts - low, high - counts), ecolor="gray")
+            ax.set_ylabel(f"Estimated count ({sample.percent:.2f}% sample, 95% CI)")
         ax.set_yscale("log")
         ax.set_xlabel("cz (km/s)")
-        ax.set_ylabel("Count")
         ax.set_title("Redshift (cz) distribution")
         if cz_min is not None:
             ax.axvline(cz_min, color="gray", linestyle=":", linewidth=1)
@@ -75,6 +86,91 @@ class _CzDistributionAccumulator:
         report_func(report.image_event_from_figure(fig, caption=caption))
 
 
+class _CzStats:
+    """
+    Running min, max and sum of cz. NaN is skipped by min and max and propagates into the sum,
+    and the sum adds values one at a time in row order, as a plain loop over the rows would.
+    """
+
+    def __init__(self) -> None:
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.sum = 0.0
+
+    def add(self, cz_values: npt.NDArray[np.float64]) -> None:
+        if len(cz_values) == 0:
+            return
+        self.min = float(np.fmin.reduce(cz_values, initial=self.min))
+        self.max = float(np.fmax.reduce(cz_values, initial=self.max))
+        self.sum = float(np.cumsum(np.concatenate(([self.sum], cz_values)))[-1])
+
+
+def cz_column(values: Sequence[Any]) -> tuple[npt.NDArray[np.intp], npt.NDArray[np.float64]]:
+    """Indices of rows with a redshift and their cz in km/s."""
+    z, present = float_column(values)
+    (rows,) = np.nonzero(present)
+    return rows, z[rows] * C_KM_S
+
+
+class RedshiftTransformer:
+    catalog = "redshift"
+    columns = REDSHIFT_COLUMNS
+    units = REDSHIFT_UNITS
+
+    def __init__(self, z_column: str, z_error: float) -> None:
+        self.z_column = z_column
+        self.raw_columns = [z_column]
+        self.e_cz = float(z_error) * C_KM_S
+        self.stats = _CzStats()
+        self.distribution = _CzDistributionAccumulator()
+        self.uploaded = 0
+        self.skipped = 0
+
+    def transform(self, batch: ColumnBatch) -> CatalogBatch:
+        ids = batch["hyperleda_internal_id"]
+        rows, cz = cz_column(batch[self.z_column])
+        self.stats.add(cz)
+        self.distribution.add(cz)
+        self.uploaded += len(rows)
+        self.skipped += len(ids) - len(rows)
+        return CatalogBatch(
+            ids=[ids[i] for i in rows.tolist()],
+            data=[[cz_val, self.e_cz] for cz_val in cz.tolist()],
+        )
+
+    def details(self) -> str:
+        if self.uploaded == 0:
+            return ""
+        return f"cz {self.stats.min:.0f}..{self.stats.max:.0f} km/s, mean {self.stats.sum / self.uploaded:.0f} km/s"
+
+
+def _aggregate_on_server(storage: PgStorage, table_name: str, transformer: RedshiftTransformer) -> None:
+    """Fills the counts, cz statistics and distribution of `transformer` from one aggregate query."""
+    cz = sql.SQL("({} * {})").format(float_value(transformer.z_column), sql.Literal(C_KM_S))
+    has_z = not_null([transformer.z_column])
+    finite = sql.SQL("{} AND {} <> 'NaN'").format(has_z, cz)
+    totals, (counts,) = table_aggregates(
+        storage,
+        table_name,
+        {
+            "total": sql.SQL("COUNT(*)"),
+            "uploaded": sql.SQL("COUNT(*) FILTER (WHERE {})").format(has_z),
+            "cz_min": sql.SQL("MIN({}) FILTER (WHERE {})").format(cz, finite),
+            "cz_max": sql.SQL("MAX({}) FILTER (WHERE {})").format(cz, finite),
+            "cz_sum": sql.SQL("SUM({}) FILTER (WHERE {})").format(cz, has_z),
+        },
+        [Histogram([histogram_bin(cz, CZ_BIN_EDGES, has_z)], (N_CZ_BINS,))],
+    )
+    transformer.uploaded = int(totals["uploaded"])
+    transformer.skipped = int(totals["total"]) - transformer.uploaded
+    if totals["cz_min"] is not None:
+        transformer.stats.min = float(totals["cz_min"])
+        transformer.stats.max = float(totals["cz_max"])
+    if totals["cz_sum"] is not None:
+        transformer.stats.sum = float(totals["cz_sum"])
+    transformer.distribution.add_counts(counts)
+
+
 def upload_redshift(
     storage: PgStorage,
     table_name: str,
@@ -83,78 +179,80 @@ def upload_redshift(
     client: adminapi.AuthenticatedClient,
     *,
     write: bool = False,
+    sample_percent: float = 0.0,
+    sample_rows: int = 0,
+    server_stats: bool = False,
+    diff_tolerance: float | None = None,
     z_error: float,
     report_func: Callable[[report.Event], None],
 ) -> int:
-    uploaded = 0
-    skipped = 0
-    cz_min = float("inf")
-    cz_max = float("-inf")
-    cz_sum = 0.0
-    total_count = 0
-    cnt = storage.query(
-        sql.SQL("SELECT COUNT(*) AS cnt FROM rawdata.{}").format(sql.Identifier(table_name)),
-        (),
-    )
-    total_count = int(cnt[0]["cnt"]) if cnt else 0
-    processed_rows = 0
-    cz_dist = _CzDistributionAccumulator()
-
-    for rows in rawdata_batches(storage, table_name, [z_column], batch_size):
-        batch_ids: list[str] = []
-        batch_data: list[list[float]] = []
-        batch_cz: list[float] = []
-
-        for row in rows:
-            z_val = row[z_column]
-            if z_val is None:
-                skipped += 1
-                continue
-            cz_val = float(z_val) * C_KM_S
-            e_cz = float(z_error) * C_KM_S
-            batch_ids.append(row["hyperleda_internal_id"])
-            batch_data.append([cz_val, e_cz])
-            uploaded += 1
-            cz_min = min(cz_min, cz_val)
-            cz_max = max(cz_max, cz_val)
-            cz_sum += cz_val
-            batch_cz.append(cz_val)
-
-        cz_dist.add(batch_cz)
-
-        if write and batch_ids:
-            handle_call(
-                save_structured_data.sync_detailed(
-                    client=client,
-                    body=action_description.apply(
-                        SaveStructuredDataRequest(
-                            catalog="redshift",
-                            columns=REDSHIFT_COLUMNS,
-                            ids=batch_ids,
-                            data=batch_data,
-                            units=REDSHIFT_UNITS,
-                        ),
+    transformer = RedshiftTransformer(z_column, z_error)
+    cz_stats = transformer.stats
+    cz_dist = transformer.distribution
+
+    sample: DrySample | None = None
+    diff: CatalogDiff | None = None
+    if server_stats:
+        check_server_stats(
+            write=write,
+            sample_percent=sample_percent,
+            sample_rows=sample_rows,
+            diff=diff_tolerance is not None,
+        )
+        _aggregate_on_server(storage, table_name, transformer)
+    else:
+        total_count = 0
+        cnt = storage.query(
+            sql.SQL("SELECT COUNT(*) AS cnt FROM rawdata.{}").format(sql.Identifier(table_name)),
+            (),
+        )
+        total_count = int(cnt[0]["cnt"]) if cnt else 0
+        sample = DrySample.resolve(total_count, sample_percent, sample_rows, write=write)
+        scan_rows = total_count if sample is None else sample.expected_rows
+        processed_rows = 0
+        if diff_tolerance is not None:
+            diff = CatalogDiff.for_transformer(storage, transformer, diff_tolerance)
+
+        with StructuredWriter(client) as writer:
+            for batch in rawdata_column_batches(
+                storage,
+                table_name,
+                transformer.raw_columns,
+                batch_size,
+                sample_percent=None if sample is None else sample.percent,
+            ):
+                ids = batch["hyperleda_internal_id"]
+                catalog_batch = transformer.transform(batch)
+                uploaded = transformer.uploaded
+
+                if diff is not None:
+                    catalog_batch = diff.filter(catalog_batch)
+                if write and catalog_batch.ids:
+                    writer.submit(catalog_request(transformer, catalog_batch))
+
+                processed_rows += len(ids)
+                if sample is not None:
+                    sample.add(len(ids))
+                batch_pct = int(100 * processed_rows / scan_rows) if scan_rows else 0
+                report_func(report.ProgressEvent(percent=min(99, batch_pct)))
+                report_func(
+                    report.LogEvent(
+                        message=f"batch: rows_read={len(ids)} uploaded={uploaded} skipped={transformer.skipped} "
+                        f"pending_writes={writer.pending}",
                     ),
                 )
-            )
-
-        processed_rows += len(rows)
-        batch_pct = int(100 * processed_rows / total_count) if total_count else 0
-        report_func(report.ProgressEvent(percent=min(99, batch_pct)))
-        report_func(
-            report.LogEvent(
-                message=f"batch: rows_read={len(rows)} uploaded={uploaded} skipped={skipped}",
-            ),
-        )
-        if uploaded > 0:
-            cz_dist.emit_image(
-                report_func,
-                caption=f"cz distribution: {uploaded} rows",
-                cz_mean=cz_sum / uploaded,
-                cz_min=cz_min,
-                cz_max=cz_max,
-            )
+                if uploaded > 0:
+                    cz_dist.emit_image(
+                        report_func,
+                        caption=f"cz distribution: {uploaded} rows",
+                        cz_mean=cz_stats.sum / uploaded,
+                        cz_min=cz_stats.min,
+                        cz_max=cz_stats.max,
+                        sample=sample,
+                    )
 
+    uploaded = transformer.uploaded
+    skipped = transformer.skipped
     total = uploaded + skipped
 
     def row_pct_label(n: int) -> float:
@@ -165,11 +263,11 @@ def upload_redshift(
         ("Skipped (null)", skipped, row_pct_label(skipped)),
     ]
     if uploaded > 0:
-        cz_mean = cz_sum / uploaded
+        cz_mean = cz_stats.sum / uploaded
         table_rows.extend(
             [
-                ("cz min (km/s)", round(cz_min, 2), "-"),
-                ("cz max (km/s)", round(cz_max, 2), "-"),
+                ("cz min (km/s)", round(cz_stats.min, 2), "-"),
+                ("cz max (km/s)", round(cz_stats.max, 2), "-"),
                 ("cz mean (km/s)", round(cz_mean, 2), "-"),
             ]
         )
@@ -178,14 +276,19 @@ def upload_redshift(
         cz_dist.emit_image(
             report_func,
             caption=f"Final: {uploaded} rows",
-            cz_mean=cz_sum / uploaded,
-            cz_min=cz_min,
-            cz_max=cz_max,
+            cz_mean=cz_stats.sum / uploaded,
+            cz_min=cz_stats.min,
+            cz_max=cz_stats.max,
+            sample=sample,
         )
     summary = format_table(
         ("Status", "Count", "%"),
         table_rows,
         title=f"Total rows: {total}\n",
     )
+    if sample is not None:
+        summary += "\n\n" + sample.summary([("Uploaded", uploaded), ("Skipped (null)", skipped)])
+    if diff is not None:
+        summary += "\n\n" + diff.summary()
     report_func(report.DoneEvent(message=summary))
     return total
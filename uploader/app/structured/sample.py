@@ -0,0 +1,128 @@
+import dataclasses
+import math
+import time
+from typing import Self
+
+import numpy as np
+import numpy.typing as npt
+
+from uploader.app.display import format_table
+
+# normal quantile of the two-sided 95% confidence interval
+Z_95 = 1.96
+
+
+@dataclasses.dataclass
+class Estimate:
+    value: float
+    low: float
+    high: float
+
+
+@dataclasses.dataclass
+class DrySample:
+    """
+    Dry run over a Bernoulli sample of `percent` percent of the rows of a table of `table_rows` rows.
+    Counts of rows seen in the sample are extrapolated to the whole table with a 95% confidence interval
+    from the normal approximation of the sampled proportion, with the finite population correction.
+    """
+
+    percent: float
+    table_rows: int
+    rows: int = 0
+    started: float = dataclasses.field(default_factory=time.perf_counter)
+
+    @classmethod
+    def resolve(cls, table_rows: int, percent: float, rows: int, *, write: bool) -> Self | None:
+        """
+        Sample for the requested percent or number of rows, the latter taking precedence; None if the whole
+        table is to be read.
+        """
+        if percent <= 0 and rows <= 0:
+            return None
+        if write:
+            raise ValueError("Sampling is only available for dry runs")
+        if rows > 0:
+            percent = 100.0 * rows / table_rows if table_rows else 100.0
+        if percent >= 100:
+            return None
+        return cls(percent=percent, table_rows=table_rows)
+
+    @property
+    def expected_rows(self) -> int:
+        return max(1, round(self.table_rows * self.percent / 100))
+
+    def add(self, rows: int) -> None:
+        self.rows += rows
+
+    def estimate(self, count: int) -> Estimate:
+        """Number of table rows estimated from `count` of the sampled rows."""
+        value, low, high = self._proportion(np.array([count], dtype=np.float64))
+        return Estimate(float(value[0]), float(low[0]), float(high[0]))
+
+    def estimate_counts(
+        self, counts: npt.NDArray[np.int64]
+    ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        """Estimated table counts with their lower and upper bounds, for every bin of a histogram of sampled rows."""
+        return self._proportion(counts.astype(np.float64))
+
+    def _proportion(
+        self, counts: npt.NDArray[np.float64]
+    ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        if self.rows == 0:
+            zeros = np.zeros_like(counts)
+            return zeros, zeros, zeros
+        n = self.rows
+        p = counts / n
+        correction = max(0.0, 1 - n / self.table_rows) if self.table_rows else 0.0
+        margin = Z_95 * np.sqrt(p * (1 - p) / n * correction)
+        total = max(self.table_rows, n)
+        return (
+            p * total,
+            np.clip(p - margin, 0, 1) * total,
+            np.clip(p + margin, 0, 1) * total,
+        )
+
+    def full_run_seconds(self) -> float:
+        """Time the full table would take at the throughput of the sample, not counting writes."""
+        elapsed = time.perf_counter() - self.started
+        if self.rows == 0:
+            return math.nan
+        return elapsed * self.table_rows / self.rows
+
+    def summary(self, counts: list[tuple[str, int]]) -> str:
+        rows: list[tuple[str, int, int, str, str]] = []
+        for label, count in counts:
+            est = self.estimate(count)
+            pct = 100.0 * est.value / self.table_rows if self.table_rows else 0.0
+            pct_low = 100.0 * est.low / self.table_rows if self.table_rows else 0.0
+            pct_high = 100.0 * est.high / self.table_rows if self.table_rows else 0.0
+            rows.append(
+                (
+                    label,
+                    count,
+                    round(est.value),
+                    f"{round(est.low)} - {round(est.high)}",
+                    f"{pct:.1f}% ({pct_low:.1f} - {pct_high:.1f}%)",
+                )
+            )
+        return format_table(
+            ("Status", "In sample", "Estimated", "95% CI", "% of table"),
+            rows,
+            title=(
+                f"Sampled dry run: {self.rows} of {self.table_rows} rows ({self.percent:.2f}%). "
+                f"Reading and processing the full table would take about {self.full_run_seconds():.0f} s "
+                "(writes not included).\n"
+            ),
+            right_align_last_n=4,
+            percent_last_column=False,
+        )
+
+
+def check_server_stats(*, write: bool, sample_percent: float, sample_rows: int, diff: bool = False) -> None:
+    if write:
+        raise ValueError("Server-side statistics are only available for dry runs")
+    if sample_percent > 0 or sample_rows > 0:
+        raise ValueError("Server-side statistics read the whole table and cannot be combined with a sample")
+    if diff:
+        raise ValueError("Server-side statistics do not read the rows and cannot be compared with stored values")
@@ -0,0 +1,72 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Self
+
+from uploader.app.structured.catalog import save_catalog
+from uploader.clients.gen.client import adminapi
+from uploader.clients.gen.client.adminapi.models.save_structured_data_request import (
+    SaveStructuredDataRequest,
+)
+
+DEFAULT_MAX_IN_FLIGHT = 4
+
+
+class StructuredWriter:
+    """
+    Write-behind for save_structured_data. Requests are sent from worker threads that share the client's
+    HTTP connection pool while the caller goes on reading the next batch. At most `max_in_flight` requests
+    wait for acknowledgement at a time; `submit` blocks while the limit is reached.
+
+    A failed request fails the run: its error is raised from the next `submit`, `flush` or from leaving the
+    `with` block, and requests not yet sent are dropped. Request bodies are built by the caller, so
+    `action_description` is applied on the task's own thread.
+    """
+
+    def __init__(self, client: adminapi.AuthenticatedClient, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT) -> None:
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.acknowledged = 0
+        self._in_flight: set[Future[None]] = set()
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="structured-writer")
+        # the pooled client is created lazily; create it here so that workers do not race to create their own
+        client.get_httpx_client()
+
+    @property
+    def pending(self) -> int:
+        """Number of submitted requests that were not acknowledged yet."""
+        return sum(1 for future in self._in_flight if not future.done())
+
+    def submit(self, body: SaveStructuredDataRequest) -> None:
+        self._collect()
+        while len(self._in_flight) >= self.max_in_flight:
+            wait(self._in_flight, return_when=FIRST_COMPLETED)
+            self._collect()
+        self._in_flight.add(self._executor.submit(save_catalog, self.client, body))
+
+    def flush(self) -> None:
+        """Waits until every submitted request is acknowledged."""
+        while self._in_flight:
+            wait(self._in_flight, return_when=FIRST_COMPLETED)
+            self._collect()
+
+    def close(self, *, cancel: bool = False) -> None:
+        try:
+            if not cancel:
+                self.flush()
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._in_flight.clear()
+
+    def _collect(self) -> None:
+        done = {future for future in self._in_flight if future.done()}
+        self._in_flight -= done
+        for future in done:
+            future.result()
+            self.acknowledged += 1
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, *exc: object) -> None:
+        self.close(cancel=exc_type is not None)
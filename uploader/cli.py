@@ -11,6 +11,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import ValidationError
 
+from uploader.app.exports import resolve_export
+from uploader.forms.crossmatch_lookup import CrossmatchLookupRequest, handle_crossmatch_lookup
 from uploader.history import load_history
 from uploader.task_registry import register_all_tasks
 from uploader.tasks import TASKS, cancel_run, get_run, start_task
@@ -101,6 +103,24 @@ def cancel_task_run(run_id: str) -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.post("/api/crossmatch/lookup")
+def crossmatch_lookup(body: CrossmatchLookupRequest) -> dict[str, Any]:
+    try:
+        return handle_crossmatch_lookup(body)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+    except RuntimeError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+
+
+@app.get("/api/exports/{name}")
+def download_export(name: str) -> FileResponse:
+    path = resolve_export(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown export")
+    return FileResponse(path=path, filename=path.name)
+
+
 if STATIC_DIR.is_dir():
 
     @app.get("/{full_path:path}")
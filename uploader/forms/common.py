@@ -56,3 +56,58 @@ class BibcodeField(BaseTextField):
             description=description,
             pattern=r"^$|^\d{4}[A-Za-z0-9.&]{14}[A-Za-z0-9]$",
         )
+
+
+class SamplePercentField:
+    def __new__(cls) -> FieldInfo:
+        return Field(
+            default=0.0,
+            title="Dry-run sample (%)",
+            description="Dry run only: read a random sample of this percent of the table and extrapolate "
+            "the statistics to the whole table. 0 reads the whole table.",
+            ge=0,
+            le=100,
+        )
+
+
+class SampleRowsField:
+    def __new__(cls) -> FieldInfo:
+        return Field(
+            default=0,
+            title="Dry-run sample (rows)",
+            description="Dry run only: read a random sample of about this many rows instead of a percent. "
+            "0 uses the percent above.",
+            ge=0,
+        )
+
+
+class ServerStatsField:
+    def __new__(cls, *, additional_description: str = "") -> FieldInfo:
+        description = (
+            "Dry run only: compute the summary and charts with one aggregate query in the database "
+            "instead of reading every row."
+        )
+        if additional_description:
+            description = f"{description} {additional_description}"
+        return Field(default=False, title="Server-side statistics", description=description)
+
+
+class SkipUnchangedField:
+    def __new__(cls) -> FieldInfo:
+        return Field(
+            default=False,
+            title="Skip unchanged values",
+            description="Compare every batch with the values already stored for its objects and send only "
+            "new and changed rows. In a dry run, only count them.",
+        )
+
+
+class DiffToleranceField:
+    def __new__(cls) -> FieldInfo:
+        return Field(
+            default=1e-9,
+            title="Diff tolerance",
+            description="Numbers differing from the stored ones by less than this, absolute or relative, "
+            "are unchanged.",
+            ge=0,
+        )
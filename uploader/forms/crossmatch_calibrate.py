@@ -0,0 +1,44 @@
+from collections.abc import Callable
+from typing import Literal, cast
+from urllib.parse import quote_plus
+
+from psycopg import connect
+from pydantic import BaseModel, Field
+
+import uploader.app.report as report
+from uploader.app.crossmatch import run_radius_calibration
+from uploader.app.endpoints import db_dsn_map
+from uploader.app.storage import PgStorage
+from uploader.credentials import load_credentials
+
+
+class CrossmatchCalibrateForm(BaseModel):
+    endpoint: Literal["dev", "test", "prod"] = Field(default="prod", title="API endpoint")
+    table_name: str = Field(..., title="Table name")
+    sample_size: int = Field(default=5000, title="Sampled records", ge=100, le=200_000)
+    max_radius: float = Field(
+        default=60,
+        title="Largest separation in arcseconds",
+        description="Should be several times the expected radius so that the chance-neighbor tail can be fitted.",
+        gt=0,
+    )
+
+
+def handle_crossmatch_calibrate(
+    form: BaseModel,
+    report_func: Callable[[report.Event], None],
+) -> None:
+    f = cast(CrossmatchCalibrateForm, form)
+    db_user, db_password = load_credentials()
+    dsn = db_dsn_map[f.endpoint].format(
+        user=quote_plus(db_user),
+        password=quote_plus(db_password),
+    )
+    with connect(dsn) as conn:
+        run_radius_calibration(
+            PgStorage(conn),
+            f.table_name.strip(),
+            f.sample_size,
+            f.max_radius / 3600.0,
+            report_func,
+        )
@@ -1,3 +1,4 @@
+import pathlib
 from collections.abc import Callable
 from typing import Literal, cast
 from urllib.parse import quote_plus
@@ -7,13 +8,37 @@ from pydantic import BaseModel, Field
 
 import uploader.app.report as report
 from uploader.app.crossmatch import run_crossmatch as run_crossmatch_cmd
+from uploader.app.crossmatch import run_incremental_crossmatch
 from uploader.app.crossmatch.resolver import LayeredResolver
 from uploader.app.endpoints import db_dsn_map, env_map
+from uploader.app.exports import export_path
+from uploader.app.lib.batching import AdaptiveBatchSizer
 from uploader.app.storage import PgStorage
 from uploader.clients.gen.client import adminapi
 from uploader.credentials import load_credentials, load_token
 
 
+class CrossmatchVariant(BaseModel):
+    radius: float = Field(..., title="Search radius in arcseconds", gt=0)
+    redshift_tolerance: float = Field(
+        default=0,
+        title="Redshift tolerance",
+        description="Tolerance for redshift matching; will not use redshift for cross-identification if left empty",
+        ge=0,
+    )
+
+
+def build_variant_resolvers(variants: list[CrossmatchVariant], pgc_column: str | None) -> list[LayeredResolver]:
+    return [
+        LayeredResolver(
+            radius_deg=v.radius / 3600.0,
+            pgc_column=pgc_column,
+            redshift_tolerance=v.redshift_tolerance if v.redshift_tolerance > 0 else None,
+        )
+        for v in variants
+    ]
+
+
 class CrossmatchLayeredForm(BaseModel):
     endpoint: Literal["dev", "test", "prod"] = Field(default="prod", title="API endpoint")
     table_name: str = Field(..., title="Table name")
@@ -30,9 +55,69 @@ class CrossmatchLayeredForm(BaseModel):
         description="Tolerance for redshift matching; will not use redshift for cross-identification if left empty",
         ge=0,
     )
+    variants: list[CrossmatchVariant] = Field(
+        default_factory=list,
+        title="Additional configurations",
+        description="Evaluated in the same scan for comparison; only the main configuration is written.",
+    )
     batch_size: int = Field(default=10000, title="Batch size", ge=1, le=500_000)
-    print_pending: bool = Field(default=False, title="Log pending cases")
+    adaptive_batch_size: bool = Field(
+        default=False,
+        title="Adaptive batch size",
+        description="Resize batches after each one to meet the candidate row and time targets; "
+        "batch size is used for the first batch.",
+    )
+    target_batch_rows: int = Field(default=200_000, title="Target candidate rows per batch", ge=1)
+    target_batch_seconds: float = Field(default=30, title="Target query seconds per batch", gt=0)
+    min_batch_size: int = Field(default=1000, title="Minimum batch size", ge=1, le=500_000)
+    max_batch_size: int = Field(default=500_000, title="Maximum batch size", ge=1, le=500_000)
+    designation_index_mb: int = Field(
+        default=512,
+        title="Designation index memory limit, MB",
+        description="Keep layer2 designations in memory for the run if they fit; "
+        "looked up for each batch if left at 0 or if they do not fit.",
+        ge=0,
+    )
+    export_pending: bool = Field(
+        default=False,
+        title="Export pending cases",
+        description="Write pending records with their candidates to a downloadable file.",
+    )
     write: bool = Field(default=False, title="Write to API")
+    write_changed_only: bool = Field(
+        default=False,
+        title="Write changed results only",
+        description="Skip records whose stored crossmatch status, PGC, possible matches and triage are unchanged.",
+    )
+    capture_path: str = Field(
+        default="",
+        title="Evidence capture file",
+        description="Local file to stream crossmatch evidence to for offline replay; disabled if left empty.",
+    )
+    capture_radius: float = Field(
+        default=0,
+        title="Capture radius in arcseconds",
+        description="Largest radius of interest for replay; search radius is used if smaller.",
+        ge=0,
+    )
+    self_match: bool = Field(
+        default=False,
+        title="Flag duplicates within table",
+        description="Match the table against itself first and leave new objects with another record "
+        "of the table within the radius for manual check.",
+    )
+    state_path: str = Field(
+        default="",
+        title="Crossmatch state file",
+        description="Local file with per-record fingerprints of the last run that wrote results; "
+        "dry runs do not update it. Disabled if left empty.",
+    )
+    incremental: bool = Field(
+        default=False,
+        title="Incremental",
+        description="Only re-resolve records whose neighborhood or name matches changed since the run "
+        "recorded in the state file.",
+    )
 
 
 def handle_crossmatch_layered(
@@ -49,20 +134,67 @@ def handle_crossmatch_layered(
         base_url=env_map[f.endpoint],
         token=load_token(),
     )
+    pgc_column = f.pgc_column.strip() or None
     resolver = LayeredResolver(
         radius_deg=f.radius / 3600.0,
-        pgc_column=f.pgc_column.strip() or None,
+        pgc_column=pgc_column,
         redshift_tolerance=f.redshift_tolerance if f.redshift_tolerance > 0 else None,
     )
+    batch_sizer = (
+        AdaptiveBatchSizer(
+            initial_size=f.batch_size,
+            min_size=f.min_batch_size,
+            max_size=f.max_batch_size,
+            target_rows=f.target_batch_rows,
+            target_seconds=f.target_batch_seconds,
+        )
+        if f.adaptive_batch_size
+        else None
+    )
+    state_path = pathlib.Path(f.state_path.strip()) if f.state_path.strip() else None
+    pending_path = export_path("pending", ".csv.gz") if f.export_pending else None
+    designation_index_max_bytes = f.designation_index_mb * 2**20 if f.designation_index_mb > 0 else None
+    if f.incremental and state_path is None:
+        raise ValueError("Incremental crossmatch requires a state file")
+    if f.incremental and f.self_match:
+        raise ValueError("Incremental crossmatch does not support flagging duplicates within table")
+    if f.incremental and f.variants:
+        raise ValueError("Incremental crossmatch does not support additional configurations")
+    if f.incremental and f.capture_path.strip():
+        raise ValueError("Incremental crossmatch does not support evidence capture")
+    if f.incremental and f.adaptive_batch_size:
+        raise ValueError("Incremental crossmatch does not support adaptive batch size")
     with connect(dsn) as conn:
         storage = PgStorage(conn)
+        if f.incremental and state_path is not None:
+            run_incremental_crossmatch(
+                storage,
+                f.table_name.strip(),
+                f.batch_size,
+                client,
+                resolver,
+                report_func,
+                state_path,
+                pending_path=pending_path,
+                write=f.write,
+                write_changed_only=f.write_changed_only,
+                designation_index_max_bytes=designation_index_max_bytes,
+            )
+            return
         run_crossmatch_cmd(
             storage,
             f.table_name.strip(),
             f.batch_size,
             client,
-            resolver=resolver,
-            print_pending=f.print_pending,
+            resolvers=[resolver, *build_variant_resolvers(f.variants, pgc_column)],
+            pending_path=pending_path,
             write=f.write,
             report_func=report_func,
+            capture_path=pathlib.Path(f.capture_path.strip()) if f.capture_path.strip() else None,
+            capture_radius_deg=f.capture_radius / 3600.0 if f.capture_radius > 0 else None,
+            state_path=state_path,
+            write_changed_only=f.write_changed_only,
+            batch_sizer=batch_sizer,
+            self_match=f.self_match,
+            designation_index_max_bytes=designation_index_max_bytes,
         )
@@ -0,0 +1,72 @@
+import contextlib
+import time
+from collections.abc import Iterator
+from typing import Any, Literal
+from urllib.parse import quote_plus
+
+from psycopg import connect
+from pydantic import BaseModel, Field
+
+from uploader.app.crossmatch.batch import C_M_S
+from uploader.app.crossmatch.lookup import fetch_record_evidence, get_layer2_index, resolve_evidence
+from uploader.app.crossmatch.resolver import LayeredResolver
+from uploader.app.endpoints import db_dsn_map
+from uploader.app.storage import PgStorage
+from uploader.credentials import load_credentials
+
+
+class CrossmatchLookupRequest(BaseModel):
+    endpoint: Literal["dev", "test", "prod"] = Field(default="prod", title="API endpoint")
+    record_id: str = Field(default="", title="Record ID")
+    ra: float | None = Field(default=None, title="Right ascension in degrees", ge=0, lt=360)
+    dec: float | None = Field(default=None, title="Declination in degrees", ge=-90, le=90)
+    name: str = Field(default="", title="Designation")
+    cz: float | None = Field(default=None, title="Radial velocity in m/s")
+    type_name: str = Field(default="", title="Object type")
+    pgc: int | None = Field(default=None, title="Claimed PGC")
+    radius: float = Field(..., title="Search radius in arcseconds", gt=0)
+    pgc_column: str = Field(default="", title="PGC column")
+    redshift_tolerance: float = Field(default=0, title="Redshift tolerance", ge=0)
+    refresh_index: bool = Field(default=False, title="Reload layer2 index")
+
+
+@contextlib.contextmanager
+def _storage(endpoint: str) -> Iterator[PgStorage]:
+    db_user, db_password = load_credentials()
+    dsn = db_dsn_map[endpoint].format(
+        user=quote_plus(db_user),
+        password=quote_plus(db_password),
+    )
+    with connect(dsn) as conn:
+        yield PgStorage(conn)
+
+
+def handle_crossmatch_lookup(request: CrossmatchLookupRequest) -> dict[str, Any]:
+    record_id = request.record_id.strip()
+    if not record_id and (request.ra is None or request.dec is None) and not request.name.strip():
+        raise ValueError("Either a record ID, a position or a designation is required")
+
+    index = get_layer2_index(request.endpoint, lambda: _storage(request.endpoint), refresh=request.refresh_index)
+    started = time.perf_counter()
+    pgc_column = request.pgc_column.strip() or None
+    resolver = LayeredResolver(
+        radius_deg=request.radius / 3600.0,
+        pgc_column=pgc_column,
+        redshift_tolerance=request.redshift_tolerance if request.redshift_tolerance > 0 else None,
+    )
+    if record_id:
+        with _storage(request.endpoint) as storage:
+            evidence = fetch_record_evidence(storage, index, record_id, resolver.search_radius_deg, pgc_column)
+    else:
+        evidence = index.evidence(
+            resolver.search_radius_deg,
+            ra=request.ra,
+            dec=request.dec,
+            design=request.name.strip() or None,
+            redshift=request.cz / C_M_S if request.cz is not None else None,
+            type_name=request.type_name.strip() or None,
+            record_pgc=request.pgc,
+        )
+    response = resolve_evidence(resolver, evidence)
+    response["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return response
@@ -0,0 +1,48 @@
+import pathlib
+from collections.abc import Callable
+from typing import cast
+
+from pydantic import BaseModel, Field
+
+import uploader.app.report as report
+from uploader.app.crossmatch import run_replay as run_replay_cmd
+from uploader.app.crossmatch.capture import read_header
+from uploader.app.crossmatch.resolver import LayeredResolver
+from uploader.forms.crossmatch_layered import CrossmatchVariant, build_variant_resolvers
+
+
+class CrossmatchReplayForm(BaseModel):
+    capture_path: str = Field(..., title="Evidence capture file")
+    radius: float = Field(..., title="Search radius in arcseconds", gt=0)
+    use_pgc: bool = Field(
+        default=True,
+        title="Use claimed PGC",
+        description="Use PGC numbers from the column selected at capture time for cross-identification.",
+    )
+    redshift_tolerance: float = Field(
+        default=0,
+        title="Redshift tolerance",
+        description="Tolerance for redshift matching; will not use redshift for cross-identification if left empty",
+        ge=0,
+    )
+    variants: list[CrossmatchVariant] = Field(
+        default_factory=list,
+        title="Additional configurations",
+        description="Replayed in the same pass over the evidence file for comparison.",
+    )
+
+
+def handle_crossmatch_replay(
+    form: BaseModel,
+    report_func: Callable[[report.Event], None],
+) -> None:
+    f = cast(CrossmatchReplayForm, form)
+    capture_path = pathlib.Path(f.capture_path.strip())
+    header = read_header(capture_path)
+    pgc_column = header.pgc_column if f.use_pgc else None
+    resolver = LayeredResolver(
+        radius_deg=f.radius / 3600.0,
+        pgc_column=pgc_column,
+        redshift_tolerance=f.redshift_tolerance if f.redshift_tolerance > 0 else None,
+    )
+    run_replay_cmd(capture_path, [resolver, *build_variant_resolvers(f.variants, pgc_column)], report_func)
@@ -0,0 +1,39 @@
+from collections.abc import Callable
+from typing import Literal, cast
+from urllib.parse import quote_plus
+
+from psycopg import connect
+from pydantic import BaseModel, Field
+
+import uploader.app.report as report
+from uploader.app.crossmatch import run_self_match
+from uploader.app.endpoints import db_dsn_map
+from uploader.app.storage import PgStorage
+from uploader.credentials import load_credentials
+
+
+class CrossmatchSelfMatchForm(BaseModel):
+    endpoint: Literal["dev", "test", "prod"] = Field(default="prod", title="API endpoint")
+    table_name: str = Field(..., title="Table name")
+    radius: float = Field(..., title="Search radius in arcseconds", gt=0)
+    max_groups: int = Field(default=20, title="Duplicate groups to list", ge=0)
+
+
+def handle_crossmatch_selfmatch(
+    form: BaseModel,
+    report_func: Callable[[report.Event], None],
+) -> None:
+    f = cast(CrossmatchSelfMatchForm, form)
+    db_user, db_password = load_credentials()
+    dsn = db_dsn_map[f.endpoint].format(
+        user=quote_plus(db_user),
+        password=quote_plus(db_password),
+    )
+    with connect(dsn) as conn:
+        run_self_match(
+            PgStorage(conn),
+            f.table_name.strip(),
+            f.radius / 3600.0,
+            report_func,
+            max_groups=f.max_groups,
+        )
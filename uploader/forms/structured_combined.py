@@ -0,0 +1,201 @@
+import pathlib
+from collections.abc import Callable
+from typing import Literal, cast
+from urllib.parse import quote_plus
+
+from psycopg import connect
+from pydantic import BaseModel, Field
+
+import uploader.app.report as report
+import uploader.forms.common as common
+from uploader.app.endpoints import db_dsn_map, env_map
+from uploader.app.storage import PgStorage
+from uploader.app.structured.catalog import CatalogTransformer
+from uploader.app.structured.combined import upload_structured
+from uploader.app.structured.designations.cache import open_normalizer
+from uploader.app.structured.designations.upload import DesignationTransformer
+from uploader.app.structured.icrs.upload import IcrsTransformer
+from uploader.app.structured.nature.upload import NatureTransformer
+from uploader.app.structured.photometry.upload import PhotometryTransformer
+from uploader.app.structured.redshift.upload import RedshiftTransformer
+from uploader.clients.gen.client import adminapi
+from uploader.credentials import load_credentials, load_token
+from uploader.forms.structured_nature import _parse_type_mappings
+
+
+class CombinedDesignationSettings(BaseModel):
+    column_name: str = Field(
+        default="",
+        title="Object name column",
+        description="Name of the column that represents object designation in the table. Skipped if left empty.",
+    )
+    cache_size: int = Field(
+        default=100_000,
+        title="Name cache size",
+        description="Number of recently normalized names kept in memory; 0 disables the cache.",
+        ge=0,
+    )
+    cache_path: str = Field(
+        default="",
+        title="Persistent name cache",
+        description="Local file that keeps normalized names between runs; it is reset when the rules change. "
+        "Disabled if left empty.",
+    )
+
+
+class CombinedIcrsSettings(BaseModel):
+    ra_column: str = Field(
+        default="",
+        title="RA column",
+        description="Column containing right ascension. Skipped if left empty.",
+    )
+    dec_column: str = Field(default="", title="Dec column", description="Column containing declination.")
+    e_ra: str = Field(default="", title="e_ra", description="Expression. Positional error for RA.")
+    e_dec: str = Field(default="", title="e_dec", description="Expression. Positional error for Dec.")
+
+
+class CombinedNatureSettings(BaseModel):
+    column_name: str = Field(
+        default="",
+        title="Type column",
+        description="Column with object type; leave empty if every row uses default type only.",
+    )
+    default_type: str = Field(
+        default="",
+        title="Default LEDA type",
+        description="LEDA type when column is empty or value unmapped. Skipped if both this and the column are empty.",
+    )
+    type_mappings: list[str] = Field(
+        default_factory=list,
+        title="Type mappings",
+        description='Each entry "raw_value:leda_type" (e.g. G:galaxy).',
+    )
+
+
+class CombinedRedshiftSettings(BaseModel):
+    z_column: str = Field(
+        default="",
+        title="z column",
+        description="Column with redshift z. Skipped if left empty.",
+    )
+    z_error: float = Field(default=0.0, title="z error", description="Fixed error on z (same for all rows).")
+
+
+class CombinedPhotometrySettings(BaseModel):
+    enabled: bool = Field(
+        default=False,
+        title="Upload HyperLEDA photometry",
+        description="Upload U/B/V/I/K asymptotic magnitudes from the ut/bt/vt/it/kt columns and their errors.",
+    )
+
+
+class StructuredCombinedAdvancedSettings(BaseModel):
+    endpoint: Literal["dev", "test", "prod"] = Field(default="prod", title="API endpoint")
+    batch_size: int = Field(default=10000, title="Batch size", ge=1, le=500_000)
+    sample_percent: float = common.SamplePercentField()
+    sample_rows: int = common.SampleRowsField()
+    skip_unchanged: bool = common.SkipUnchangedField()
+    diff_tolerance: float = common.DiffToleranceField()
+
+
+class StructuredCombinedForm(BaseModel):
+    table_name: str = Field(..., title="Rawdata table name")
+    designation: CombinedDesignationSettings = Field(
+        default_factory=CombinedDesignationSettings,
+        title="Designations",
+    )
+    icrs: CombinedIcrsSettings = Field(default_factory=CombinedIcrsSettings, title="ICRS")
+    nature: CombinedNatureSettings = Field(default_factory=CombinedNatureSettings, title="Nature")
+    redshift: CombinedRedshiftSettings = Field(default_factory=CombinedRedshiftSettings, title="Redshift")
+    photometry: CombinedPhotometrySettings = Field(
+        default_factory=CombinedPhotometrySettings,
+        title="Photometry (HyperLEDA)",
+    )
+    write: bool = Field(
+        default=False,
+        title="Write to API",
+        description="If enabled, upload results; otherwise dry-run (statistics only).",
+    )
+    advanced: StructuredCombinedAdvancedSettings = Field(
+        default_factory=StructuredCombinedAdvancedSettings,
+        title="Advanced settings",
+    )
+
+
+def _transformers(
+    f: StructuredCombinedForm,
+    client: adminapi.AuthenticatedClient,
+) -> list[CatalogTransformer]:
+    table_name = f.table_name.strip()
+    transformers: list[CatalogTransformer] = []
+
+    if f.icrs.ra_column.strip() or f.icrs.dec_column.strip():
+        if not (f.icrs.ra_column.strip() and f.icrs.dec_column.strip()):
+            raise ValueError("Both RA and Dec columns must be set for ICRS.")
+        if not (f.icrs.e_ra.strip() and f.icrs.e_dec.strip()):
+            raise ValueError("Both e_ra and e_dec expressions must be set for ICRS.")
+        expressions = {"e_ra": f.icrs.e_ra.strip(), "e_dec": f.icrs.e_dec.strip()}
+        transformers.append(
+            IcrsTransformer.create(client, table_name, f.icrs.ra_column.strip(), f.icrs.dec_column.strip(), expressions)
+        )
+
+    nature_column = f.nature.column_name.strip() or None
+    default_type = f.nature.default_type.strip() or None
+    if nature_column is not None or default_type is not None:
+        transformers.append(
+            NatureTransformer(nature_column, _parse_type_mappings(f.nature.type_mappings), default_type)
+        )
+
+    if f.redshift.z_column.strip():
+        transformers.append(RedshiftTransformer(f.redshift.z_column.strip(), f.redshift.z_error))
+
+    if f.photometry.enabled:
+        transformers.append(PhotometryTransformer())
+
+    designation_column = f.designation.column_name.strip()
+    if not (transformers or designation_column):
+        raise ValueError("Select at least one catalog to upload.")
+
+    # opened last so that nothing above can fail and leave the normalizer open
+    if designation_column:
+        cache_path = f.designation.cache_path.strip()
+        normalizer = open_normalizer(f.designation.cache_size, pathlib.Path(cache_path) if cache_path else None)
+        transformers.insert(0, DesignationTransformer(designation_column, normalizer))
+    return transformers
+
+
+def handle_structured_combined(
+    form: BaseModel,
+    report_func: Callable[[report.Event], None],
+) -> None:
+    f = cast(StructuredCombinedForm, form)
+    advanced = f.advanced
+    db_user, db_password = load_credentials()
+    dsn = db_dsn_map[advanced.endpoint].format(
+        user=quote_plus(db_user),
+        password=quote_plus(db_password),
+    )
+    client = adminapi.AuthenticatedClient(
+        base_url=env_map[advanced.endpoint],
+        token=load_token(),
+    )
+    transformers = _transformers(f, client)
+    try:
+        with connect(dsn) as conn:
+            storage = PgStorage(conn)
+            upload_structured(
+                storage,
+                f.table_name.strip(),
+                transformers,
+                advanced.batch_size,
+                client,
+                write=f.write,
+                sample_percent=advanced.sample_percent,
+                sample_rows=advanced.sample_rows,
+                diff_tolerance=advanced.diff_tolerance if advanced.skip_unchanged else None,
+                report_func=report_func,
+            )
+    finally:
+        for transformer in transformers:
+            if isinstance(transformer, DesignationTransformer):
+                transformer.normalizer.close()
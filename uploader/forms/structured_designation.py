@@ -1,3 +1,4 @@
+import pathlib
 from collections.abc import Callable
 from typing import Literal, cast
 from urllib.parse import quote_plus
@@ -6,6 +7,7 @@ from psycopg import connect
 from pydantic import BaseModel, Field
 
 import uploader.app.report as report
+import uploader.forms.common as common
 from uploader.app.endpoints import db_dsn_map, env_map
 from uploader.app.storage import PgStorage
 from uploader.app.structured.designations import upload_designations as run_upload_designations
@@ -16,11 +18,41 @@ from uploader.credentials import load_credentials, load_token
 class StructuredDesignationAdvancedSettings(BaseModel):
     endpoint: Literal["dev", "test", "prod"] = Field(default="prod", title="API endpoint")
     batch_size: int = Field(default=10000, title="Batch size", ge=1, le=500_000)
+    sample_percent: float = common.SamplePercentField()
+    sample_rows: int = common.SampleRowsField()
+    skip_unchanged: bool = common.SkipUnchangedField()
+    diff_tolerance: float = common.DiffToleranceField()
     print_unmatched: bool = Field(
         default=False,
         title="Log unmatched names",
         description="Append each unmatched name to the log stream.",
     )
+    cache_size: int = Field(
+        default=100_000,
+        title="Name cache size",
+        description="Number of recently normalized names kept in memory; 0 disables the cache.",
+        ge=0,
+    )
+    cache_path: str = Field(
+        default="",
+        title="Persistent name cache",
+        description="Local file that keeps normalized names between runs; it is reset when the rules change. "
+        "Disabled if left empty.",
+    )
+    workers: int = Field(
+        default=1,
+        title="Worker processes",
+        description="Processes that normalize names in parallel; batches may be saved out of table order.",
+        ge=1,
+        le=64,
+    )
+    profile_rules: bool = Field(
+        default=False,
+        title="Profile rules",
+        description="Record attempts, hits and regex time of every rule and report rules that only match "
+        "names an earlier rule already took. Names are then normalized in a single process and the name caches "
+        "are not used, so every distinct name of each batch is profiled.",
+    )
 
 
 class StructuredDesignationForm(BaseModel):
@@ -66,5 +98,12 @@ def handle_structured_designation(
             client,
             write=f.write,
             print_unmatched=advanced.print_unmatched,
+            cache_size=advanced.cache_size,
+            cache_path=pathlib.Path(advanced.cache_path.strip()) if advanced.cache_path.strip() else None,
+            workers=advanced.workers,
+            profile_rules=advanced.profile_rules,
+            sample_percent=advanced.sample_percent,
+            sample_rows=advanced.sample_rows,
+            diff_tolerance=advanced.diff_tolerance if advanced.skip_unchanged else None,
             report_func=report_func,
         )
@@ -6,6 +6,7 @@ from psycopg import connect
 from pydantic import BaseModel, Field
 
 import uploader.app.report as report
+import uploader.forms.common as common
 from uploader.app.endpoints import db_dsn_map, env_map
 from uploader.app.storage import PgStorage
 from uploader.app.structured.icrs import upload_icrs as run_upload_icrs
@@ -16,6 +17,11 @@ from uploader.credentials import load_credentials, load_token
 class StructuredIcrsAdvancedSettings(BaseModel):
     endpoint: Literal["dev", "test", "prod"] = Field(default="prod", title="API endpoint")
     batch_size: int = Field(default=10000, title="Batch size", ge=1, le=500_000)
+    sample_percent: float = common.SamplePercentField()
+    sample_rows: int = common.SampleRowsField()
+    server_stats: bool = common.ServerStatsField(additional_description="Error expressions are not evaluated.")
+    skip_unchanged: bool = common.SkipUnchangedField()
+    diff_tolerance: float = common.DiffToleranceField()
 
 
 class StructuredIcrsForm(BaseModel):
@@ -65,5 +71,9 @@ def handle_structured_icrs(
             advanced.batch_size,
             client,
             write=f.write,
+            sample_percent=advanced.sample_percent,
+            sample_rows=advanced.sample_rows,
+            server_stats=advanced.server_stats,
+            diff_tolerance=advanced.diff_tolerance if advanced.skip_unchanged else None,
             report_func=report_func,
         )
@@ -6,6 +6,7 @@ from psycopg import connect
 from pydantic import BaseModel, Field
 
 import uploader.app.report as report
+import uploader.forms.common as common
 from uploader.app.endpoints import db_dsn_map, env_map
 from uploader.app.storage import PgStorage
 from uploader.app.structured.photometry.upload import (
@@ -18,6 +19,8 @@ from uploader.credentials import load_credentials, load_token
 class StructuredPhotometryHyperledaAdvancedSettings(BaseModel):
     endpoint: Literal["dev", "test", "prod"] = Field(default="prod", title="API endpoint")
     batch_size: int = Field(default=10000, title="Batch size", ge=1, le=500_000)
+    sample_percent: float = common.SamplePercentField()
+    sample_rows: int = common.SampleRowsField()
 
 
 class StructuredPhotometryHyperledaForm(BaseModel):
@@ -56,5 +59,7 @@ def handle_structured_photometry_hyperleda(
             advanced.batch_size,
             client,
             write=f.write,
+            sample_percent=advanced.sample_percent,
+            sample_rows=advanced.sample_rows,
             report_func=report_func,
         )
@@ -6,6 +6,7 @@ from psycopg import connect
 from pydantic import BaseModel, Field
 
 import uploader.app.report as report
+import uploader.forms.common as common
 from uploader.app.endpoints import db_dsn_map, env_map
 from uploader.app.storage import PgStorage
 from uploader.app.structured.redshift import upload_redshift as run_upload_redshift
@@ -21,6 +22,11 @@ class StructuredRedshiftAdvancedSettings(BaseModel):
         title="Write to API",
         description="If enabled, upload results; otherwise dry-run (statistics only).",
     )
+    sample_percent: float = common.SamplePercentField()
+    sample_rows: int = common.SampleRowsField()
+    server_stats: bool = common.ServerStatsField()
+    skip_unchanged: bool = common.SkipUnchangedField()
+    diff_tolerance: float = common.DiffToleranceField()
 
 
 class StructuredRedshiftForm(BaseModel):
@@ -57,6 +63,10 @@ def handle_structured_redshift(
             advanced.batch_size,
             client,
             write=advanced.write,
+            sample_percent=advanced.sample_percent,
+            sample_rows=advanced.sample_rows,
+            server_stats=advanced.server_stats,
+            diff_tolerance=advanced.diff_tolerance if advanced.skip_unchanged else None,
             z_error=f.z_error,
             report_func=report_func,
         )
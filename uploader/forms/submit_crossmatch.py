@@ -1,3 +1,4 @@
+import pathlib
 from collections.abc import Callable
 from typing import Literal, cast
 from urllib.parse import quote_plus
@@ -8,6 +9,7 @@ from pydantic import BaseModel, Field
 import uploader.app.report as report
 from uploader.app.crossmatch.submit import run_submit_crossmatch
 from uploader.app.endpoints import db_dsn_map, env_map
+from uploader.app.lib.batching import AdaptiveBatchSizer
 from uploader.app.storage import PgStorage
 from uploader.clients.gen.client import adminapi
 from uploader.credentials import load_credentials, load_token
@@ -17,6 +19,21 @@ class SubmitCrossmatchForm(BaseModel):
     endpoint: Literal["dev", "test", "prod"] = Field(default="prod", title="API endpoint")
     table_name: str = Field(..., title="Table name")
     batch_size: int = Field(default=1000, title="Batch size", ge=1, le=10000)
+    concurrency: int = Field(default=4, title="Concurrent requests", ge=1, le=16)
+    adaptive_batch_size: bool = Field(
+        default=False,
+        title="Adaptive batch size",
+        description="Resize requests after each response to meet the target time; batch size is used first.",
+    )
+    target_request_seconds: float = Field(default=10, title="Target seconds per request", gt=0)
+    min_batch_size: int = Field(default=100, title="Minimum batch size", ge=1, le=10000)
+    max_batch_size: int = Field(default=10000, title="Maximum batch size", ge=1, le=10000)
+    progress_path: str = Field(
+        default="",
+        title="Progress file",
+        description="Local file with the last acknowledged record; an interrupted submission resumes after it. "
+        "Disabled if left empty.",
+    )
     write: bool = Field(
         default=False,
         title="Write to API",
@@ -38,6 +55,16 @@ def handle_submit_crossmatch(
         base_url=env_map[f.endpoint],
         token=load_token(),
     )
+    batch_sizer = (
+        AdaptiveBatchSizer(
+            initial_size=f.batch_size,
+            min_size=f.min_batch_size,
+            max_size=f.max_batch_size,
+            target_seconds=f.target_request_seconds,
+        )
+        if f.adaptive_batch_size
+        else None
+    )
     with connect(dsn) as conn:
         storage = PgStorage(conn)
         run_submit_crossmatch(
@@ -47,4 +74,7 @@ def handle_submit_crossmatch(
             client,
             report_func=report_func,
             write=f.write,
+            concurrency=f.concurrency,
+            progress_path=pathlib.Path(f.progress_path.strip()) if f.progress_path.strip() else None,
+            batch_sizer=batch_sizer,
         )
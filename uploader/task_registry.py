@@ -1,6 +1,10 @@
 from uploader.app.lib.expression import expression_syntax_help
 from uploader.forms.authenticate import AuthenticateForm, handle_authenticate
+from uploader.forms.crossmatch_calibrate import CrossmatchCalibrateForm, handle_crossmatch_calibrate
 from uploader.forms.crossmatch_layered import CrossmatchLayeredForm, handle_crossmatch_layered
+from uploader.forms.crossmatch_replay import CrossmatchReplayForm, handle_crossmatch_replay
+from uploader.forms.crossmatch_selfmatch import CrossmatchSelfMatchForm, handle_crossmatch_selfmatch
+from uploader.forms.structured_combined import StructuredCombinedForm, handle_structured_combined
 from uploader.forms.structured_designation import (
     StructuredDesignationForm,
     handle_structured_designation,
@@ -139,6 +143,19 @@ def register_all_tasks() -> None:
             group="Catalogs",
         ),
     )
+    register_task(
+        TaskDefinition(
+            id="upload-structured-combined",
+            title="Several catalogs",
+            description=(
+                "Upload designations, ICRS, nature, redshift and photometry in one pass over a rawdata table.\n\n"
+                f"{expression_syntax_help()}"
+            ),
+            form_model=StructuredCombinedForm,
+            handler=handle_structured_combined,
+            group="Catalogs",
+        ),
+    )
     register_task(
         TaskDefinition(
             id="crossmatch-layered",
@@ -149,6 +166,36 @@ def register_all_tasks() -> None:
             group="Crossmatch",
         ),
     )
+    register_task(
+        TaskDefinition(
+            id="crossmatch-calibrate",
+            title="Calibrate crossmatch radius",
+            description="Suggest a search radius from nearest-neighbor separations of a sample of records.",
+            form_model=CrossmatchCalibrateForm,
+            handler=handle_crossmatch_calibrate,
+            group="Crossmatch",
+        ),
+    )
+    register_task(
+        TaskDefinition(
+            id="crossmatch-selfmatch",
+            title="Find duplicates in table",
+            description="Find groups of records of a table that lie within the radius of each other.",
+            form_model=CrossmatchSelfMatchForm,
+            handler=handle_crossmatch_selfmatch,
+            group="Crossmatch",
+        ),
+    )
+    register_task(
+        TaskDefinition(
+            id="crossmatch-replay",
+            title="Replay crossmatch",
+            description="Re-run crossmatch against a captured evidence file without the database.",
+            form_model=CrossmatchReplayForm,
+            handler=handle_crossmatch_replay,
+            group="Crossmatch",
+        ),
+    )
     register_task(
         TaskDefinition(
             id="submit-crossmatch",